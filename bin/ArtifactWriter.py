@@ -0,0 +1,88 @@
+# *_* coding: utf-8 *_*
+# @Time     : 10/18/2026
+# @Author   : zong hui
+# @object   : write the files of the pipeline on a background thread, the steps hand over their results in memory.
+
+
+# load packages
+import os
+import time
+import queue
+import threading
+
+# load our modules
+from Telemetry import telemetry
+
+
+class ArtifactWriter:
+    """
+    Runs the save functions of the steps (the mapping files, GOF, GGSS, indexes) in the order they are submitted,
+    on one background thread, while the next step computes from the results in memory. Optional artifacts (the
+    mapping files of step1, the indexes and the GO candidates) are skipped when artifacts is False.
+    close() waits for the pending files and raises the first error of a save function.
+
+    Args:
+        background (:obj: 'bool'):
+            write on a background thread, otherwise at once in submit.
+        artifacts (:obj: 'bool'):
+            write the optional artifacts.
+    """
+
+    def __init__(self, background=True, artifacts=True):
+        self.background = background
+        self.artifacts = artifacts
+        self.Written = list()  # (name, seconds) of each file written, in order
+        self.skipped = 0
+        self.error = None
+        self.jobs = queue.Queue()
+        self.thread = None
+        if background:
+            self.thread = threading.Thread(target=self.run, name="ArtifactWriter", daemon=True)
+            self.thread.start()
+
+    def run(self):
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                self.jobs.task_done()
+                return
+            if self.error is None:  # after an error the pending files are dropped, close() raises it
+                self.write(*job)
+            self.jobs.task_done()
+
+    def write(self, name, function, args, kwargs):
+        t = time.time()
+        try:
+            with telemetry.span("save", stage="save", file=os.path.basename(name)) as items:
+                function(*args, **kwargs)
+                items["bytes"] = os.path.getsize(name) if os.path.isfile(name) else None
+        except Exception as e:
+            self.error = (name, e)
+            return
+        self.Written.append((name, round(time.time() - t, 4)))
+
+    def submit(self, name, function, *args, optional=False, **kwargs):
+        """write the file name with function(*args, **kwargs), the arguments should not change afterwards."""
+        if optional and not self.artifacts:
+            self.skipped += 1
+            return
+        if self.thread is not None:
+            self.jobs.put((name, function, args, kwargs))
+        else:
+            self.write(name, function, args, kwargs)
+            if self.error is not None:
+                self.close()
+
+    def flush(self):
+        # wait for the pending files, e.g. before forking a process pool, so no write is running on the thread.
+        if self.thread is not None:
+            self.jobs.join()
+
+    def close(self):
+        if self.thread is not None:
+            self.jobs.put(None)
+            self.thread.join()
+            self.thread = None
+        if self.error is not None:
+            name, e = self.error
+            raise RuntimeError("failed to write {}".format(name)) from e
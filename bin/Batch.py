@@ -0,0 +1,143 @@
+# *_* coding: utf-8 *_*
+# @Time     : 10/18/2026
+# @Author   : zong hui
+# @object   : run main.py on many cases, the knowledge bases are loaded once and shared by the cases.
+
+
+"""
+The knowledge bases (gene info, GO info, MSigDB, gene2go and the evidence index built from them) are loaded once in
+this process, each case then runs main.main() in a forked process, which reads them from the pages of the parent.
+At most --jobs cases run at a time, the largest cases (the size of their pmid and entity files) start first so that
+a big case does not start last and run alone. The options after the cases are passed to every case:
+
+    cd bin
+    python Batch.py --cases ACC BLCA CESC --jobs 4 --prune
+    python Batch.py --dir ../case/TCGA --jobs 4     # every <dir>/<case>/<case>.sentid.txt, <dir>/<case>/BiologicalEntity
+"""
+
+# load packages
+import os
+import sys
+import time
+import argparse
+import multiprocessing
+import multiprocessing.connection
+
+# load our modules
+import main
+from config import Config, basicConfig
+from helper import knowledge
+
+
+def get_Cases(cases=(), folder=None):
+    """
+    (case, pmid file, entity folder) of the case names, ../case/<case>/<case>.sentid.txt with the entity files of
+    main.py, and of the case folders of folder: <dir>/<case>/<case>.sentid.txt and <dir>/<case>/BiologicalEntity.
+    """
+    pmids = [(case, '../case/{}/{}.sentid.txt'.format(case, case), None) for case in cases]
+    if folder:
+        for case in sorted(os.listdir(folder)):
+            pmid = os.path.join(folder, case, '{}.sentid.txt'.format(case))
+            if os.path.isfile(pmid):
+                pmids.append((case, pmid, os.path.join(folder, case, basicConfig.DB_PATH)))
+    return pmids
+
+
+def get_CaseSize(case, pmid, entities=None):
+    # the bytes of the input files of a case, the work of step1 and step2 grows with them.
+    config = Config(case, pmid, entities)
+    paths = (config.pmid, config.pmid2gene, config.pmid2go)
+    for path in paths:
+        if not os.path.isfile(path):
+            raise FileNotFoundError("case {}: input file {} not found".format(case, path))
+    return sum(os.path.getsize(path) for path in paths)
+
+
+def run_Case(case, pmid, entities, options, sender):
+    # in the forked process: the knowledge of the parent is already in the registry.
+    try:
+        sender.send(main.main(['--case', case, '--pmid', pmid] + (['--entities', entities] if entities else []) + options))
+    except BaseException as e:
+        sender.send({"case": case, "error": "{}: {}".format(type(e).__name__, e), "peak_memory": main.get_PeakMemory()})
+    finally:
+        sender.close()
+
+
+def run_Batch(cases, options, jobs=1):
+    """
+    Run the cases, at most jobs at a time, the largest first.
+
+    Args:
+        cases (:obj: 'list'):
+            (case, pmid file, entity folder or None) of each case, all their input files should exist.
+        options (:obj: 'list'):
+            the main.py arguments of every case.
+        jobs (:obj: 'int'):
+            the number of cases run at the same time.
+
+    Returns:
+        the summary of each case, in the order they finished: case, size, status, seconds, peak_memory, error.
+    """
+    context = multiprocessing.get_context("fork")
+    pending = sorted(((get_CaseSize(case, pmid, entities), case, pmid, entities) for case, pmid, entities in cases), key=lambda c: -c[0])
+    running = dict()  # receiver -> (size, case, process, start time)
+    summaries = list()
+    while pending or running:
+        while pending and len(running) < jobs:
+            size, case, pmid, entities = pending.pop(0)
+            receiver, sender = context.Pipe(duplex=False)
+            # not a Pool: the cases may start the worker processes of --workers themselves.
+            process = context.Process(target=run_Case, args=(case, pmid, entities, options, sender), name=case)
+            process.start()
+            sender.close()
+            running[receiver] = (size, case, process, time.time())
+        for receiver in multiprocessing.connection.wait(list(running)):
+            size, case, process, start = running.pop(receiver)
+            try:
+                summary = receiver.recv()
+            except EOFError:
+                summary = {"case": case, "error": "exited without a result", "peak_memory": None}
+            process.join()
+            if process.exitcode and "error" not in summary:
+                summary["error"] = "exit code {}".format(process.exitcode)
+            summary.update({"size": size, "wall": round(time.time() - start, 4)})
+            summaries.append(summary)
+            print("[{}/{}] {} {} in {} seconds".format(len(summaries), len(summaries) + len(running) + len(pending), case,
+                                                     "failed" if "error" in summary else "done", summary["wall"]), flush=True)
+    return summaries
+
+
+def get_SummaryTable(summaries):
+    # one line per case, the largest cases first.
+    rows = [("case", "size(MB)", "steps", "wall(s)", "peak RSS(MB)")]
+    for s in sorted(summaries, key=lambda s: -s["size"]):
+        steps = s["error"] if "error" in s else ", ".join("{} {}".format(name, status) for name, status in s["status"].items())
+        rows.append((s["case"], "{:.1f}".format(s["size"] / 2**20), steps, "{:.2f}".format(s["wall"]),
+                     "-" if s["peak_memory"] is None else "{:.1f}".format(s["peak_memory"])))
+    widths = [max(len(row[i]) for row in rows) for i in range(len(rows[0]))]
+    return "\n".join("  ".join(value.ljust(width) for value, width in zip(row, widths)).rstrip() for row in rows)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="run main.py on many cases, the other options are passed to every case")
+    parser.add_argument('--cases', '-cases', nargs='*', default=[], help='case names, the pmid file is ../case/<case>/<case>.sentid.txt')
+    parser.add_argument('--dir', '-dir', help='a folder of cases, every <dir>/<case>/<case>.sentid.txt')
+    parser.add_argument('--jobs', '-jobs', type=int, default=1, help='number of cases run at the same time')
+    args, options = parser.parse_known_args()
+    cases = get_Cases(args.cases, args.dir)
+    if not cases:
+        parser.error('no case, give --cases or --dir')
+    case_options = main.get_Parser().parse_args(['--case', cases[0][0], '--pmid', cases[0][1]] + options)
+
+    t0 = time.time()
+    knowledge.skip(*case_options.skip)
+    knowledge.preload()
+    print("[knowledge] loaded in {} seconds, {} MB, shared by {} cases".format(
+        round(time.time() - t0, 4), main.get_PeakMemory(), len(cases)), flush=True)
+    try:
+        summaries = run_Batch(cases, options, jobs=args.jobs)
+    except FileNotFoundError as e:
+        parser.error(str(e))
+    print(get_SummaryTable(summaries))
+    print("[time] totally use time: {} seconds".format(round(time.time() - t0, 4)))
+    sys.exit(1 if any("error" in s for s in summaries) else 0)
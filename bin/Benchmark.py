@@ -0,0 +1,388 @@
+# *_* coding: utf-8 *_*
+# @Time     : 10/18/2026
+# @Author   : zong hui
+# @object   : synthetic Zipf corpora and the time/memory scaling of the steps of the GOF on them.
+
+
+"""
+The benchmark generates synthetic corpora of the size of real cases, runs the steps on each and saves their scaling:
+
+    corpus     <corpus>/zipf<size>s<seed>/zipf<size>s<seed>.sentid.txt, BiologicalEntity/*_pubmed2gene.csv and
+               *_pubmed2go.csv, generated once per size and seed. The genes and GOs of a sentence are drawn from
+               the genes of HumanGeneInformation and the GOs of GO_INFO with Zipf frequencies (rank ** -exponent),
+               the defaults are fitted on case/test: every sentence has 1 + Poisson(0.6) genes (exponent 0.9),
+               15% have 1 + Poisson(0.22) GOs (exponent 1.4), 23 sentences per PMID on average. Half of the GOs of
+               a sentence are one of the 3 partner GOs of its first gene, the associations of the GOF.
+    steps      EntityMapping, CalculatePvalue, GeneSimilarity (all the GGSS and the top 1%), and exact_string_match
+               of lib/RecognizeGO.py (all the GO names) on texts made of the GO names of the first --match-sentences
+               sentences, the time grows with the sentences times the GO names.
+    results    <out>/benchmark.jsonl, one record per size and step: wall, cpu (with the worker processes), peak RSS
+               of the step (see Telemetry.py) and its counts. <out>/<corpus name>/ keeps the outputs of each size:
+               GOF.csv, GGSS.csv, matches.txt.
+    reference  --reference <out of an earlier run>: the outputs of each size are compared to those of the earlier
+               run, by key (Gene-GO, Gene pair, sentence), the numbers within --rtol, so that a new engine can be
+               shown to give the same GOF and GGSS. The input files must be the same (their sha1 is compared).
+
+Each size runs in a forked process, the knowledge bases are loaded once before:
+
+    cd bin
+    python Benchmark.py --sizes 10000 100000 1000000 --out ../benchmark/base
+    python Benchmark.py --sizes 10000 100000 1000000 --out ../benchmark/new --workers 4 --reference ../benchmark/base
+"""
+
+# load packages
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+import multiprocessing
+import multiprocessing.connection
+import numpy as np
+import pandas as pd
+
+# load our modules
+import config
+from helper import knowledge
+from EntityMapping import EntityMapping
+from CalculatePvalue import CalculatePvalue
+from GeneSimilarity import GeneSimilarity
+from Telemetry import get_RSS, reset_PeakRSS, get_ChildrenCPU
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)), "..", "lib"))
+from RecognizeGO import exact_string_match
+
+basicConfig = config.basicConfig
+
+FILLER = ("the", "of", "and", "in", "patients", "cells", "expression", "tumor", "was", "with", "by", "increased",
+          "cancer", "associated", "levels", "we", "found", "that", "significantly", "protein", "treatment", "role")
+
+
+def get_ZipfCDF(n, exponent):
+    # the cumulative frequencies of the ranks 1..n, frequency of rank k ~ k ** -exponent.
+    weights = np.arange(1, n + 1, dtype=np.float64) ** -exponent
+    return np.cumsum(weights) / weights.sum()
+
+
+def get_Mentions(rng, n, size, exponent, rate, extra):
+    """
+    The terms of n sentences: a sentence has terms with probability rate, then 1 + Poisson(extra) of them, drawn
+    with Zipf frequencies from size terms. Returns (offsets, codes), the codes are the Zipf ranks.
+    """
+    counts = np.where(rng.random(n) < rate, 1 + rng.poisson(extra, n), 0)
+    codes = np.searchsorted(get_ZipfCDF(size, exponent), rng.random(int(counts.sum())), side="right")
+    return np.concatenate(([0], np.cumsum(counts))), np.minimum(codes, size - 1)
+
+
+def generate_Corpus(folder, case, sentences, seed=0, gene_exponent=0.9, gene_rate=1.0, gene_extra=0.6,
+                    go_exponent=1.4, go_rate=0.15, go_extra=0.22, coupling=0.5, partners=3, sentences_per_pmid=23,
+                    chunk=1000000):
+    """
+    Write the sentid, pubmed2gene and pubmed2go files of a synthetic case, in chunks of sentences.
+
+    Args:
+        folder (:obj: 'string'):
+            the folder of the cases, the case is written in folder/case.
+        case (:obj: 'string'):
+            the case name.
+        sentences (:obj: 'int'):
+            the number of sentences.
+        seed (:obj: 'int'):
+            the random seed, the same seed gives the same files.
+        gene_exponent, go_exponent (:obj: 'float'):
+            the Zipf exponents of the gene and GO frequencies.
+        gene_rate, go_rate (:obj: 'float'):
+            the fraction of sentences with genes, with GOs.
+        gene_extra, go_extra (:obj: 'float'):
+            the mean number of terms after the first one of a sentence.
+        coupling (:obj: 'float'):
+            the probability that a GO of a sentence is one of the partners GOs of its first gene instead of a
+            random one, the associations found by the GOF.
+        partners (:obj: 'int'):
+            the number of partner GOs of a gene, drawn with the Zipf frequencies of the GOs.
+        sentences_per_pmid (:obj: 'float'):
+            the mean number of sentences of a PMID (geometric).
+    """
+    rng = np.random.default_rng(seed)
+    genes = np.array(sorted(knowledge.get("Gene")[0]), dtype=object)
+    gos = np.array(sorted(knowledge.get("GO")[0]), dtype=object)
+    genes, gos = genes[rng.permutation(len(genes))], gos[rng.permutation(len(gos))]  # the Zipf ranks
+    partner_gos = np.searchsorted(get_ZipfCDF(len(gos), go_exponent), rng.random((len(genes), partners)), side="right")
+    partner_gos = np.minimum(partner_gos, len(gos) - 1)
+
+    os.makedirs(os.path.join(folder, case, basicConfig.DB_PATH), exist_ok=True)
+    paths = [os.path.join(folder, case, '{}.sentid.txt'.format(case)),
+             os.path.join(folder, case, basicConfig.DB_PATH, '{}_pubmed2gene.csv'.format(case)),
+             os.path.join(folder, case, basicConfig.DB_PATH, '{}_pubmed2go.csv'.format(case))]
+    files = [open(path + ".tmp", "w") for path in paths]
+    files[1].write("PubMed ID,Gene Terms\n")
+    files[2].write("PubMed ID,GO Terms\n")
+    pmid, sentence = 10000000, 0
+    for start in range(0, sentences, chunk):
+        n = min(chunk, sentences - start)
+        # the sentence number inside its PMID, a new PMID starts with probability 1 / sentences_per_pmid.
+        new_pmid = rng.random(n) < 1.0 / sentences_per_pmid
+        new_pmid[0] |= start == 0
+        pmids = pmid + np.cumsum(new_pmid)
+        last = np.maximum.accumulate(np.where(new_pmid, np.arange(n), -1))
+        numbers = np.where(last >= 0, np.arange(n) - last, sentence + np.arange(n))  # the first PMID may go on from the chunk before
+        sentids = ["{}_s{}".format(p, s) for p, s in zip(pmids.tolist(), numbers.tolist())]
+        pmid, sentence = int(pmids[-1]), int(numbers[-1]) + 1
+        gene_offsets, gene_codes = get_Mentions(rng, n, len(genes), gene_exponent, gene_rate, gene_extra)
+        go_offsets, go_codes = get_Mentions(rng, n, len(gos), go_exponent, go_rate, go_extra)
+        # the GOs of the sentences with genes are partners of the first gene with probability coupling.
+        sentence_of_go = np.repeat(np.arange(n), np.diff(go_offsets))
+        coupled = (np.diff(gene_offsets)[sentence_of_go] > 0) & (rng.random(len(go_codes)) < coupling)
+        first_gene = gene_codes[gene_offsets[sentence_of_go[coupled]]]
+        go_codes[coupled] = partner_gos[first_gene, rng.integers(0, partners, int(coupled.sum()))]
+        gene_terms, go_terms = genes[gene_codes], gos[go_codes]
+        files[0].write("".join(s + "\n" for s in sentids))
+        files[1].write("".join("{},{}\n".format(s, ";".join(gene_terms[gene_offsets[i]:gene_offsets[i + 1]]))
+                               for i, s in enumerate(sentids)))
+        files[2].write("".join("{},{}\n".format(s, ";".join(go_terms[go_offsets[i]:go_offsets[i + 1]]))
+                               for i, s in enumerate(sentids)))
+    for f, path in zip(files, paths):
+        f.close()
+        os.replace(path + ".tmp", path)  # a corpus is complete once all its files are there
+    return paths
+
+
+def get_Corpus(folder, sentences, seed, **kwargs):
+    # (case, pmid file, pubmed2gene, pubmed2go) of a synthetic corpus, generated if it is not in folder yet.
+    case = 'zipf{}s{}'.format(sentences, seed)
+    paths = [os.path.join(folder, case, '{}.sentid.txt'.format(case)),
+             os.path.join(folder, case, basicConfig.DB_PATH, '{}_pubmed2gene.csv'.format(case)),
+             os.path.join(folder, case, basicConfig.DB_PATH, '{}_pubmed2go.csv'.format(case))]
+    if not all(os.path.exists(path) for path in paths):
+        paths = generate_Corpus(folder, case, sentences, seed=seed, **kwargs)
+    return [case] + paths
+
+
+def get_MatchTexts(pubmed2go, sentences, seed):
+    """(terms, texts, expected) of exact_string_match: all the GO names, and texts of filler words and the GO names of a sentence."""
+    rng = np.random.default_rng(seed)
+    GO_id2name = knowledge.get("GO")[0]
+    df = pd.read_csv(pubmed2go, dtype=str, keep_default_na=False, nrows=sentences)
+    expected = [[GO_id2name[go] for go in gos.split(";") if go in GO_id2name] if gos else [] for gos in df.iloc[:, 1]]
+    texts = list()
+    for names in expected:
+        words = list(rng.choice(FILLER, rng.integers(8, 20)))
+        for name in names:
+            words.insert(int(rng.integers(0, len(words) + 1)), name)
+        texts.append(" ".join(words))
+    terms = sorted(set(GO_id2name.values()))
+    return terms, texts, expected
+
+
+def measure(records, size, step, function):
+    """run function(items) and record its wall time, cpu (with the worker processes) and peak RSS."""
+    items = dict()
+    reset_PeakRSS()
+    wall, cpu, children_cpu = time.perf_counter(), time.process_time(), get_ChildrenCPU()
+    result = function(items)
+    wall, cpu = time.perf_counter() - wall, time.process_time() - cpu + get_ChildrenCPU() - children_cpu
+    records.append({"size": size, "step": step, "wall": round(wall, 4), "cpu": round(cpu, 4),
+                    "peak_rss_mb": round(get_RSS()[1], 1), "items": items})
+    return result
+
+
+def run_Size(corpus, size, out, workers, match_sentences, seed):
+    """the records of the steps on one corpus, its outputs are saved in out/case."""
+    case, pmid, pubmed2gene, pubmed2go = corpus
+    folder = os.path.join(out, case)
+    os.makedirs(folder, exist_ok=True)
+    records = list()
+
+    def run_Mapping(items):
+        em = EntityMapping(pmid, pubmed2gene, pubmed2go)
+        items.update(sentences=len(em.input_pmid_codes), pmids=len(em.pmid_list), genes=len(em.GeneMapping), gos=len(em.GoMapping))
+        return em
+
+    def run_Enrichment(items):
+        cp = CalculatePvalue(em.GeneMapping, em.GoMapping, workers=workers)
+        items.update(cp.PruneCounter, genes=len(cp.GOF_Genes), gos=len(cp.GOF_GOs), rows=len(cp.GeneGoEnrichment))
+        return cp
+
+    def run_Similarity(items):
+        gs = GeneSimilarity(cp.GeneGoEnrichment, workers=workers)
+        GGSS_data = gs.get_GGSS(percentage=1)
+        items.update(gs.CandidateCounter, top_edges=len(gs.get_GGSS(percentage=0.01)))
+        return GGSS_data
+
+    def run_Matching(items):
+        matches = exact_string_match(list(terms), texts)
+        found = sum(len(set(m) & set(e)) for m, e in zip(matches, expected))
+        items.update(terms=len(terms), texts=len(texts), matches=sum(len(m) for m in matches),
+                     recall=round(found / max(1, sum(len(e) for e in expected)), 4))
+        return matches
+
+    em = measure(records, size, "EntityMapping", run_Mapping)
+    cp = measure(records, size, "CalculatePvalue", run_Enrichment)
+    del em
+    cp.GeneGoEnrichment.to_csv(os.path.join(folder, "GOF.csv"), index=False)
+    GGSS_data = measure(records, size, "GeneSimilarity", run_Similarity)
+    GGSS_data.to_csv(os.path.join(folder, "GGSS.csv"), index=False)
+    del cp, GGSS_data
+    terms, texts, expected = get_MatchTexts(pubmed2go, match_sentences, seed)
+    matches = measure(records, size, "exact_string_match", run_Matching)
+    with open(os.path.join(folder, "matches.txt"), "w") as f:
+        f.write("".join(";".join(m) + "\n" for m in matches))
+    return records
+
+
+def run_SizeWorker(corpus, size, out, workers, match_sentences, seed, sender):
+    # in the forked process, the peak memory of a size does not include the sizes before.
+    try:
+        sender.send(run_Size(corpus, size, out, workers, match_sentences, seed))
+    except BaseException as e:
+        sender.send({"error": "{}: {}".format(type(e).__name__, e)})
+    finally:
+        sender.close()
+
+
+def get_FileHash(path):
+    sha1 = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            sha1.update(block)
+    return sha1.hexdigest()
+
+
+def compare_Table(path, reference_path, keys, rtol=1e-9, atol=0.0, pairs=()):
+    """
+    Compare a csv output to the same output of a reference run, row by row on the keys.
+
+    Args:
+        path, reference_path (:obj: 'string'):
+            the csv files.
+        keys (:obj: 'list'):
+            the columns identifying a row.
+        rtol, atol (:obj: 'float'):
+            the tolerance of the numeric columns, as numpy.isclose.
+        pairs (:obj: 'list'):
+            the (first, second) columns of an unordered pair, the first is the keys (the Gene1/Gene2 of the GGSS):
+            all of them are swapped where the first key is larger.
+
+    Returns:
+        dict: rows, missing and extra keys, the columns that differ with their largest relative error, equal.
+    """
+    tables = list()
+    for p in (path, reference_path):
+        df = pd.read_csv(p, dtype={key: str for key in keys}, keep_default_na=False, float_precision="round_trip")
+        if pairs:
+            swap = df[pairs[0][0]] > df[pairs[0][1]]
+            for first, second in pairs:
+                df.loc[swap, [first, second]] = df.loc[swap, [second, first]].values
+        tables.append(df.set_index(keys).sort_index())
+    table, reference = tables
+    common = table.index.intersection(reference.index)
+    result = {"rows": len(table), "missing": len(reference.index.difference(table.index)),
+              "extra": len(table.index.difference(reference.index)), "columns": dict()}
+    table, reference = table.loc[common], reference.loc[common]
+    for column in reference.columns:
+        if column not in table.columns:
+            result["columns"][column] = "missing"
+        elif pd.api.types.is_numeric_dtype(reference[column]) and pd.api.types.is_numeric_dtype(table[column]):
+            a, b = table[column].values.astype(np.float64), reference[column].values.astype(np.float64)
+            close = np.isclose(a, b, rtol=rtol, atol=atol, equal_nan=True)
+            if not close.all():
+                error = np.abs(a - b) / np.maximum(np.abs(b), np.finfo(np.float64).tiny)
+                result["columns"][column] = float(np.nanmax(error[~close]))
+        elif not (table[column].astype(str).values == reference[column].astype(str).values).all():
+            result["columns"][column] = "different"
+    result["equal"] = result["missing"] == 0 and result["extra"] == 0 and not result["columns"]
+    return result
+
+
+def compare_Outputs(out, reference, case, rtol):
+    # the GOF, GGSS and matches of a case against the reference run.
+    folder, reference_folder = os.path.join(out, case), os.path.join(reference, case)
+    if not os.path.isdir(reference_folder):
+        return {"error": "not in the reference run"}
+    results = {"GOF": compare_Table(os.path.join(folder, "GOF.csv"), os.path.join(reference_folder, "GOF.csv"),
+                                    ["Gene_ID", "GO_ID"], rtol=rtol),
+               "GGSS": compare_Table(os.path.join(folder, "GGSS.csv"), os.path.join(reference_folder, "GGSS.csv"),
+                                     ["Gene1_ID", "Gene2_ID"], rtol=rtol,
+                                     pairs=[("Gene1_ID", "Gene2_ID"), ("Gene1_Name", "Gene2_Name")])}
+    with open(os.path.join(folder, "matches.txt")) as f1, open(os.path.join(reference_folder, "matches.txt")) as f2:
+        results["matches"] = {"equal": f1.read() == f2.read()}
+    return results
+
+
+def get_ScalingTable(records):
+    # the time and memory of each step and size, with the exponent of the time between two sizes (log-log slope).
+    rows = [("step", "size", "wall(s)", "cpu(s)", "peak RSS(MB)", "time exponent")]
+    previous = dict()
+    for r in sorted(records, key=lambda r: (r["step"], r["size"])):
+        slope = ""
+        if r["step"] in previous:
+            size, wall = previous[r["step"]]
+            if r["size"] > size and wall > 0 and r["wall"] > 0:
+                slope = "{:.2f}".format(np.log(r["wall"] / wall) / np.log(r["size"] / size))
+        previous[r["step"]] = (r["size"], r["wall"])
+        rows.append((r["step"], str(r["size"]), "{:.3f}".format(r["wall"]), "{:.3f}".format(r["cpu"]),
+                     "{:.1f}".format(r["peak_rss_mb"]), slope))
+    widths = [max(len(row[i]) for row in rows) for i in range(len(rows[0]))]
+    return "\n".join("  ".join(value.ljust(width) for value, width in zip(row, widths)).rstrip() for row in rows)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="scaling benchmark of the GOF steps on synthetic Zipf corpora")
+    parser.add_argument('--sizes', '-sizes', type=int, nargs='+', default=[10000, 100000, 1000000, 10000000], help='numbers of sentences')
+    parser.add_argument('--seed', '-seed', type=int, default=0, help='random seed of the corpora')
+    parser.add_argument('--corpus', '-corpus', default='../benchmark/corpus', help='folder of the generated corpora, reused across runs')
+    parser.add_argument('--out', '-out', required=True, help='folder of the results and outputs of this run')
+    parser.add_argument('--reference', '-reference', help='the --out folder of an earlier run, the outputs are compared to it')
+    parser.add_argument('--rtol', '-rtol', type=float, default=1e-9, help='relative tolerance of the numbers compared to the reference')
+    parser.add_argument('--workers', '-workers', type=int, default=1, help='number of worker processes of CalculatePvalue and GeneSimilarity')
+    parser.add_argument('--match-sentences', '-match-sentences', type=int, default=2000,
+                        help='sentences of exact_string_match, it tests every GO name on every text')
+    args = parser.parse_args()
+
+    t0 = time.time()
+    knowledge.preload()
+    os.makedirs(args.out, exist_ok=True)
+    context = multiprocessing.get_context("fork")
+    records, failed = list(), False
+    with open(os.path.join(args.out, "benchmark.jsonl"), "w") as f:
+        for size in sorted(args.sizes):
+            t = time.time()
+            corpus = get_Corpus(args.corpus, size, args.seed)
+            inputs = {os.path.basename(path): get_FileHash(path) for path in corpus[1:]}
+            print("[corpus] {} sentences, {} ({} seconds)".format(size, corpus[0], round(time.time() - t, 2)), flush=True)
+            receiver, sender = context.Pipe(duplex=False)
+            process = context.Process(target=run_SizeWorker, args=(corpus, size, args.out, args.workers,
+                                                                   min(size, args.match_sentences), args.seed, sender))
+            process.start()
+            sender.close()
+            try:
+                result = receiver.recv()
+            except EOFError:
+                result = {"error": "exited without a result (exit code {})".format(process.join() or process.exitcode)}
+            process.join()
+            if isinstance(result, dict):
+                print("[{}] failed: {}".format(size, result["error"]), flush=True)
+                f.write(json.dumps({"size": size, "case": corpus[0], "inputs": inputs, **result}) + "\n")
+                failed = True
+                continue
+            for record in result:
+                f.write(json.dumps(dict(record, case=corpus[0], inputs=inputs), default=lambda o: o.item()) + "\n")
+                print("[{}] {}: {} seconds, {} MB".format(size, record["step"], record["wall"], record["peak_rss_mb"]), flush=True)
+            records.extend(result)
+            if args.reference:
+                reference_inputs = dict()
+                reference_file = os.path.join(args.reference, "benchmark.jsonl")
+                if os.path.exists(reference_file):
+                    with open(reference_file) as r:
+                        reference_inputs = {record["case"]: record["inputs"] for record in map(json.loads, r)}
+                if reference_inputs.get(corpus[0]) not in (None, inputs):
+                    comparison = {"error": "the inputs differ from those of the reference run"}
+                else:
+                    comparison = compare_Outputs(args.out, args.reference, corpus[0], args.rtol)
+                f.write(json.dumps({"size": size, "case": corpus[0], "comparison": comparison}) + "\n")
+                equal = "error" not in comparison and all(c["equal"] for c in comparison.values())
+                failed |= not equal
+                print("[{}] reference {}: {}".format(size, "EQUAL" if equal else "DIFFERENT", json.dumps(comparison)), flush=True)
+    print(get_ScalingTable(records))
+    print("[time] totally use time: {} seconds".format(round(time.time() - t0, 4)))
+    sys.exit(1 if failed else 0)
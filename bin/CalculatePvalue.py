@@ -4,45 +4,192 @@
 
 
 # load packages
+import os
+import csv
+import json
 import scipy
+import multiprocessing
 import numpy as np
 import pandas as pd
-from tqdm import tqdm
-import scipy.stats as stats
 from collections import defaultdict
 
 # load our modules
 import config
 
 basicConfig = config.basicConfig
-from helper import get_GeneIDNameMapping, get_GOIDNameMapping
-from helper import get_MSigDB_GO2Gene, get_NCBI_GeneGO2PMID
+from helper import knowledge
+from CoOccurrence import CoOccurrence
+from FisherExact import FisherExact
+from EvidenceIndex import EvidenceIndex
+from ResultIndex import ResultIndex, GOF_KEYS
+from Interning import CSRMapping, Vocabulary, intern_Strings
+from Telemetry import telemetry
 
-# Gene ID -- Gene Name
-Gene_id2name, Gene_name2id, Gene_altid2id = get_GeneIDNameMapping(basicConfig.HumanGeneInformation)
-# GO ID -- GO Name
-GO_id2name, GO_name2id, GO_id2level, GO_id2children, GO_id2namespace, GO_altid2id = get_GOIDNameMapping(basicConfig.GO_INFO)
-# MSigDB file
-MSigDB_GO2Gene = get_MSigDB_GO2Gene(basicConfig.MSigDB_C5_GO_PATH)
-# NCBI gene2go
-NCBI_GeneGO2PMID = get_NCBI_GeneGO2PMID(basicConfig.NCBI_Entrez_Gene2GO)
+
+def get_EvidenceIndex():
+    # Gene/GO information and evidence joined to the GOF, built from the Gene, GO, MSigDB and NCBI knowledge.
+    Gene_id2name = knowledge.get("Gene")[0]
+    GO_id2name, GO_name2id, GO_id2level, GO_id2children, GO_id2namespace, GO_altid2id = knowledge.get("GO")
+    return EvidenceIndex(Gene_id2name, GO_id2name, GO_id2level, GO_id2children, GO_id2namespace,
+                         knowledge.get("MSigDB"), knowledge.get("NCBI"))
+
+
+knowledge.register("Evidence", get_EvidenceIndex)
+
+
+def get_AdjustedPvalue(group, pvalue):
+    """
+    Adjusted Pvalue defined by Tsoi LC, for all groups (genes) at once.
+    For a pvalue p in a group of n pvalues, adjusted_p = min(1, p * n / r), r is the number of pvalues >= p
+    in the same group (ties included). All pvalues should be < 1.0.
+
+    Args:
+        group (:obj: 'numpy.ndarray'):
+            the group (gene index) of each pvalue.
+        pvalue (:obj: 'numpy.ndarray'):
+            the pvalues.
+    """
+    group, pvalue = np.asarray(group), np.asarray(pvalue, dtype=np.float64)
+    order = np.lexsort((pvalue, group))
+    sorted_group, sorted_pvalue = group[order], pvalue[order]
+    position = np.arange(len(order))
+
+    # first position of each group, and of each run of tied pvalues inside a group.
+    new_group = np.ones(len(order), dtype=bool)
+    new_group[1:] = sorted_group[1:] != sorted_group[:-1]
+    new_value = new_group.copy()
+    new_value[1:] |= sorted_pvalue[1:] != sorted_pvalue[:-1]
+    group_start = np.maximum.accumulate(np.where(new_group, position, 0))
+    value_start = np.maximum.accumulate(np.where(new_value, position, 0))
+    group_size = np.diff(np.append(np.flatnonzero(new_group), len(order)))
+    group_end = group_start + np.repeat(group_size, group_size)
+
+    numerator = (group_end - group_start).astype(np.float64)
+    denominator = (group_end - value_start).astype(np.float64)
+    adjusted_pvalue = np.empty(len(order), dtype=np.float64)
+    adjusted_pvalue[order] = np.minimum(1.0, sorted_pvalue * numerator / denominator)
+    return adjusted_pvalue
+
+
+def calculate_shard(co, N, alternative, prune, start, end):
+    """
+    Pvalue and Adjusted Pvalue of the genes [start, end) of a CoOccurrence, only pairs with pvalue < 1.0.
+    With prune, the GOF filter of CalculatePvalue.filter_and_sort is applied as soon as the adjusted pvalues
+    are known, and the evidence is only looked up for pairs with a < a_threshold.
+
+    Returns:
+        compact arrays: gene_index, go_index, a, b, c, d, pvalue, adjusted_pvalue.
+        counter: the number of pairs tested, and of pairs dropped by each rule.
+        the smallest positive adjusted pvalue before pruning, used by the enrichment score.
+    """
+    shard = [start, end]
+    with telemetry.span("counting", shard=shard) as items:
+        indptr, go_index, a, b, c, d = co.get_ContingencyTables(start, end)
+        gene_index = start + np.repeat(np.arange(end - start), np.diff(indptr))
+        items.update(genes=end - start, pairs=len(a))
+    counter = {"tested": len(a)}
+    with telemetry.span("fisher", shard=shard) as items:
+        # pvalues of all pairs at once, identical tables are tested only once.
+        pvalue = FisherExact(N, alternative=alternative).pvalue(a, b, c, d)
+        keep = pvalue < 1.0
+        counter["pvalue"] = int(len(keep) - keep.sum())
+        gene_index, go_index, a, b, c, d, pvalue = [x[keep] for x in (gene_index, go_index, a, b, c, d, pvalue)]
+        items.update(tested=counter["tested"], kept=len(a))
+    with telemetry.span("adjustment", shard=shard) as items:
+        adjusted_pvalue = get_AdjustedPvalue(gene_index, pvalue)
+        positive = adjusted_pvalue[adjusted_pvalue > 0]
+        adjusted_pvalue_minimum = positive.min() if len(positive) else np.inf
+        items.update(pairs=len(pvalue))
+
+    if prune:
+        with telemetry.span("evidence", shard=shard) as items:
+            keep = adjusted_pvalue <= CalculatePvalue.adjusted_pvalue_threshold
+            counter["adjusted_pvalue"] = int(len(keep) - keep.sum())
+            lookup = np.flatnonzero(keep & (a < CalculatePvalue.a_threshold))
+            gene_ids = [co.genes[i] for i in gene_index[lookup]]
+            go_ids = [co.gos[i] for i in go_index[lookup]]
+            evidence = knowledge.get("Evidence").join(gene_ids, go_ids)
+            evidence = ((evidence["GSEA_MSigDB"] != 0) | (evidence["NCBI_Entrez"] != 0)).values
+            keep[lookup[~evidence]] = False
+            counter["evidence"] = int((~evidence).sum())
+            gene_index, go_index, a, b, c, d, pvalue, adjusted_pvalue = [
+                x[keep] for x in (gene_index, go_index, a, b, c, d, pvalue, adjusted_pvalue)]
+            items.update(pairs=len(keep), lookups=len(lookup), kept=len(a))
+    counter["kept"] = len(a)
+    return ((gene_index.astype(np.int32), go_index.astype(np.int32), a, b, c, d, pvalue, adjusted_pvalue),
+            counter, adjusted_pvalue_minimum)
+
+
+def get_ShardCheckpoint(checkpoint, shard):
+    return os.path.join(checkpoint, "shard.{}-{}.npz".format(*shard))
+
+
+def save_ShardCheckpoint(checkpoint, shard, result):
+    # the result of calculate_shard, replaced atomically so a crash never leaves a partial shard.
+    arrays, counter, adjusted_pvalue_minimum = result
+    path = get_ShardCheckpoint(checkpoint, shard)
+    with open(path + ".tmp", "wb") as f:
+        np.savez(f, *arrays, counter=json.dumps(counter), adjusted_pvalue_minimum=adjusted_pvalue_minimum)
+    os.replace(path + ".tmp", path)
+
+
+def load_ShardCheckpoint(checkpoint, shard):
+    """the result of calculate_shard saved by an interrupted run, None if the shard was not finished."""
+    path = get_ShardCheckpoint(checkpoint, shard)
+    if not os.path.exists(path):
+        return None
+    with np.load(path) as data:
+        return (tuple(data["arr_{}".format(i)] for i in range(8)), json.loads(str(data["counter"])),
+                float(data["adjusted_pvalue_minimum"]))
+
+
+# (CoOccurrence, N, alternative, prune) inherited by the forked workers of CalculatePvalue.
+_SharedCoOccurrence = None
+
+
+def calculate_shard_worker(shard):
+    co, N, alternative, prune = _SharedCoOccurrence
+    return calculate_shard(co, N, alternative, prune, *shard)
 
 
 class CalculatePvalue:
     """
     Calculate Pvalue, Adjusted Pvalue of Gene and GO based on fisher exact test.
     Args:
-        GeneMapping (:obj: 'dict'):
-            the Gene mapping result, the key is gene, and the value is related pubmed id.
-        GoMapping (:obj: 'dict'):
-            the GO mapping result, the key is GO, and the value is related pubmed id.
+        mapping_gene2pmid (:obj: 'string' or 'CSRMapping'):
+            the Gene mapping file of step1, or EntityMapping.GeneMapping: Gene -> related pubmed id.
+        mapping_go2pmid (:obj: 'string' or 'CSRMapping'):
+            the GO mapping file of step1, or EntityMapping.GoMapping: GO -> related pubmed id, the same PMID codes.
+        alternative (:obj: 'string'):
+            'two-sided' fisher exact test, or 'greater' for the one-sided hypergeometric test.
+        workers (:obj: 'int'):
+            the number of worker processes, the genes are split into shards computed in parallel.
+        prune (:obj: 'bool'):
+            drop the Gene-GO pairs failing the GOF filter as soon as their adjusted pvalue is known,
+            only the GOF rows are stored (also in Pvalue2AP), self.PruneCounter reports the dropped pairs.
+        checkpoint (:obj: 'string'):
+            a folder where each shard is saved as soon as it is computed, the shards found there are not computed
+            again. It must only hold the shards of the same mappings and parameters.
     """
+    adjusted_pvalue_threshold = 0.05
+    a_threshold = 5
+    checkpoint_shards = 16  # shards of a single process run with a checkpoint
 
-    def __init__(self, mapping_gene2pmid, mapping_go2pmid):
-        self.GeneMapping = self.get_GeneMapping(mapping_gene2pmid)  # input Gene mapping
-        self.GoMapping = self.get_GoMapping(mapping_go2pmid)  # input GO mapping
+    def __init__(self, mapping_gene2pmid, mapping_go2pmid, alternative='two-sided', workers=1, prune=False, checkpoint=None):
+        self.alternative = alternative
+        self.workers = workers
+        self.prune = prune
+        self.checkpoint = checkpoint
+        self.PruneCounter = dict()
+        self.CheckpointCounter = {"shards": 0, "resumed": 0}
+        self.adjusted_pvalue_minimum = np.inf
+        self.index = None
+        if isinstance(mapping_gene2pmid, CSRMapping):
+            self.GeneMapping, self.GoMapping = mapping_gene2pmid, mapping_go2pmid  # handed over by step1
+        else:
+            self.GeneMapping, self.GoMapping = self.get_Mappings(mapping_gene2pmid, mapping_go2pmid)
 
-        self.pmid = list(set([p for k, v in self.GeneMapping.items() for p in v]))  # get the initial PMID list.
+        self.pmid = np.unique(self.GeneMapping.indices)  # get the initial PMID list (codes).
         self.genes = list(self.GeneMapping.keys())  # get initial Genes
         self.gos = list(self.GoMapping.keys())  # get initial GOs
 
@@ -57,73 +204,83 @@ class CalculatePvalue:
         self.calculate_pvalue_adjustedpvalue()
         self.calculate_enrichment_score()
         self.add_evidence()
-        self.filter_and_sort()
+        with telemetry.span("filter", rows=len(self.GeneGoEnrichment)) as items:
+            self.filter_and_sort()
+            items.update(kept=len(self.GeneGoEnrichment), genes=len(self.GOF_Genes), gos=len(self.GOF_GOs))
         
 
-    def get_GeneMapping(self, mapping_gene2pmid):
-        GeneMapping = {}
-        with open(mapping_gene2pmid, 'r') as f:
-            f.readline()
-            for line in f:
-                l = line.strip().split('\t')
-                GeneMapping[l[0]] = l[2].split(';')
-        return GeneMapping
-
-    def get_GoMapping(self, mapping_go2pmid):
-        GoMapping = {}
-        with open(mapping_go2pmid, 'r') as f:
-            f.readline()
-            for line in f:
-                l = line.strip().split('\t')
-                GoMapping[l[0]] = l[2].split(';')
-        return GoMapping
+    @staticmethod
+    def get_Mappings(mapping_gene2pmid, mapping_go2pmid):
+        # Gene and GO mapping files of step1 as CSRMappings, the PMIDs of both are coded in one vocabulary.
+        tables = list()
+        for path in (mapping_gene2pmid, mapping_go2pmid):
+            table = pd.read_csv(path, sep="\t", dtype=str, keep_default_na=False, quoting=csv.QUOTE_NONE)
+            table = table.drop_duplicates(table.columns[0], keep="last")
+            tables.append((table.iloc[:, 0].values, table.iloc[:, 2].str.strip().str.split(";").values))
+        pmids = [pmid for _, lists in tables for pmid_list in lists for pmid in pmid_list]
+        codes, PMIDs = intern_Strings(pmids)
+        mappings, start = list(), 0
+        for keys, lists in tables:
+            counts = np.array([len(pmid_list) for pmid_list in lists], dtype=np.int64)
+            rows = np.repeat(np.arange(len(keys)), counts)
+            mappings.append(CSRMapping.from_Pairs(rows, codes[start:start + counts.sum()], Vocabulary(keys), PMIDs))
+            start += counts.sum()
+        return mappings
 
     def calculate_pvalue_adjustedpvalue(self):
-        tqdm_genes = tqdm(self.genes, ncols=80)
-        entity = self.GoMapping
-        D = dict()
-        for gene in tqdm_genes:
-            tqdm_genes.set_description("Calculate Pvalue and Adjusted Pvalue")
-            gene_pmid = set(self.GeneMapping.get(gene))
-
-            gene_entity2pvalue = dict()
-            gene_pvalues = list()
-            for e in entity:
-                e_pmid = set(entity.get(e))
-                a = len(gene_pmid & e_pmid)
-                b = len(gene_pmid - e_pmid)
-                c = len(e_pmid - gene_pmid)
-                d = len(self.pmid) - a - b - c
-                if a>0:
-                    oddsration, pvalue = stats.fisher_exact([[a, b], [c, d]], alternative='two-sided')
-                    if pvalue < 1.0:
-                        gene_pvalues.append(pvalue)
-                        gene_entity2pvalue[e] = pvalue
-                        D[(gene, e)] = {"Gene_ID": gene,
-                                        "a": a,
-                                        "b": b,
-                                        "c": c,
-                                        "d": d,
-                                        "Pvalue": pvalue}
-                        D[(gene, e)]["GO_ID"] = e
-
-            for e, e_pvalue in gene_entity2pvalue.items():
-                numerator, denominator = 0, 0
-                for k, k_pvalue in gene_entity2pvalue.items():
-                    if k_pvalue < 1.0:
-                        numerator += 1
-                    if k_pvalue < 1.0 and k_pvalue >= e_pvalue:
-                        denominator += 1
-                adjusted_pvalue = min(1.0, e_pvalue * float(numerator) / float(denominator))
-                D[(gene, e)]["Adjusted_Pvalue"] = adjusted_pvalue
-
-        tqdm_genes.close()
-        self.GeneGoEnrichment = self.GeneGoEnrichment.append(list(D.values()), ignore_index=True)
-        D = dict()
+        # contingency tables of all Gene-GO pairs with a > 0, counted by sparse matrix product.
+        with telemetry.span("cooccurrence") as items:
+            co = CoOccurrence(self.GeneMapping, self.GoMapping)
+            shards = co.get_Shards(4 * self.workers if self.workers > 1 else (self.checkpoint_shards if self.checkpoint else 1))
+            items.update(genes=len(co.genes), gos=len(co.gos), pmids=len(self.pmid), shards=len(shards))
+        results = dict()
+        if self.checkpoint:
+            os.makedirs(self.checkpoint, exist_ok=True)
+            for shard in shards:
+                result = load_ShardCheckpoint(self.checkpoint, shard)
+                if result is not None:
+                    results[shard] = result
+        self.CheckpointCounter = {"shards": len(shards), "resumed": len(results)}
+        todo = [shard for shard in shards if shard not in results]
+        if self.workers > 1 and len(todo) > 1 and "fork" in multiprocessing.get_all_start_methods():
+            # the forked workers read the CoOccurrence matrices from the parent, only shard bounds are pickled.
+            if self.prune:
+                knowledge.preload("Evidence")
+            global _SharedCoOccurrence
+            _SharedCoOccurrence = (co, len(self.pmid), self.alternative, self.prune)
+            with multiprocessing.get_context("fork").Pool(self.workers) as pool:
+                for shard, result in zip(todo, pool.imap(calculate_shard_worker, todo, chunksize=1)):
+                    results[shard] = result
+                    if self.checkpoint:
+                        save_ShardCheckpoint(self.checkpoint, shard, result)
+            _SharedCoOccurrence = None
+        else:
+            for shard in todo:
+                results[shard] = calculate_shard(co, len(self.pmid), self.alternative, self.prune, *shard)
+                if self.checkpoint:
+                    save_ShardCheckpoint(self.checkpoint, shard, results[shard])
+        results = [results[shard] for shard in shards]
+        # shards are contiguous gene ranges, concatenating them in order gives the single-process row order.
+        gene_index, go_index, a, b, c, d, pvalue, adjusted_pvalue = [
+            np.concatenate([r[0][i] for r in results]) if results else np.zeros(0) for i in range(8)]
+        for _, counter, _ in results:
+            for k, v in counter.items():
+                self.PruneCounter[k] = self.PruneCounter.get(k, 0) + v
+        self.adjusted_pvalue_minimum = min([r[2] for r in results], default=np.inf)
+
+        self.GeneGoEnrichment = pd.DataFrame({"Gene_ID": np.array(co.genes, dtype=object)[gene_index.astype(np.int64)],
+                                              "a": a,
+                                              "b": b,
+                                              "c": c,
+                                              "d": d,
+                                              "Pvalue": pvalue,
+                                              "GO_ID": np.array(co.gos, dtype=object)[go_index.astype(np.int64)],
+                                              "Adjusted_Pvalue": adjusted_pvalue},
+                                             columns=self.GeneGoEnrichment.columns)
 
     def calculate_enrichment_score(self):
         adjusted_pvalue = self.GeneGoEnrichment['Adjusted_Pvalue'].tolist()
-        adjusted_pvalue_minmum = min([i for i in adjusted_pvalue if i>0])
+        adjusted_pvalue_minmum = self.adjusted_pvalue_minimum  # over all pairs, also the pruned ones
         enrichment_score = [-np.log(p) if p!=0 else -np.log(adjusted_pvalue_minmum)for p in adjusted_pvalue]
         self.GeneGoEnrichment["Enrichment_Score"] = enrichment_score
         self.Pvalue2AP =  pd.DataFrame(self.GeneGoEnrichment, columns=['Gene_ID', 'GO_ID', 'Pvalue', 'Adjusted_Pvalue'])
@@ -134,29 +291,18 @@ class CalculatePvalue:
         return 'done!'
 
     def add_evidence(self):
-        # GOF: Letter, Gene Name, GO Name, GO level, GO namespace, GO children
-        self.GeneGoEnrichment["Gene_Name"] = self.GeneGoEnrichment["Gene_ID"].apply(lambda x: Gene_id2name.get(x, x))
-        self.GeneGoEnrichment["Letter"] = self.GeneGoEnrichment["Gene_Name"].apply(lambda x: x.upper()[0])
-        self.GeneGoEnrichment["GO_Name"] = self.GeneGoEnrichment["GO_ID"].apply(lambda x: GO_id2name.get(x, x))
-        self.GeneGoEnrichment["GO_Level"] = self.GeneGoEnrichment["GO_ID"].apply(lambda x: GO_id2level.get(x, x))
-        self.GeneGoEnrichment["GO_Children"] = self.GeneGoEnrichment["GO_ID"].apply(lambda x: len(GO_id2children.get(x, [])))
-        self.GeneGoEnrichment["GO_Namespace"] = self.GeneGoEnrichment["GO_ID"].apply(lambda x: GO_id2namespace.get(x, x))
+        # GOF: Letter, Gene Name, GO Name, GO level, GO namespace, GO children, GSEA, PubMed
+        with telemetry.span("evidence_join", rows=len(self.GeneGoEnrichment)):
+            evidence = knowledge.get("Evidence").join(self.GeneGoEnrichment["Gene_ID"], self.GeneGoEnrichment["GO_ID"])
+            for column in evidence.columns:
+                self.GeneGoEnrichment[column] = evidence[column].values
         # GeneGOname = ["{}[{}]".format(gene_name, go_name) for (gene_name, go_name) in zip(self.GeneGoEnrichment["Gene_Name"], self.GeneGoEnrichment["GO_Name"])]
         # self.GeneGoEnrichment["GOF"] = np.array(GeneGOname)
 
-        # GSEA
-        MSigDB_evidence = [1 if gene_name in MSigDB_GO2Gene.get(go_name.lower(),[]) else 0 for (go_name, gene_name) in
-                         zip(self.GeneGoEnrichment["GO_Name"], self.GeneGoEnrichment["Gene_Name"])]
-        self.GeneGoEnrichment["GSEA_MSigDB"] = np.array(MSigDB_evidence)
-
-        # PubMed
-        NCBI_evidence = [len(NCBI_GeneGO2PMID.get((gene_id, go_id),[])) for (gene_id, go_id) in zip(self.GeneGoEnrichment["Gene_ID"], self.GeneGoEnrichment["GO_ID"])]
-        self.GeneGoEnrichment["NCBI_Entrez"] = np.array(NCBI_evidence)
-
     def filter_and_sort(self):
         # 1. filter the Gene-GO, df[(df['a']>=5) | (df['GSEA_MSigDB']!=0) | (df['NCBI_Entrez']!=0)]
-        self.GeneGoEnrichment = self.GeneGoEnrichment.loc[self.GeneGoEnrichment["Adjusted_Pvalue"] <= 0.05]
-        self.GeneGoEnrichment = self.GeneGoEnrichment[(self.GeneGoEnrichment['a']>=5) | (self.GeneGoEnrichment['GSEA_MSigDB']!=0) | (self.GeneGoEnrichment['NCBI_Entrez']!=0)]
+        self.GeneGoEnrichment = self.GeneGoEnrichment.loc[self.GeneGoEnrichment["Adjusted_Pvalue"] <= self.adjusted_pvalue_threshold]
+        self.GeneGoEnrichment = self.GeneGoEnrichment[(self.GeneGoEnrichment['a']>=self.a_threshold) | (self.GeneGoEnrichment['GSEA_MSigDB']!=0) | (self.GeneGoEnrichment['NCBI_Entrez']!=0)]
 
         # 2. sorted in descending order by Adjusted_Pvalue.
         self.GeneGoEnrichment = self.GeneGoEnrichment.sort_values('Adjusted_Pvalue', ascending=True)
@@ -167,13 +313,18 @@ class CalculatePvalue:
         self.GOF_Genes = list(set(self.GeneGoEnrichment["Gene_ID"].tolist()))
         self.GOF_GOs = list(set(self.GeneGoEnrichment["GO_ID"].tolist()))
 
+    def get_Index(self):
+        # top-k index of the GOF, built on the first query.
+        if self.index is None:
+            self.index = ResultIndex(self.GeneGoEnrichment, GOF_KEYS)
+        return self.index
+
     def get_most_related_term(self, term="BCL2", term_type="Gene", max_number=10):
-        res = []
-        if term_type == "Gene":
-            res = self.GeneGoEnrichment.loc[self.GeneGoEnrichment["Gene_Name"] == term].sort_values('Adjusted_Pvalue',ascending=False)[:max_number]
-        if term_type == "GO":
-            res = self.GeneGoEnrichment.loc[self.GeneGoEnrichment["GO_ID"] == term].sort_values('Adjusted_Pvalue',ascending=False)[:max_number]
-        return res
+        # term_type: 'Gene' (Gene Name), 'Gene_ID', 'GO' (GO ID) or 'GO_Name', the rows with the smallest Adjusted_Pvalue first.
+        return self.get_Index().get_TopK(term_type, term, max_number)
+
+    def get_most_related_terms(self, terms=("BCL2",), term_type="Gene", max_number=10):
+        return self.get_Index().get_TopK_batch(term_type, terms, max_number)
 
     def save_GOF(self, GOF_save_path=None):
         if GOF_save_path:
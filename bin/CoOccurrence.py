@@ -0,0 +1,63 @@
+# *_* coding: utf-8 *_*
+# @Time     : 10/18/2026
+# @Author   : zong hui
+# @object   : count the Gene-GO contingency tables with sparse PMID incidence matrices.
+
+
+# load packages
+import numpy as np
+
+
+class CoOccurrence:
+    """
+    Count the 2x2 contingency table (a, b, c, d) of every Gene-GO pair which co-occurs in at least one PMID.
+    The Gene x PMID and GO x PMID incidence matrices are built once, `a` comes from one sparse matrix product,
+    `b`, `c` and `d` come from the row and column sums, so only pairs with a > 0 are materialized.
+
+    Args:
+        GeneMapping (:obj: 'CSRMapping'):
+            the Gene mapping result, the row is gene, and the columns are related pubmed id.
+        GoMapping (:obj: 'CSRMapping'):
+            the GO mapping result, the row is GO, and the columns are related pubmed id, coded as in GeneMapping.
+    """
+
+    def __init__(self, GeneMapping, GoMapping):
+        self.genes = GeneMapping.rows.strings
+        self.gos = GoMapping.rows.strings
+
+        # duplicated PMIDs of one entity count once, as set() does.
+        self.GenePMID = GeneMapping.get_Matrix()  # Gene x PMID
+        self.GoPMID = GoMapping.get_Matrix()  # GO x PMID
+        self.N = int(np.count_nonzero(np.diff(self.GenePMID.tocsc().indptr)))  # PMIDs mentioning a gene, len(CalculatePvalue.pmid)
+        self.gene_size = np.diff(self.GenePMID.indptr).astype(np.int64)  # number of distinct PMIDs of each gene
+        self.go_size = np.diff(self.GoPMID.indptr).astype(np.int64)  # number of distinct PMIDs of each GO
+
+    def get_Shards(self, n_shards):
+        """
+        Split the genes into at most n_shards contiguous ranges [start, end) of about the same work,
+        the work of a gene is the number of (PMID, GO) terms its row of the sparse product visits.
+        """
+        pmid_go_count = np.diff(self.GoPMID.tocsc().indptr).astype(np.int64)
+        work = self.GenePMID @ pmid_go_count + 1
+        bounds = np.searchsorted(np.cumsum(work), np.linspace(0, work.sum(), n_shards + 1)[1:-1], side='right')
+        bounds = np.unique(np.concatenate(([0], bounds, [len(self.genes)])))
+        return [(int(start), int(end)) for start, end in zip(bounds[:-1], bounds[1:])]
+
+    def get_ContingencyTables(self, start=0, end=None):
+        """
+        Contingency tables of the genes [start, end), all genes by default.
+        Returns:
+            indptr: pairs of the (start+i)-th gene are at [indptr[i], indptr[i+1]), in the order of GoMapping.
+            go_index, a, b, c, d: one value for each Gene-GO pair with a > 0.
+        """
+        end = len(self.genes) if end is None else end
+        co = (self.GenePMID[start:end] @ self.GoPMID.T).tocsr()
+        co.eliminate_zeros()
+        co.sort_indices()
+        gene_index = start + np.repeat(np.arange(end - start), np.diff(co.indptr))
+        go_index = co.indices
+        a = co.data.astype(np.int64)
+        b = self.gene_size[gene_index] - a
+        c = self.go_size[go_index] - a
+        d = self.N - a - b - c
+        return co.indptr, go_index, a, b, c, d
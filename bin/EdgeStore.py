@@ -0,0 +1,170 @@
+# *_* coding: utf-8 *_*
+# @Time     : 10/18/2026
+# @Author   : zong hui
+# @object   : on-disk, memory-mapped columnar store of the GGSS edges, filled tile by tile.
+
+
+"""
+The GGSS edges of a case, one raw binary file per column, appended tile by tile:
+
+    <case>@GGSS.edges/manifest.json     genes, tile size, score dtype, GOF fingerprint, finished tiles, rows
+    <case>@GGSS.edges/gene1.i32         int32 index of Gene1 in the genes of the manifest
+    <case>@GGSS.edges/gene2.i32         int32 index of Gene2
+    <case>@GGSS.edges/score.f64         Similarity_Score, float64 (or score.f32)
+    <case>@GGSS.edges/gene_index.*.npy  per-gene rows of the edges, see build_GeneIndex
+
+The manifest is replaced atomically after each tile is flushed, it is the checkpoint: an interrupted run
+truncates the columns to the rows of the finished tiles and computes the missing tiles only.
+"""
+
+# load packages
+import os
+import json
+import shutil
+import numpy as np
+
+
+# load our modules
+from KnowledgeSnapshot import load_Array
+
+
+class EdgeStore:
+    """
+    Create, resume or read an edge store.
+
+    Args:
+        folder (:obj: 'string'):
+            the store folder.
+        genes (:obj: 'list'):
+            the gene IDs of the edge indexes, None to read an existing store.
+        tile_size (:obj: 'int'):
+            genes on a side of a tile of the Gene x Gene matrix.
+        score_dtype (:obj: 'string'):
+            'float64' or 'float32', the precision of the stored scores.
+        fingerprint (:obj: 'string'):
+            the hash of the input GOF, a store of another GOF is computed again.
+    """
+    columns = {"gene1": np.int32, "gene2": np.int32}
+
+    def __init__(self, folder, genes=None, tile_size=2048, score_dtype="float64", fingerprint=None):
+        self.folder = folder
+        self.manifest_file = os.path.join(folder, "manifest.json")
+        if genes is None:
+            with open(self.manifest_file, "r") as f:
+                self.manifest = json.load(f)
+        else:
+            self.manifest = {"genes": list(genes), "tile_size": int(tile_size), "score_dtype": score_dtype,
+                             "fingerprint": fingerprint, "tiles": [], "rows": 0}
+        self.dtypes = dict(self.columns, score=np.dtype(self.manifest["score_dtype"]).type)
+        if genes is not None:
+            self.resume()
+        self.genes = self.manifest["genes"]
+        self.arrays = None
+        self.GeneIndex = None
+
+    def get_ColumnFile(self, column):
+        dtype = np.dtype(self.dtypes[column])
+        return os.path.join(self.folder, "{}.{}{}".format(column, dtype.kind, dtype.itemsize * 8))
+
+    def resume(self):
+        # keep the finished tiles of the same store, drop the rows of an interrupted tile.
+        if os.path.exists(self.manifest_file):
+            with open(self.manifest_file, "r") as f:
+                manifest = json.load(f)
+            if all(manifest.get(k) == self.manifest[k] for k in ("genes", "tile_size", "score_dtype", "fingerprint")):
+                self.manifest = manifest
+                for column in self.dtypes:
+                    with open(self.get_ColumnFile(column), "ab") as f:
+                        f.truncate(self.manifest["rows"] * np.dtype(self.dtypes[column]).itemsize)
+                return
+        shutil.rmtree(self.folder, ignore_errors=True)
+        os.makedirs(self.folder)
+        for column in self.dtypes:
+            open(self.get_ColumnFile(column), "wb").close()
+        self.save_Manifest()
+
+    def save_Manifest(self):
+        with open(self.manifest_file + ".tmp", "w") as f:
+            json.dump(self.manifest, f)
+        os.replace(self.manifest_file + ".tmp", self.manifest_file)
+
+    def is_Done(self, tile):
+        return [list(t) for t in tile] in self.manifest["tiles"]
+
+    def append(self, tile, gene1, gene2, score):
+        """append the edges of a finished tile, then checkpoint it."""
+        for column, values in (("gene1", gene1), ("gene2", gene2), ("score", score)):
+            with open(self.get_ColumnFile(column), "ab") as f:
+                f.write(np.ascontiguousarray(values, dtype=self.dtypes[column]).tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+        self.manifest["tiles"].append([list(t) for t in tile])
+        self.manifest["rows"] += len(score)
+        self.save_Manifest()
+        self.arrays = None
+
+    def __len__(self):
+        return self.manifest["rows"]
+
+    def get_Arrays(self):
+        # memory-mapped columns of the finished tiles.
+        if self.arrays is None:
+            rows = len(self)
+            self.arrays = {column: np.memmap(self.get_ColumnFile(column), dtype=dtype, mode="r", shape=(rows,))
+                           if rows else np.zeros(0, dtype=dtype) for column, dtype in self.dtypes.items()}
+        return self.arrays
+
+    def get_Chunks(self, chunk_size=1 << 22):
+        """(gene1, gene2, score) of chunk_size edges at a time, in the store order."""
+        arrays = self.get_Arrays()
+        for start in range(0, len(self), chunk_size):
+            end = min(start + chunk_size, len(self))
+            yield (np.asarray(arrays["gene1"][start:end]), np.asarray(arrays["gene2"][start:end]),
+                   np.asarray(arrays["score"][start:end], dtype=np.float64))
+
+    def build_GeneIndex(self, chunk_size=1 << 22):
+        """
+        The edges of each gene as Gene1 or Gene2, a counting sort done chunk by chunk into memory-mapped arrays:
+        the edges of gene i are rows[offsets[i]:offsets[i+1]], in the store order.
+        """
+        offsets_file = os.path.join(self.folder, "gene_index.offsets.npy")
+        rows_file = os.path.join(self.folder, "gene_index.rows.npy")
+        if self.manifest.get("gene_index") != len(self):
+            counts = np.zeros(len(self.genes), dtype=np.int64)
+            for gene1, gene2, _ in self.get_Chunks(chunk_size):
+                counts += np.bincount(gene1, minlength=len(self.genes)) + np.bincount(gene2, minlength=len(self.genes))
+            offsets = np.concatenate(([0], np.cumsum(counts)))
+            np.save(offsets_file, offsets)
+            if offsets[-1] == 0:
+                # an empty array can not be memory-mapped.
+                np.save(rows_file, np.zeros(0, dtype=np.int64))
+                rows = None
+            else:
+                rows = np.lib.format.open_memmap(rows_file, mode="w+", dtype=np.int64, shape=(int(offsets[-1]),))
+            cursor = offsets[:-1].copy()
+            start = 0
+            for gene1, gene2, _ in self.get_Chunks(chunk_size):
+                genes = np.concatenate((gene1, gene2)).astype(np.int64)
+                edges = np.tile(np.arange(start, start + len(gene1), dtype=np.int64), 2)
+                order = np.lexsort((edges, genes))
+                genes, edges = genes[order], edges[order]
+                first = np.searchsorted(genes, genes)  # rank of each edge among the edges of its gene in the chunk
+                rows[cursor[genes] + np.arange(len(genes)) - first] = edges
+                cursor += np.bincount(genes, minlength=len(self.genes))
+                start += len(gene1)
+            if rows is not None:
+                rows.flush()
+                del rows
+            self.manifest["gene_index"] = len(self)
+            self.save_Manifest()
+        self.GeneIndex = (np.load(offsets_file), load_Array(rows_file))
+        return self.GeneIndex
+
+    def get_TopK(self, genes, max_number=10):
+        """rows of the max_number highest scores among the edges of genes, ties in the store order."""
+        if self.GeneIndex is None:
+            self.build_GeneIndex()
+        offsets, rows = self.GeneIndex
+        rows = np.unique(np.concatenate([rows[offsets[g]:offsets[g + 1]] for g in genes] or [np.zeros(0, dtype=np.int64)]))
+        score = np.asarray(self.get_Arrays()["score"][rows], dtype=np.float64)
+        return rows[np.lexsort((rows, -score))][:max_number]
@@ -5,17 +5,21 @@
 
 # load packages
 import csv
-from collections import defaultdict
+import numpy as np
+import pandas as pd
 
 
 # load our modules
 import config
 basicConfig = config.basicConfig
-from helper import get_GeneIDNameMapping, get_GOIDNameMapping
-# Gene ID -- Gene Name
-Gene_id2name, Gene_name2id, Gene_altid2id = get_GeneIDNameMapping(basicConfig.HumanGeneInformation)
-# GO ID -- GO Name
-GO_id2name, GO_name2id, GO_id2level, GO_id2children, GO_id2namespace, GO_altid2id = get_GOIDNameMapping(basicConfig.GO_INFO)
+from helper import knowledge
+from Interning import CSRMapping, intern_Strings
+from Telemetry import telemetry
+
+
+class UnsortedFileError(ValueError):
+    # an entity file is not sorted by PMID, the sort-merge join of EntityMapping falls back to the hash join.
+    pass
 
 
 class EntityMapping:
@@ -23,6 +27,14 @@ class EntityMapping:
     This is the EntityMapping class to get the Gene-Pubmed mapping and GO-Pubmed mapping.
     For a given pmid list, we extract related entities (Gene, GO)e, and convert into the predefined format.
 
+    The mappings are CSR arrays of int32 codes (see Interning.py): PMIDGeneMapping and PMIDGoMapping (PMID -> the
+    Gene / GO IDs mentioned, in the order of the files), GeneMapping and GoMapping (Gene / GO -> PMIDs).
+
+    With streaming, the entity files are read row by row and joined by PMID, only the rows of the input PMIDs
+    are kept: a sort-merge join when both files are sorted by PMID (string order), otherwise a hash join that
+    keeps the GOs of the PMIDs with a GO, then probes them with the Gene rows. JoinCounter reports the join and
+    the rows read.
+
     Args:
         pmid_list_path (:obj: 'string'):
             a file of pubmed id.
@@ -30,81 +42,203 @@ class EntityMapping:
             a file path which records the Gene entity related to Pubmed id.
         pubmed2go_path (:obj: 'string'):
             a file path which records the GO entity related to Pubmed id.
+        streaming (:obj: 'bool'):
+            join the entity files row by row instead of reading them whole.
     """
-    def __init__(self, pmid_list_path, pubmed2gene_path=None, pubmed2go_path=None):
+    def __init__(self, pmid_list_path, pubmed2gene_path=None, pubmed2go_path=None, streaming=False):
         self.pmid_list_path = pmid_list_path
         self.pubmed2gene_path = pubmed2gene_path
         self.pubmed2go_path = pubmed2go_path
+        self.streaming = streaming
+        self.JoinCounter = {"join": "read", "gene_rows": 0, "go_rows": 0, "pmids": 0}
 
-        with open(self.pmid_list_path, "r") as f1:
-            self.input_pmid_list = [line.strip() for line in f1]
+        with telemetry.span("load_pmids") as items, open(self.pmid_list_path, "r") as f1:
+            self.input_pmid_codes, self.InputPMIDs = intern_Strings([line.strip() for line in f1])
+            items.update(pmids=len(self.input_pmid_codes), distinct=len(self.InputPMIDs))
 
         self.pmid_list = list()
-        self.PMIDEntitesMapping = dict()
+        self.PMIDGeneMapping = None
+        self.PMIDGoMapping = None
         self.get_PMIDEntitesMappingWithFiles()
 
-        self.GeneMapping = defaultdict(list)
-        self.get_GeneMapping()
-        self.GoMapping = defaultdict(list)
-        self.get_GoMapping()
+        self.GeneMapping = None
+        self.GoMapping = None
+        with telemetry.span("transpose") as items:
+            self.get_GeneMapping()
+            self.get_GoMapping()
+            items.update(genes=len(self.GeneMapping), gos=len(self.GoMapping))
+
+    def read_Entities(self, path):
+        # (PMID code, term) of each entity of the input PMIDs, a PMID listed twice keeps its last row.
+        df = pd.read_csv(path, header=None, usecols=[0, 1], dtype=str, keep_default_na=False)
+        df = df.drop_duplicates(0, keep="last")
+        codes = self.InputPMIDs.get_Codes(df[0].values)
+        df, codes = df[codes >= 0], codes[codes >= 0]
+        # one split of the joined terms instead of a list per row.
+        counts = df[1].str.count(";").values + 1
+        terms = pd.Series(";".join(df[1].values).split(";") if len(df) else [], dtype=object)
+        return np.repeat(codes, counts), terms
+
+    def iter_Rows(self, path, kind):
+        # (PMID code, PMID, terms) of the rows of the input PMIDs, one row at a time.
+        with open(path, "r") as f:
+            for row in csv.reader(f):
+                self.JoinCounter[kind] += 1
+                code = self.InputPMIDs.get_Code(row[0])
+                if code >= 0:
+                    yield code, row[0], row[1]
+
+    @staticmethod
+    def iter_Sorted(rows):
+        # the last row of each PMID of rows sorted by PMID, UnsortedFileError as soon as a PMID is out of order.
+        last = None
+        for row in rows:
+            if last is not None and row[1] != last[1]:
+                if row[1] < last[1]:
+                    raise UnsortedFileError(row[1])
+                yield last
+            last = row
+        if last is not None:
+            yield last
+
+    def join_Entities(self, get_genes, get_gos):
+        """{PMID code: (Genes, GOs)} of the input PMIDs with both, joined row by row."""
+        try:
+            self.JoinCounter.update(join="sort-merge", gene_rows=0, go_rows=0)
+            entities = dict()
+            gene_rows = self.iter_Sorted(self.iter_Rows(self.pubmed2gene_path, "gene_rows"))
+            go_rows = self.iter_Sorted(self.iter_Rows(self.pubmed2go_path, "go_rows"))
+            gene, go = next(gene_rows, None), next(go_rows, None)
+            while gene is not None and go is not None:
+                if gene[1] < go[1]:
+                    gene = next(gene_rows, None)
+                elif go[1] < gene[1]:
+                    go = next(go_rows, None)
+                else:
+                    genes, gos = get_genes(gene[2]), get_gos(go[2])
+                    if genes and gos:
+                        entities[gene[0]] = (genes, gos)
+                    gene, go = next(gene_rows, None), next(go_rows, None)
+            # the rest of the other file has no match, but is read to check its order: an unsorted tail may
+            # hide a match of the rows already passed.
+            for _ in gene_rows:
+                pass
+            for _ in go_rows:
+                pass
+            return entities
+        except UnsortedFileError:
+            pass
+
+        # hash join, a PMID listed twice keeps its last row. The GOs are the build side: only the children of the
+        # GO terms of knowledge are kept, far fewer PMIDs have a GO than a Gene.
+        self.JoinCounter.update(join="hash", gene_rows=0, go_rows=0)
+        go_entities = dict()
+        for code, _, terms in self.iter_Rows(self.pubmed2go_path, "go_rows"):
+            gos = get_gos(terms)
+            if gos:
+                go_entities[code] = gos
+            else:
+                go_entities.pop(code, None)
+        entities = dict()
+        for code, _, terms in self.iter_Rows(self.pubmed2gene_path, "gene_rows"):
+            if code in go_entities:
+                entities[code] = get_genes(terms)
+        return {code: (genes, go_entities[code]) for code, genes in entities.items() if genes}
+
+    def stream_Entities(self, Gene_altid2id, GO_id2name, GO_altid2id):
+        # (PMID code, Gene) and (PMID code, GO) arrays of the streaming join, in the input order of the PMIDs.
+        # the terms are looked up in the knowledge once, then in these dicts of the terms seen.
+        gene_terms, go_terms = dict(), dict()
+
+        def get_genes(terms):
+            for g in terms.split(";"):
+                if g not in gene_terms:
+                    gene_terms[g] = Gene_altid2id.get(g)
+            return [gene_terms[g] for g in terms.split(";") if gene_terms[g]]
+
+        def get_gos(terms):
+            for g in terms.split(";"):
+                if g not in go_terms:
+                    go_terms[g] = GO_altid2id.get(g, g) if GO_id2name.get(g) else None
+            return [go_terms[g] for g in terms.split(";") if go_terms[g]]
+
+        entities = self.join_Entities(get_genes, get_gos)
+        codes = sorted(entities)
+        arrays = list()
+        for i in range(2):
+            counts = [len(entities[code][i]) for code in codes]
+            arrays.append(np.repeat(np.array(codes, dtype=np.int32), counts))
+            arrays.append(np.array([term for code in codes for term in entities[code][i]], dtype=object))
+        return arrays
 
     # 获得PMID对于的Gene和GO，gene必须全部是出现在我们HumanGeneInformation中的。
     def get_PMIDEntitesMappingWithFiles(self):
-        PMIDEntitesMapping = dict()
-        input_pmid_dict = {pmid: "input_pmid" for pmid in self.input_pmid_list}
-
-        for pmid in self.input_pmid_list:
-            PMIDEntitesMapping[pmid] = {"Gene": list(), "GO": list()}
-
-        with open(self.pubmed2gene_path, "r") as f1:
-            rows = list(csv.reader(f1))
-            for row in rows:
-                pmid, this_genes = row[0], row[1].split(";")
-                if input_pmid_dict.get(pmid):
-                    PMIDEntitesMapping[pmid]["Gene"] = [Gene_altid2id.get(g, g) for g in this_genes if Gene_altid2id.get(g)]
-
-        with open(self.pubmed2go_path, "r") as f2:
-            rows = list(csv.reader(f2))
-            for row in rows:
-                pmid, this_gos = row[0], row[1].split(";")
-                if input_pmid_dict.get(pmid):
-                    PMIDEntitesMapping[pmid]["GO"] = [GO_altid2id.get(g, g) for g in this_gos if GO_id2name.get(g)]
-
-        self.PMIDEntitesMapping = {k:v for k,v in PMIDEntitesMapping.items() if v["Gene"] and v["GO"]}
-        self.pmid_list = self.PMIDEntitesMapping.keys() # 这是基因都是HumanGeneInformation里的PMID
+        Gene_id2name, Gene_name2id, Gene_altid2id = knowledge.get("Gene")
+        GO_id2name, GO_name2id, GO_id2level, GO_id2children, GO_id2namespace, GO_altid2id = knowledge.get("GO")
+
+        with telemetry.span("load_entities", join="stream" if self.streaming else "read") as items:
+            if self.streaming:
+                gene_pmid, genes, go_pmid, gos = self.stream_Entities(Gene_altid2id, GO_id2name, GO_altid2id)
+            else:
+                gene_pmid, genes = self.read_Entities(self.pubmed2gene_path)
+                genes = Gene_altid2id.get_Values(genes.values, default="")
+                keep = genes.astype(bool)
+                gene_pmid, genes = gene_pmid[keep], genes[keep]
+
+                go_pmid, gos = self.read_Entities(self.pubmed2go_path)
+                keep = GO_id2name.get_Values(gos.values, default="").astype(bool)
+                gos = GO_altid2id.get_Values(gos.values, default=gos.values)
+                go_pmid, gos = go_pmid[keep], gos[keep]
+            items.update(gene_entities=len(genes), go_entities=len(gos))
+
+        # the PMIDs with both Gene and GO, in the input order.
+        with telemetry.span("join") as items:
+            n = len(self.InputPMIDs)
+            pmids = (np.bincount(gene_pmid, minlength=n) > 0) & (np.bincount(go_pmid, minlength=n) > 0)
+            pmid_codes = np.cumsum(pmids) - 1
+            self.pmid_list = self.InputPMIDs.strings[pmids].tolist()  # 这是基因都是HumanGeneInformation里的PMID
+            self.JoinCounter["pmids"] = len(self.pmid_list)
+            _, PMIDs = intern_Strings(self.pmid_list)
+            self.PMIDGeneMapping = self.get_PMIDMapping(pmid_codes[gene_pmid[pmids[gene_pmid]]], genes[pmids[gene_pmid]], PMIDs)
+            self.PMIDGoMapping = self.get_PMIDMapping(pmid_codes[go_pmid[pmids[go_pmid]]], gos[pmids[go_pmid]], PMIDs)
+            items.update(pmids=len(self.pmid_list), gene_entities=len(self.PMIDGeneMapping.indices),
+                         go_entities=len(self.PMIDGoMapping.indices))
+
+    @staticmethod
+    def get_PMIDMapping(pmid_codes, terms, PMIDs):
+        # the terms are coded in the order they are first seen in the PMIDs, the key order of the Gene/GO mapping.
+        order = np.argsort(pmid_codes, kind="stable")
+        term_codes, terms = intern_Strings(terms[order])
+        return CSRMapping.from_Pairs(pmid_codes[order], term_codes, PMIDs, terms)
 
     def get_GeneMapping(self, method="Pubtator"):
-        for pmid in self.pmid_list:
-            terms = self.PMIDEntitesMapping[pmid]["Gene"]
-            for term in terms:
-                self.GeneMapping[term].append(pmid)
+        self.GeneMapping = self.PMIDGeneMapping.transpose()
 
     def get_GoMapping(self, method="MetaMap"):
-        for pmid in self.pmid_list:
-            terms = self.PMIDEntitesMapping[pmid]["GO"]
-            for term in terms:
-                self.GoMapping[term].append(pmid)
+        self.GoMapping = self.PMIDGoMapping.transpose()
 
     def get_terms(self, pmid="10023698", type="Gene"):
-        terms = self.PMIDEntitesMapping[pmid][type]
+        terms = (self.PMIDGeneMapping if type == "Gene" else self.PMIDGoMapping).get_Terms(pmid)
         return terms
 
     def save_PMIDEntitesMapping(self, save_path=None):
         with open(save_path, "w") as f:
             f.write("PMID\tGene_ID\tGO_ID\n")
-            for pmid in self.PMIDEntitesMapping:
-                genes = ";".join(self.PMIDEntitesMapping[pmid]["Gene"])
-                gos = ";".join(self.PMIDEntitesMapping[pmid]["GO"])
-                f.write("{}\t{}\t{}\n".format(pmid, genes, gos))
+            for (pmid, genes), (_, gos) in zip(self.PMIDGeneMapping.items(), self.PMIDGoMapping.items()):
+                f.write("{}\t{}\t{}\n".format(pmid, ";".join(genes), ";".join(gos)))
 
     def save_GeneMapping(self, save_path=None):
+        Gene_id2name = knowledge.get("Gene")[0]
         with open(save_path, "w") as f:
             f.write(("Gene_ID\tGene_Terms\tPMID\n"))
-            for k,v in self.GeneMapping.items():
-                f.write("{}\t{}\t{}\n".format(k, Gene_id2name.get(k,k), ";".join(v)))
+            keys = np.array(self.GeneMapping.keys(), dtype=object)
+            for (k,v), name in zip(self.GeneMapping.items(), Gene_id2name.get_Values(keys, default=keys)):
+                f.write("{}\t{}\t{}\n".format(k, name, ";".join(v)))
 
     def save_GoMapping(self, save_path=None):
+        GO_id2name = knowledge.get("GO")[0]
         with open(save_path, "w") as f:
             f.write(("GO_ID\tGO_Terms\tPMID\n"))
-            for k,v in self.GoMapping.items():
-                f.write("{}\t{}\t{}\n".format(k, GO_id2name.get(k,k), ";".join(v)))
+            keys = np.array(self.GoMapping.keys(), dtype=object)
+            for (k,v), name in zip(self.GoMapping.items(), GO_id2name.get_Values(keys, default=keys)):
+                f.write("{}\t{}\t{}\n".format(k, name, ";".join(v)))
@@ -0,0 +1,71 @@
+# *_* coding: utf-8 *_*
+# @Time     : 10/18/2026
+# @Author   : zong hui
+# @object   : the Gene/GO information and evidence joined to the GOF.
+
+
+# load packages
+import numpy as np
+import pandas as pd
+
+
+class EvidenceIndex:
+    """
+    Lookups of the GOF columns added by CalculatePvalue.add_evidence, joined to a whole Gene-GO table at once:
+    Gene Name and Letter by Gene ID, GO Name, Level, Children and Namespace by GO ID, MSigDB membership of
+    (GO name, Gene name), NCBI gene2go PMID counts of (Gene ID, GO ID). The knowledge is read in place from the
+    int-coded arrays of its snapshots (see KnowledgeSnapshot.SnapshotMapping): only the distinct Genes and GOs of
+    the table are decoded, the children and PMID counts come from the CSR offsets. Missing values take the same
+    defaults as the dict lookups they replace.
+
+    Args:
+        Gene_id2name (:obj: 'SnapshotMapping'):
+            Gene ID -- Gene Name.
+        GO_id2name, GO_id2level, GO_id2children, GO_id2namespace (:obj: 'SnapshotMapping'):
+            GO ID -- GO Name, level, children list, namespace.
+        MSigDB_GO2Gene (:obj: 'SnapshotMapping'):
+            lower case GO name -- MSigDB gene symbols.
+        NCBI_GeneGO2PMID (:obj: 'SnapshotMapping'):
+            (Gene ID, GO ID) -- PMIDs.
+    """
+
+    def __init__(self, Gene_id2name, GO_id2name, GO_id2level, GO_id2children, GO_id2namespace,
+                 MSigDB_GO2Gene, NCBI_GeneGO2PMID):
+        self.Gene_id2name = Gene_id2name
+        self.GO_id2name = GO_id2name
+        self.GO_id2level = GO_id2level
+        self.GO_id2children = GO_id2children
+        self.GO_id2namespace = GO_id2namespace
+        self.MSigDB_GO2Gene = MSigDB_GO2Gene
+        self.NCBI_GeneGO2PMID = NCBI_GeneGO2PMID
+
+    def join(self, gene_ids, go_ids):
+        """
+        Returns a DataFrame of Gene_Name, Letter, GO_Name, GO_Level, GO_Children, GO_Namespace, GSEA_MSigDB
+        and NCBI_Entrez, one row for each (gene_id, go_id), in the input order.
+        """
+        gene_inv, gene_u = pd.factorize(pd.Series(list(gene_ids), dtype=object))
+        go_inv, go_u = pd.factorize(pd.Series(list(go_ids), dtype=object))
+        gene_u, go_u = np.asarray(gene_u, dtype=object), np.asarray(go_u, dtype=object)
+
+        # information of the distinct genes and GOs, missing ones fall back to their ID.
+        gene_name = self.Gene_id2name.get_Values(gene_u, default=gene_u)
+        letter = np.array([name.upper()[0] for name in gene_name], dtype=object)
+        go_name = self.GO_id2name.get_Values(go_u, default=go_u)
+        go_level = self.GO_id2level.get_Values(go_u, default=go_u)
+        go_children = self.GO_id2children.get_Lengths(go_u)
+        go_namespace = self.GO_id2namespace.get_Values(go_u, default=go_u)
+
+        # MSigDB membership and NCBI counts of the pairs.
+        go_lower = np.array([name.lower() for name in go_name], dtype=object)
+        msigdb = self.MSigDB_GO2Gene.get_Members(go_lower[go_inv], gene_name[gene_inv])
+        ncbi_count = self.NCBI_GeneGO2PMID.get_Lengths(gene_u[gene_inv], go_u[go_inv])
+
+        return pd.DataFrame({"Gene_Name": gene_name[gene_inv],
+                             "Letter": letter[gene_inv],
+                             "GO_Name": go_name[go_inv],
+                             "GO_Level": pd.Series(go_level[go_inv], dtype=object).infer_objects().values,
+                             "GO_Children": go_children[go_inv],
+                             "GO_Namespace": go_namespace[go_inv],
+                             "GSEA_MSigDB": msigdb.astype(np.int64),
+                             "NCBI_Entrez": ncbi_count})
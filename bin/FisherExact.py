@@ -0,0 +1,131 @@
+# *_* coding: utf-8 *_*
+# @Time     : 10/18/2026
+# @Author   : zong hui
+# @object   : batched fisher exact test of Gene-GO contingency tables sharing the same PMID number.
+
+
+# load packages
+import numpy as np
+from scipy.special import gammaln
+from scipy.stats import hypergeom
+
+
+class FisherExact:
+    """
+    Fisher exact test for whole arrays of 2x2 contingency tables [[a, b], [c, d]] with a + b + c + d <= N.
+    The hypergeometric probabilities come from a log-factorial table precomputed up to N, and identical
+    tables are tested only once.
+
+    'two-sided' follows scipy.stats.fisher_exact: the sum of the probabilities of all tables not more likely
+    than the observed one, and 1.0 when the observed table is the mode. 'greater' is the one-sided
+    hypergeometric test P(X >= a). The p-values agree with scipy.stats.fisher_exact to a relative tolerance
+    of 1e-9, and the tables counted are the same: a table is "not more likely" when its probability is within
+    1e-14 (relErr, as scipy) of the observed one. The log-factorial probabilities carry a rounding error of a few
+    eps * log(N!) (1e-13 at N = 100, 1e-10 at N = 50000), larger than relErr, so the tables that close to the
+    observed one (the tied tables, the second mode) are decided again with scipy.stats.hypergeom.
+
+    Args:
+        N (:obj: 'int'):
+            the largest table total, the number of PMIDs of the case.
+        alternative (:obj: 'string'):
+            'two-sided' or 'greater'.
+        chunk_size (:obj: 'int'):
+            the number of hypergeometric terms evaluated at once.
+    """
+    relErr = 1 + 1e-14
+
+    def __init__(self, N, alternative='two-sided', chunk_size=1 << 22):
+        if alternative not in ('two-sided', 'greater'):
+            raise ValueError("alternative should be 'two-sided' or 'greater'")
+        self.N = int(N)
+        self.alternative = alternative
+        self.chunk_size = chunk_size
+        self.log_factorial = gammaln(np.arange(self.N + 1) + 1.0)
+        # log-probabilities closer than this to each other may be in either order, the bound of the rounding error.
+        self.margin = np.log(self.relErr) + 64 * np.finfo(np.float64).eps * self.log_factorial[-1]
+
+    def pvalue(self, a, b, c, d):
+        tables = np.stack([np.asarray(x, dtype=np.int64) for x in (a, b, c, d)], axis=1)
+        if tables.shape[0] == 0:
+            return np.zeros(0, dtype=np.float64)
+        if tables.min() < 0 or tables.sum(axis=1).max() > self.N:
+            raise ValueError("contingency tables should be non-negative, with a total not larger than N={}".format(self.N))
+        unique_tables, inverse = np.unique(tables, axis=0, return_inverse=True)
+        return self.pvalue_unique(unique_tables)[inverse.reshape(-1)]
+
+    def log_pmf(self, x, K, n, N):
+        # hypergeometric log-probability of x successes in n draws, K successes in a population of N.
+        lf = self.log_factorial
+        return (lf[K] - lf[x] - lf[K - x] + lf[N - K] - lf[n - x] - lf[N - K - n + x]
+                - lf[N] + lf[n] + lf[N - n])
+
+    @staticmethod
+    def get_Sum(log_p, starts, owner):
+        # the probabilities of each table summed in log space, so tiny pvalues keep their precision until the final exp.
+        log_p_max = np.maximum.reduceat(log_p, starts)
+        shift = np.where(np.isfinite(log_p_max), log_p_max, 0.0)  # a table without terms sums to 0
+        total = np.add.reduceat(np.exp(log_p - shift[owner]), starts)
+        with np.errstate(divide='ignore'):
+            return np.exp(shift + np.log(total))
+
+    @staticmethod
+    def get_ExactDiff(x, a, K, n, N):
+        # log P(x) - log P(a) from the hypergeometric of scipy, for the few tables our log-factorials can not order.
+        if len(x) == 0:
+            return np.zeros(0, dtype=np.float64)
+        return hypergeom.logpmf(x, N, K, n) - hypergeom.logpmf(a, N, K, n)
+
+    def pvalue_unique(self, tables):
+        a, b, c, d = tables.T
+        K, n, N = a + b, a + c, a + b + c + d
+        # support of the hypergeometric distribution.
+        lo = np.maximum(0, K + n - N)
+        hi = np.minimum(K, n)
+        length = hi - lo + 1
+
+        pvalues = np.ones(len(tables), dtype=np.float64)
+        for start, end in self.get_chunks(length):
+            pvalues[start:end] = self.pvalue_chunk(a[start:end], K[start:end], n[start:end], N[start:end],
+                                                   lo[start:end], length[start:end])
+        return pvalues
+
+    def get_chunks(self, length):
+        # split the tables so that each chunk holds about chunk_size hypergeometric terms.
+        cumsum = np.cumsum(length)
+        start = 0
+        while start < len(length):
+            offset = cumsum[start - 1] if start > 0 else 0
+            end = max(start + 1, int(np.searchsorted(cumsum, offset + self.chunk_size, side='right')))
+            yield start, end
+            start = end
+
+    def pvalue_chunk(self, a, K, n, N, lo, length):
+        # flatten the supports of all tables in the chunk, table i owns [starts[i], starts[i]+length[i]).
+        starts = np.concatenate(([0], np.cumsum(length)[:-1]))
+        owner = np.repeat(np.arange(len(a)), length)
+        x = lo[owner] + np.arange(owner.size) - starts[owner]
+        log_p = self.log_pmf(x, K[owner], n[owner], N[owner])
+
+        if self.alternative == 'greater':
+            # P(X >= a) = 1 - P(X < a) when the lower tail is small: summed directly it would round to 1.0, and a
+            # pvalue just below 1.0 keeps the pair.
+            upper = x >= a[owner]
+            lower = self.get_Sum(np.where(upper, -np.inf, log_p), starts, owner)
+            return np.minimum(1.0, np.where(lower < 0.5, 1.0 - lower, self.get_Sum(np.where(upper, log_p, -np.inf), starts, owner)))
+
+        # the tables not more likely than the observed one, the close ones ordered by scipy.
+        log_p_exact = self.log_pmf(a, K, n, N)
+        diff = log_p - log_p_exact[owner]
+        counted = diff <= 0
+        close = np.flatnonzero((np.abs(diff) <= self.margin) & (x != a[owner]))
+        counted[close] = self.get_ExactDiff(x[close], a[owner[close]], K[owner[close]], n[owner[close]], N[owner[close]]) <= np.log(self.relErr)
+        pvalues = np.minimum(1.0, self.get_Sum(np.where(counted, log_p, -np.inf), starts, owner))
+
+        # 1.0 at the mode, or at a table as likely as the mode (within relErr, as scipy).
+        mode = ((n + 1) * (K + 1)) // (N + 2)
+        diff = self.log_pmf(mode, K, n, N) - log_p_exact
+        at_mode = diff <= 0
+        close = np.flatnonzero((np.abs(diff) <= self.margin) & (a != mode))
+        at_mode[close] = self.get_ExactDiff(mode[close], a[close], K[close], n[close], N[close]) <= -np.log1p(-1e-14)
+        pvalues[at_mode] = 1.0
+        return pvalues
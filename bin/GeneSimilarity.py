@@ -4,68 +4,240 @@
 
 
 # load packages
-import math
+import hashlib
+import multiprocessing
+import numpy as np
 import pandas as pd
 from tqdm import tqdm
-from collections import defaultdict
 
 
 # load our modules
 import config
 basicConfig = config.basicConfig
-from helper import get_GeneIDNameMapping
-# Gene ID -- Gene Name
-Gene_id2name, Gene_name2id, Gene_altid2id = get_GeneIDNameMapping(basicConfig.HumanGeneInformation)
+from helper import knowledge
+from ResultIndex import ResultIndex, GGSS_KEYS
+from SparseSimilarity import SparseSimilarity
+from MinHashLSH import MinHashLSH
+from RunningStats import RunningStats, TopKBuffer
+from EdgeStore import EdgeStore
+from KnowledgeSnapshot import get_SourceHash
+from Interning import CSRMapping, Vocabulary, intern_Strings
+from Telemetry import telemetry
+
+
+def get_GOFHash(GOF_file):
+    # fingerprint of the GOF of an edge store, of the csv file or of the GOF columns of the DataFrame.
+    if not isinstance(GOF_file, pd.DataFrame):
+        return get_SourceHash([GOF_file])
+    values = pd.util.hash_pandas_object(GOF_file[["Gene_ID", "GO_ID", "Adjusted_Pvalue"]].astype(str), index=False)
+    return hashlib.sha1(values.values.tobytes()).hexdigest()
+
+
+# SparseSimilarity engine inherited by the forked workers of GeneSimilarity.
+_SharedEngine = None
+
+
+def calculate_block_worker(block):
+    (start, end), (start2, end2) = block
+    return _SharedEngine.get_Similarity(start, end, start2, end2)
 
 
 class GeneSimilarity:
-    def __init__(self, GOF_file):
-        self.GOF = dict
+    """
+    Calculate the Gene-Gene Similarity Score (GGSS) of a GOF.
+    Args:
+        GOF_file (:obj: 'string' or 'DataFrame'):
+            the GOF csv file of step2, or the GOF handed over in memory (CalculatePvalue.GeneGoEnrichment).
+        streaming (:obj: 'bool'):
+            never hold all the edges: the first pass only keeps the running statistics of the scores and the
+            nodes, save_GGSS computes the edges again and keeps the top percentage in a bounded buffer, or writes
+            all the edges block by block (in the order of the genes instead of the scores).
+        store (:obj: 'string'):
+            out-of-core: the folder of an EdgeStore, the edges are computed tile by tile (tile_size genes a side)
+            into memory-mapped columns, resuming the finished tiles of an interrupted run. The streaming steps and
+            the queries read the edges from the store. Implies streaming.
+        tile_size (:obj: 'int'):
+            genes on a side of a tile of the Gene x Gene matrix.
+        workers (:obj: 'int'):
+            the number of worker processes, the blocks (ranges of the same number of genes, 4 per worker, or the
+            tiles) are computed in parallel and merged in the block order, so the GGSS is the same as with one
+            process (with streaming, up to the last digits of the statistics of the scores). A GOF of less than
+            min_terms candidate terms is computed in this process.
+        approximate (:obj: 'bool'):
+            approximate GGSS: only the candidate pairs of MinHashLSH (num_perm, bands) are scored (exactly), the
+            other edges are missing, mostly of low scores. The top percentage of save_GGSS is taken of the estimated
+            number of edges of the exact GGSS, the scalers use the statistics of the scored pairs. See get_Recall.
+    """
+    min_terms = 1 << 20
+    def __init__(self, GOF_file, streaming=False, store=None, tile_size=2048, workers=1, approximate=False, num_perm=128, bands=64):
+        self.streaming = streaming or bool(store)
+        self.workers = workers
+        self.engine = None
+        self.store = None
+        self.lsh = None
+        self.ApproximateEdges = None
+        self.GeneNames = None
+        self.SimilarityStats = RunningStats()
+        self.GOF = None
         self.GOF_Genes = list()
         self.GOF_GOs = list()
         self.GGSS_Node = set()
         self.GGSS_Edge = set()
+        self.index = None
+        self.GOCandidates = pd.DataFrame(columns=["GO_ID", "Genes", "Candidate_Pairs"])
+        self.CandidateCounter = dict()
 
         self.GeneGeneSimilarity = pd.DataFrame(
             columns=["Gene1_ID", "Gene1_Name", "Gene2_ID", "Gene2_Name", "Similarity_Score","Similarity_Score(MinMaxScaler)", "Similarity_Score(StandardScaler)"])
-        self.get_GOF(GOF_file)
-        self.calculate_GeneGeneSimilarity()
-        self.normalize_GeneGeneSimilarity()
+        with telemetry.span("load") as items:
+            self.get_GOF(GOF_file)
+            items.update(genes=len(self.GOF_Genes), gos=len(self.GOF_GOs), rows=len(self.GOF.indices))
+        if approximate:
+            with telemetry.span("lsh", num_perm=num_perm, bands=bands) as items:
+                self.lsh = MinHashLSH(self.get_Engine(), num_perm=num_perm, bands=bands)
+                items.update(candidate_pairs=self.lsh.Counter["candidate_pairs"])
+        elif store:
+            with telemetry.span("store", tile_size=tile_size):
+                self.build_EdgeStore(store, GOF_file, tile_size)
+        with telemetry.span("pairs", streaming=self.streaming) as items:
+            if self.streaming:
+                self.scan_GeneGeneSimilarity()
+            else:
+                self.calculate_GeneGeneSimilarity()
+            items.update(self.CandidateCounter)
+        if not self.streaming:
+            with telemetry.span("normalization", edges=len(self.GeneGeneSimilarity)):
+                self.normalize_GeneGeneSimilarity()
 
     def get_GOF(self, GOF_file):
-        self.GOF = defaultdict(dict)
-        df = pd.read_csv(GOF_file, keep_default_na=False)
-        for (gene, go, ap) in zip(df["Gene_ID"], df["GO_ID"], df["Adjusted_Pvalue"]):
-            self.GOF[str(gene)][go] = ap
+        # Gene -> GO CSRMapping of the Adjusted_Pvalue, rows in the order of GOF_Genes, the GOs of a gene in file order.
+        if isinstance(GOF_file, pd.DataFrame):
+            df = GOF_file[["Gene_ID", "GO_ID", "Adjusted_Pvalue"]]
+            try:
+                # the Gene_ID type of the csv file (int for the Entrez IDs), so that GOF_Genes has the same order.
+                df = df.assign(Gene_ID=df["Gene_ID"].astype(np.int64))
+            except ValueError:
+                pass
+        else:
+            df = pd.read_csv(GOF_file, keep_default_na=False, float_precision="round_trip")  # the values of the GOF in memory
+        df = df.drop_duplicates(["Gene_ID", "GO_ID"], keep="last")
         self.GOF_Genes = [str(g) for g in list(set(df["Gene_ID"].tolist()))]
         self.GOF_GOs = list(set(df["GO_ID"].tolist()))
+        genes = Vocabulary(self.GOF_Genes)
+        gene_codes = genes.get_Codes(df["Gene_ID"].astype(str).values)
+        order = np.argsort(gene_codes, kind="stable")
+        go_codes, gos = intern_Strings(df["GO_ID"].values[order])  # first seen order of the genes, not hash order
+        self.GOF = CSRMapping.from_Pairs(gene_codes[order], go_codes, genes, gos, df["Adjusted_Pvalue"].values[order])
+
+    def get_Engine(self):
+        # the sparse GGSS engine of the GOF, and the candidate pairs of each GO.
+        if self.engine is None:
+            self.engine = SparseSimilarity(self.GOF)
+            go_genes, go_pairs = self.engine.get_GOCandidates()
+            self.GOCandidates = pd.DataFrame({"GO_ID": self.engine.gos, "Genes": go_genes, "Candidate_Pairs": go_pairs})
+            self.GOCandidates = self.GOCandidates.sort_values("Candidate_Pairs", ascending=False, kind="stable")
+        return self.engine
+
+    def build_EdgeStore(self, store, GOF_file, tile_size):
+        # compute the missing tiles of the edge store, each tile is checkpointed once appended.
+        engine = self.get_Engine()
+        self.store = EdgeStore(store, self.GOF_Genes, tile_size=tile_size, fingerprint=get_GOFHash(GOF_file))
+        tiles = [tile for tile in engine.get_Tiles(tile_size) if not self.store.is_Done(tile)]
+        tqdm_tiles = tqdm(zip(tiles, self.map_Blocks(tiles)), total=len(tiles), ncols=80)
+        for tile, result in tqdm_tiles:
+            tqdm_tiles.set_description("Calculate Gene-Gene Similarity Tiles")
+            self.store.append(tile, *result)
+        tqdm_tiles.close()
+
+    def map_Blocks(self, blocks):
+        # (gene1, gene2, score) of each block ((start, end), (start2, end2)), in the order of blocks.
+        engine = self.get_Engine()
+        if self.workers > 1 and len(blocks) > 1 and "fork" in multiprocessing.get_all_start_methods():
+            # the forked workers read the engine matrices from the parent, only block bounds are pickled.
+            global _SharedEngine
+            _SharedEngine = engine
+            try:
+                with multiprocessing.get_context("fork").Pool(self.workers) as pool:
+                    yield from pool.imap(calculate_block_worker, blocks, chunksize=1)
+            finally:
+                _SharedEngine = None
+        else:
+            for (start, end), (start2, end2) in blocks:
+                yield engine.get_Similarity(start, end, start2, end2)
+
+    def get_SimilarityBlocks(self, exact=False):
+        # (gene1, gene2, score) of each block of genes, gene1 and gene2 index self.GOF_Genes.
+        if self.lsh is not None and not exact:
+            # the scored candidates are one block, computed once.
+            if self.ApproximateEdges is None:
+                self.ApproximateEdges = self.lsh.get_Similarity()
+            yield self.ApproximateEdges
+            return
+        if self.store is not None:
+            yield from self.store.get_Chunks()
+            return
+        engine = self.get_Engine()
+        # the process pool only pays off above about min_terms candidate terms (0.25 s of products, the pool of
+        # --workers takes 50-100 ms to start), smaller GOFs are computed in this process.
+        if self.workers > 1 and engine.get_Work().sum() >= self.min_terms:
+            blocks = engine.get_Shards(4 * self.workers)
+        else:
+            blocks = engine.get_Blocks()
+        blocks = [((start, end), (start, len(engine.genes))) for start, end in blocks]
+        tqdm_blocks = tqdm(self.map_Blocks(blocks), total=len(blocks), ncols=80)
+        for result in tqdm_blocks:
+            tqdm_blocks.set_description("Calculate Gene-Gene Similarity Score")
+            yield result
+        tqdm_blocks.close()
+
+    def get_GeneNames(self):
+        # ID and Name arrays of self.GOF_Genes.
+        if self.GeneNames is None:
+            Gene_id2name = knowledge.get("Gene")[0]
+            genes = np.array(self.GOF_Genes, dtype=object)
+            self.GeneNames = (genes, Gene_id2name.get_Values(genes, default=genes))
+        return self.GeneNames
+
+    def get_GGSSTable(self, gene1, gene2, score, scaled=False):
+        genes, names = self.get_GeneNames()
+        gene1, gene2 = gene1.astype(np.int64), gene2.astype(np.int64)
+        table = pd.DataFrame({"Gene1_ID": genes[gene1], "Gene1_Name": names[gene1],
+                              "Gene2_ID": genes[gene2], "Gene2_Name": names[gene2],
+                              "Similarity_Score": score},
+                             columns=self.GeneGeneSimilarity.columns)
+        if scaled:
+            # the same scaling as normalize_GeneGeneSimilarity, with the statistics of all the edges.
+            stats = self.SimilarityStats
+            table["Similarity_Score(MinMaxScaler)"] = (score - stats.min) / (stats.max - stats.min)
+            table["Similarity_Score(StandardScaler)"] = (score - stats.mean) / stats.std
+        return table
 
     def calculate_GeneGeneSimilarity(self):
-        # calculate gene similarity based on modified inner product.
-        D = list()
-        tqdm_GOF_Genes = tqdm(self.GOF_Genes, ncols=80)
-        for gene1 in tqdm_GOF_Genes:
-            tqdm_GOF_Genes.set_description("Calculate Gene-Gene Similarity Score")
-            gene1_index = self.GOF_Genes.index(gene1)
-            gene1_go = self.GOF[gene1]
-            for gene2 in self.GOF_Genes[gene1_index+1:]:
-                gene2_go = self.GOF[gene2]
-                both_gene_go = set(gene1_go) & set(gene2_go)
-                only_gene1_go = set(gene1_go) - set(gene2_go)
-                only_gene2_go = set(gene2_go) - set(gene1_go)
-                score = 0.0
-                if len(both_gene_go) != 0:
-                    numerator, demominator = 0.0, 0.0
-                    for g in both_gene_go:
-                        if self.GOF[gene1][g] > 0 and self.GOF[gene2][g] > 0:
-                            numerator += math.log(self.GOF[gene1][g]) * math.log(self.GOF[gene2][g])
-                    demominator = max(1.0, 0.5 * (len(only_gene1_go) + len(only_gene2_go)))
-                    score = numerator / demominator
-                    D.append({"Gene1_ID":gene1, "Gene1_Name":Gene_id2name.get(gene1,gene1), "Gene2_ID":gene2, "Gene2_Name":Gene_id2name.get(gene2,gene2), "Similarity_Score":score})
-                    self.GGSS_Node.update({gene1, gene2})
-                    self.GGSS_Edge.add((gene1, gene2))
-        self.GeneGeneSimilarity = self.GeneGeneSimilarity.append(D, ignore_index=True)
-        tqdm_GOF_Genes.close()
+        # calculate gene similarity based on modified inner product, with sparse Gene x GO matrix products.
+        results = list(self.get_SimilarityBlocks())
+        gene1, gene2, score = [np.concatenate([r[i] for r in results]) if results else np.zeros(0) for i in range(3)]
+        self.GeneGeneSimilarity = self.get_GGSSTable(gene1, gene2, score)
+        genes = np.array(self.GOF_Genes, dtype=object)
+        gene1, gene2 = gene1.astype(np.int64), gene2.astype(np.int64)
+        self.GGSS_Node.update(genes[gene1].tolist() + genes[gene2].tolist())
+        self.GGSS_Edge.update(zip(genes[gene1].tolist(), genes[gene2].tolist()))
+        self.CandidateCounter = {"genes": len(genes), "all_pairs": len(genes) * (len(genes) - 1) // 2,
+                                 "candidate_pairs": int(self.GOCandidates["Candidate_Pairs"].sum()), "edges": len(gene1),
+                                 "blocks": len(results)}
+
+    def scan_GeneGeneSimilarity(self):
+        # streaming: the running statistics of the scores and the nodes, the edges are not kept (GGSS_Edge is empty).
+        node = np.zeros(len(self.GOF_Genes), dtype=bool)
+        blocks = 0
+        for gene1, gene2, score in self.get_SimilarityBlocks():
+            self.SimilarityStats.update(score)
+            node[gene1] = True
+            node[gene2] = True
+            blocks += 1
+        self.GGSS_Node.update(np.array(self.GOF_Genes, dtype=object)[node].tolist())
+        self.CandidateCounter = {"genes": len(self.GOF_Genes), "all_pairs": len(self.GOF_Genes) * (len(self.GOF_Genes) - 1) // 2,
+                                 "candidate_pairs": int(self.GOCandidates["Candidate_Pairs"].sum()),
+                                 "edges": self.SimilarityStats.count, "blocks": blocks}
 
     def normalize_GeneGeneSimilarity(self):
         # normalize scores by scaling each score to a given range.
@@ -82,21 +254,111 @@ class GeneSimilarity:
         # Sorted in descending order by Similarity Score.
         self.GeneGeneSimilarity.sort_values(by="Similarity_Score", inplace=True, ascending=False)
 
+    def get_Index(self):
+        # top-k index of the GGSS, built on the first query.
+        if self.index is None:
+            self.index = ResultIndex(self.GeneGeneSimilarity, GGSS_KEYS)
+        return self.index
+
     def get_most_related_gene(self, term="CDK2", type="Name", max_number=10):
-        res = pd.DataFrame()
-        if type=="Name":
-            res = self.GeneGeneSimilarity.loc[(self.GeneGeneSimilarity["Gene1_Name"]==term) | (self.GeneGeneSimilarity["Gene1_Name"]==term)][:max_number]
-        if type=="ID":
-            res = self.GeneGeneSimilarity.loc[(self.GeneGeneSimilarity["Gene1_ID"] == term) | (self.GeneGeneSimilarity["Gene1_ID"] == term)][:max_number]
-        return res
+        # the pairs of term as Gene1 or Gene2, type is 'Name' or 'ID', the highest Similarity_Score first.
+        if self.store is not None:
+            return self.get_StoreTopK(term, type, max_number)
+        return self.get_Index().get_TopK(type, term, max_number)
+
+    def get_most_related_genes(self, terms=("CDK2",), type="Name", max_number=10):
+        if self.store is not None:
+            tables = [self.get_StoreTopK(term, type, max_number) for term in terms]
+            for term, table in zip(terms, tables):
+                table.insert(0, "Query", term)
+            return pd.concat(tables) if tables else self.GeneGeneSimilarity.iloc[:0]
+        return self.get_Index().get_TopK_batch(type, terms, max_number)
+
+    def get_StoreTopK(self, term, type="Name", max_number=10):
+        # the top pairs of term from the per-gene index of the edge store.
+        genes, names = self.get_GeneNames()
+        if type not in ("Name", "ID"):
+            raise KeyError("unknown key: {}, should be one of ['Name', 'ID']".format(type))
+        genes = np.flatnonzero((names if type == "Name" else genes) == str(term))
+        rows = self.store.get_TopK(genes, max_number)
+        arrays = self.store.get_Arrays()
+        return self.get_GGSSTable(arrays["gene1"][rows], arrays["gene2"][rows],
+                                  np.asarray(arrays["score"][rows], dtype=np.float64), scaled=True)
+
+    def get_EdgeCount(self):
+        # the number of edges of the GGSS, estimated for the exact GGSS in approximate mode.
+        if self.lsh is not None:
+            return self.lsh.Counter["estimated_edges"]
+        return self.SimilarityStats.count if self.streaming else self.GeneGeneSimilarity.shape[0]
+
+    def get_Recall(self, percentage=0.01):
+        """
+        Compare the top percentage of the approximate GGSS with the exact one, computed again block by block and
+        kept in a bounded buffer: the recall is the fraction of the exact top pairs in the approximate top, the
+        candidate recall the fraction among all the scored candidates.
+        """
+        n = len(self.GOF_Genes)
+        edges = self.get_EdgeCount()
+        for _ in range(2):
+            # the buffer is sized from the estimated number of edges, and once more if it was too small.
+            top, count = TopKBuffer(int(percentage * edges * 1.5) + 1), 0
+            for gene1, gene2, score in self.get_SimilarityBlocks(exact=True):
+                top.push(score, gene1, gene2)
+                count += len(score)
+            if int(percentage * count) <= top.k:
+                break
+            edges = count
+        _, gene1, gene2 = top.get()
+        exact = gene1[:int(percentage * count)].astype(np.int64) * n + gene2[:int(percentage * count)]
+        gene1, gene2, score = next(self.get_SimilarityBlocks())
+        candidates = gene1.astype(np.int64) * n + gene2
+        approximate = candidates[np.lexsort((candidates, -score))][:int(percentage * self.get_EdgeCount())]
+        return {"exact_edges": count, "estimated_edges": self.get_EdgeCount(), "exact_top": len(exact), "approximate_top": len(approximate),
+                "recall": np.isin(exact, approximate).mean() if len(exact) else 1.0,
+                "candidate_recall": np.isin(exact, candidates).mean() if len(exact) else 1.0}
+
+    def save_GOCandidates(self, save_path=None):
+        # the number of genes and candidate gene pairs of each GO, the hub GOs first.
+        if save_path:
+            self.GOCandidates.to_csv(save_path, index=False)
+
+    def get_GGSS(self, percentage=1):
+        """
+        The top percentage of the GGSS, the highest scores first. Streaming: a second pass over the edges, kept in
+        a bounded buffer, for percentage < 1 (save_GGSS writes all the edges block by block).
+        """
+        if not self.streaming:
+            return self.GeneGeneSimilarity[:int(percentage*self.get_EdgeCount())]
+        with telemetry.span("top", percentage=percentage) as items:
+            top = TopKBuffer(int(percentage * self.get_EdgeCount()))
+            for gene1, gene2, score in self.get_SimilarityBlocks():
+                top.push(score, gene1, gene2)
+            score, gene1, gene2 = top.get()
+            items["edges"] = len(score)
+        return self.get_GGSSTable(gene1, gene2, score, scaled=True)
+
+    @staticmethod
+    def get_GGSSSize(GGSS_data):
+        # the node and edge numbers of a GGSS table.
+        return len(set(GGSS_data["Gene1_ID"].tolist()+GGSS_data["Gene2_ID"].tolist())), GGSS_data.shape[0]
 
     def save_GGSS(self, save_path=None, percentage=1):
+        if self.streaming and percentage >= 1:
+            return self.save_GGSS_streaming(save_path)
         # filter GGSS data.
-        GGSS_length = self.GeneGeneSimilarity.shape[0]
-        GGSS_data = self.GeneGeneSimilarity[:int(percentage*GGSS_length)]
-        num_node = len(set(GGSS_data["Gene1_ID"].tolist()+GGSS_data["Gene2_ID"].tolist()))
-        num_edge = GGSS_data.shape[0]
+        GGSS_data = self.get_GGSS(percentage)
 
         # save file
         GGSS_data.to_csv(save_path, index=False)
-        return num_node, num_edge
+        return self.get_GGSSSize(GGSS_data)
+
+    def save_GGSS_streaming(self, save_path=None):
+        # second pass over the edges, memory is bounded by one block.
+        with telemetry.span("save_streaming", edges=self.SimilarityStats.count):
+            header = True
+            for gene1, gene2, score in self.get_SimilarityBlocks():
+                self.get_GGSSTable(gene1, gene2, score, scaled=True).to_csv(save_path, index=False, header=header, mode="w" if header else "a")
+                header = False
+            if header:
+                self.GeneGeneSimilarity.to_csv(save_path, index=False)
+        return len(self.GGSS_Node), self.SimilarityStats.count
@@ -0,0 +1,133 @@
+# *_* coding: utf-8 *_*
+# @Time     : 10/18/2026
+# @Author   : zong hui
+# @object   : int32 codes of the PMID, Gene and GO IDs, and CSR arrays of the mappings between them.
+
+
+"""
+The mappings of the pipeline (PMID -> Genes, Gene -> PMIDs, GO -> PMIDs, Gene -> GOs of the GOF) are kept as
+CSR arrays of int32 codes instead of dicts of lists of strings:
+
+    Vocabulary   the distinct strings of one kind, code i is strings[i], in the order they were first seen.
+    CSRMapping   the columns of row i are columns.strings[indices[offsets[i]:offsets[i+1]]], in their order,
+                 with an optional value for each (row, column) entry, e.g. the Adjusted_Pvalue of the GOF.
+
+The strings are only looked up again when a file is written.
+"""
+
+# load packages
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+
+
+class Vocabulary:
+    """
+    The int32 codes of distinct strings.
+
+    Args:
+        strings (:obj: 'list'):
+            the distinct strings, the code of strings[i] is i.
+    """
+
+    def __init__(self, strings=()):
+        self.strings = np.asarray(strings, dtype=object)
+        self.index = None
+
+    def __len__(self):
+        return len(self.strings)
+
+    def get_Index(self):
+        if self.index is None:
+            self.index = pd.Index(self.strings)
+        return self.index
+
+    def get_Codes(self, strings):
+        """the codes of strings, -1 for the strings not in the vocabulary."""
+        return self.get_Index().get_indexer(np.asarray(strings, dtype=object)).astype(np.int32)
+
+    def get_Code(self, string):
+        """the code of one string, -1 if it is not in the vocabulary, for strings read one at a time."""
+        try:
+            return self.get_Index().get_loc(string)
+        except KeyError:
+            return -1
+
+    def get_Strings(self, codes):
+        return self.strings[np.asarray(codes, dtype=np.int64)]
+
+
+def intern_Strings(strings):
+    """(codes, Vocabulary) of a sequence of strings, the codes follow the order the strings are first seen."""
+    codes, uniques = pd.factorize(np.asarray(strings, dtype=object))
+    return codes.astype(np.int32), Vocabulary(uniques)
+
+
+class CSRMapping:
+    """
+    Row -> columns mapping of two vocabularies, as CSR arrays. It reads like the dict of lists it replaces:
+    len(), keys() and items() give the row strings and their column strings, in the row order.
+
+    Args:
+        offsets (:obj: 'numpy.ndarray'):
+            int64, the entries of row i are [offsets[i], offsets[i+1]).
+        indices (:obj: 'numpy.ndarray'):
+            int32, the column code of each entry.
+        rows (:obj: 'Vocabulary'):
+            the row strings.
+        columns (:obj: 'Vocabulary'):
+            the column strings.
+        values (:obj: 'numpy.ndarray'):
+            an optional value of each entry.
+    """
+
+    def __init__(self, offsets, indices, rows, columns, values=None):
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.indices = np.asarray(indices, dtype=np.int32)
+        self.rows = rows
+        self.columns = columns
+        self.values = values
+
+    @classmethod
+    def from_Pairs(cls, row_codes, column_codes, rows, columns, values=None):
+        """the mapping of (row, column) entries, the entries of a row keep their order, duplicates included."""
+        row_codes = np.asarray(row_codes, dtype=np.int64)
+        order = np.argsort(row_codes, kind="stable")
+        offsets = np.concatenate(([0], np.cumsum(np.bincount(row_codes, minlength=len(rows)))))
+        return cls(offsets, np.asarray(column_codes)[order], rows, columns,
+                   None if values is None else np.asarray(values)[order])
+
+    def __len__(self):
+        return len(self.rows)
+
+    def get_RowCodes(self):
+        """the row code of each entry."""
+        return np.repeat(np.arange(len(self.rows), dtype=np.int32), np.diff(self.offsets))
+
+    def get_Row(self, i):
+        return self.indices[self.offsets[i]:self.offsets[i + 1]]
+
+    def get_Terms(self, key):
+        """the column strings of a row string, as the dict lookup."""
+        i = self.rows.get_Codes([key])[0]
+        return self.columns.get_Strings(self.get_Row(i)).tolist() if i >= 0 else list()
+
+    def keys(self):
+        return self.rows.strings.tolist()
+
+    def items(self):
+        strings = self.columns.strings[self.indices]
+        for i, key in enumerate(self.rows.strings):
+            yield key, strings[self.offsets[i]:self.offsets[i + 1]].tolist()
+
+    def transpose(self):
+        """the column -> rows mapping, the rows of a column in the row order."""
+        return CSRMapping.from_Pairs(self.indices, self.get_RowCodes(), self.columns, self.rows, self.values)
+
+    def get_Matrix(self, dtype=np.int32):
+        """the binary scipy CSR matrix of the mapping, duplicated entries count once."""
+        matrix = sp.csr_matrix((np.ones(len(self.indices), dtype=dtype), self.indices, self.offsets),
+                               shape=(len(self.rows), len(self.columns)), copy=True)  # sum_duplicates works in place
+        matrix.sum_duplicates()
+        matrix.data[:] = 1
+        return matrix
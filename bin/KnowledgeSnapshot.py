@@ -0,0 +1,420 @@
+# *_* coding: utf-8 *_*
+# @Time     : 10/18/2026
+# @Author   : zong hui
+# @object   : binary, memory-mappable snapshots of the parsed knowledge files.
+
+
+"""
+A snapshot stores the parsed content of knowledge files as numpy arrays, one .npy file per array, loaded with
+memory mapping so that processes on the same machine share the pages. Strings are interned in one string table
+per snapshot (sorted, NUL separated utf-8 blob + offsets), string columns are int32 codes, list columns are offsets +
+codes (CSR). The knowledge is read in place through SnapshotMapping, a read-only dict that decodes only the strings
+it returns, so that the pages stay shared and no process holds a private copy of the dicts.
+
+    ../knol/snapshot/<name>/manifest.json       sources (path, size, mtime) and their sha1, current version
+    ../knol/snapshot/<name>/<sha1>/*.npy        arrays of the current version
+
+The snapshot is keyed by the sha1 of its source files, a stale snapshot is rebuilt automatically when loaded.
+Compile all snapshots of basicConfig with:
+
+    cd bin
+    python KnowledgeSnapshot.py
+"""
+
+import os
+import json
+import shutil
+import hashlib
+import numpy as np
+import pandas as pd
+from collections.abc import Mapping
+
+
+def get_SourceStat(path):
+    st = os.stat(path)
+    return {"path": os.path.abspath(path), "size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+
+# bumped when the snapshot layout changes, so that old snapshots are rebuilt.
+FORMAT = 3
+
+
+def get_SourceHash(paths):
+    sha1 = hashlib.sha1("format {}".format(FORMAT).encode())
+    for path in paths:
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                sha1.update(block)
+    return sha1.hexdigest()
+
+
+def get_Arrays(columns):
+    """
+    columns: {name: (kind, values)}, kind is 'strings' (list of str), 'lists' (list of list of str)
+    or 'ints' (list of int). Returns the column kinds and the arrays of the snapshot.
+    """
+    strings = dict()
+    intern = lambda s: strings.setdefault(s, len(strings))
+    kinds, arrays = dict(), dict()
+    for name, (kind, values) in columns.items():
+        kinds[name] = kind
+        if kind == "strings":
+            arrays[name + ".codes"] = np.array([intern(s) for s in values], dtype=np.int32)
+        elif kind == "lists":
+            lengths = np.array([len(v) for v in values], dtype=np.int64)
+            arrays[name + ".offsets"] = np.concatenate(([0], np.cumsum(lengths))).astype(np.int64)
+            arrays[name + ".codes"] = np.array([intern(s) for v in values for s in v], dtype=np.int32)
+        elif kind == "ints":
+            arrays[name + ".ints"] = np.array(values, dtype=np.int64)
+        else:
+            raise ValueError("unknown column kind: {}".format(kind))
+
+    # the string table is sorted (utf-8 bytes), a string is found by binary search without decoding the table.
+    blobs = [s.encode("utf-8") for s in strings]
+    order = sorted(range(len(blobs)), key=blobs.__getitem__)
+    rank = np.empty(len(blobs), dtype=np.int32)
+    rank[order] = np.arange(len(blobs), dtype=np.int32)
+    for name in arrays:
+        if name.endswith(".codes"):
+            arrays[name] = rank[arrays[name]]
+    # string i is blob[offsets[i]:offsets[i+1]-1], strings of text files never hold a NUL.
+    blobs = [blobs[i] for i in order]
+    arrays["strings.offsets"] = np.concatenate(([0], np.cumsum([len(b) + 1 for b in blobs], dtype=np.int64)))
+    arrays["strings.blob"] = np.frombuffer(b"\0".join(blobs), dtype=np.uint8)
+    return kinds, arrays
+
+
+def save_Columns(folder, columns):
+    """save the arrays of the columns (see get_Arrays) in folder, returns the column kinds saved in the manifest."""
+    kinds, arrays = get_Arrays(columns)
+    for name, array in arrays.items():
+        np.save(os.path.join(folder, name + ".npy"), array)
+    return kinds
+
+
+def load_Array(path):
+    try:
+        return np.load(path, mmap_mode="r")
+    except ValueError:
+        # empty arrays can not be memory-mapped.
+        return np.load(path)
+
+
+class StringTable:
+    """
+    The sorted strings of a snapshot, string i is blob[offsets[i]:offsets[i+1]-1]. A string is decoded when
+    it is read and found by binary search, the table itself is never decoded.
+
+    Args:
+        offsets (:obj: 'numpy.ndarray'):
+            int64, the start of each string in blob, and the end of the blob.
+        blob (:obj: 'numpy.ndarray'):
+            uint8, the NUL separated utf-8 strings.
+    """
+
+    def __init__(self, offsets, blob):
+        self.offsets = offsets
+        self.blob = blob
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def get_Bytes(self, code):
+        return self.blob[self.offsets[code]:self.offsets[code + 1] - 1].tobytes()
+
+    def get_String(self, code):
+        return self.get_Bytes(code).decode("utf-8")
+
+    def get_Strings(self, codes):
+        """numpy object array of the strings of codes, each distinct code decoded once."""
+        uniques, inverse = np.unique(np.asarray(codes, dtype=np.int64), return_inverse=True)
+        return np.array([self.get_String(code) for code in uniques], dtype=object)[inverse]
+
+    def get_Code(self, string):
+        """the code of one string, -1 if it is not in the table."""
+        if not isinstance(string, str):
+            return -1
+        key = string.encode("utf-8")
+        lo, hi = 0, len(self)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.get_Bytes(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo if lo < len(self) and self.get_Bytes(lo) == key else -1
+
+    def get_Codes(self, strings):
+        """int64 codes of strings, -1 for the strings not in the table, the distinct strings searched together."""
+        inverse, uniques = pd.factorize(pd.Series(np.asarray(strings, dtype=object), dtype=object))
+        # the missing values (-1 of factorize) take the last code, -1.
+        codes = np.full(len(uniques) + 1, -1, dtype=np.int64)
+        found = np.flatnonzero([isinstance(s, str) for s in uniques])
+        if len(found) and len(self):
+            codes[found] = self.search_Strings([uniques[i].encode("utf-8") for i in found])
+        return codes[inverse]
+
+    def get_Fixed(self, codes, width):
+        # the strings of codes as NUL padded bytes of width, longer ones are cut.
+        starts = self.offsets[codes]
+        lengths = np.minimum(self.offsets[codes + 1] - 1 - starts, width)
+        valid = np.arange(width) < lengths[:, None]
+        data = np.zeros((len(codes), width), dtype=np.uint8)
+        data[valid] = self.blob[(starts[:, None] + np.arange(width))[valid]]
+        return data.view("S{}".format(width)).ravel()
+
+    def search_Strings(self, keys):
+        # binary search of all the keys at once. The strings of the table are cut one byte longer than the longest
+        # key, which keeps their order and equality against the keys.
+        width = max(len(key) for key in keys) + 1
+        keys = np.array(keys, dtype="S{}".format(width))
+        lo, hi = np.zeros(len(keys), dtype=np.int64), np.full(len(keys), len(self), dtype=np.int64)
+        while (lo < hi).any():
+            mid = np.minimum((lo + hi) // 2, len(self) - 1)
+            less = self.get_Fixed(mid, width) < keys
+            lo, hi = np.where((lo < hi) & less, mid + 1, lo), np.where((lo < hi) & ~less, mid, hi)
+        pos = np.minimum(lo, len(self) - 1)
+        return np.where(self.get_Fixed(pos, width) == keys, pos, -1)
+
+
+class SnapshotMapping(Mapping):
+    """
+    A read-only dict over the columns of a snapshot: key -- value of each row, a repeated key keeps the value of
+    its last row and iterates at its first row, as dict(zip(keys, values)). Nothing is decoded when it is built:
+    the keys are looked up by their codes in the string table, the values are decoded when they are read.
+    get_Positions, get_Values, get_Lengths and get_Members look up whole arrays of keys at once.
+
+    Args:
+        strings (:obj: 'StringTable'):
+            the string table of the snapshot.
+        key_codes (:obj: 'tuple'):
+            the codes of the key columns, one column, or two for (key1, key2) keys.
+        kind (:obj: 'string'):
+            'strings', 'ints' or 'lists', the kind of the value column.
+        value_arrays (:obj: 'tuple'):
+            the arrays of the value column, (codes,), (ints,) or (offsets, codes).
+        rows (:obj: 'numpy.ndarray'):
+            the rows of the mapping, all the rows of the columns when None.
+    """
+
+    def __init__(self, strings, key_codes, kind, value_arrays, rows=None):
+        self.strings = strings
+        self.key_codes = key_codes
+        self.kind = kind
+        self.value_arrays = value_arrays
+        self.rows = rows
+        self.index = None
+        self.members = None
+
+    def get_KeyCodes(self, codes):
+        # one int64 code for each key from the codes of its columns, -1 when one of them is missing.
+        result = np.asarray(codes[0], dtype=np.int64)
+        for column in codes[1:]:
+            result = np.where((result >= 0) & (column >= 0), result * len(self.strings) + column, -1)
+        return result
+
+    def get_RowKeys(self):
+        # the key code of each row of the mapping.
+        return self.get_KeyCodes([codes if self.rows is None else codes[self.rows] for codes in self.key_codes])
+
+    def get_Index(self):
+        # the sorted distinct key codes and the last row of each, built once.
+        if self.index is None:
+            keys = self.get_RowKeys()
+            sorted_keys, last = np.unique(keys[::-1], return_index=True)
+            last = len(keys) - 1 - last
+            self.index = (sorted_keys, last if self.rows is None else self.rows[last])
+        return self.index
+
+    @staticmethod
+    def search_Sorted(sorted_keys, rows, keys):
+        # rows[i] of the key equal to sorted_keys[i], -1 when not found.
+        if len(sorted_keys) == 0:
+            return np.full(len(keys), -1, dtype=np.int64)
+        pos = np.minimum(np.searchsorted(sorted_keys, keys), len(sorted_keys) - 1)
+        return np.where((keys >= 0) & (sorted_keys[pos] == keys), rows[pos], -1)
+
+    def get_Positions(self, *keys):
+        """the row of each key, -1 for the missing keys. keys: one array for each key column."""
+        sorted_keys, rows = self.get_Index()
+        return self.search_Sorted(sorted_keys, rows, self.get_KeyCodes([self.strings.get_Codes(k) for k in keys]))
+
+    def get_Row(self, key):
+        # the row of one key, -1 if it is missing.
+        parts = key if len(self.key_codes) > 1 else (key,)
+        if not isinstance(parts, tuple) or len(parts) != len(self.key_codes):
+            return -1
+        sorted_keys, rows = self.get_Index()
+        code = self.get_KeyCodes([np.array([self.strings.get_Code(k)]) for k in parts])
+        return int(self.search_Sorted(sorted_keys, rows, code)[0])
+
+    def get_Key(self, row):
+        keys = tuple(self.strings.get_String(codes[row]) for codes in self.key_codes)
+        return keys if len(keys) > 1 else keys[0]
+
+    def get_Value(self, row):
+        if self.kind == "strings":
+            return self.strings.get_String(self.value_arrays[0][row])
+        if self.kind == "ints":
+            return int(self.value_arrays[0][row])
+        offsets, codes = self.value_arrays
+        return [self.strings.get_String(code) for code in codes[offsets[row]:offsets[row + 1]]]
+
+    def get_Values(self, *keys, default=None):
+        """numpy object array of the values of the keys, default (one value, or one per key) for the missing keys."""
+        rows = self.get_Positions(*keys)
+        values = np.empty(len(rows), dtype=object)
+        values[:] = default
+        found = np.flatnonzero(rows >= 0)
+        if self.kind == "strings":
+            values[found] = self.strings.get_Strings(self.value_arrays[0][rows[found]])
+        elif self.kind == "ints":
+            values[found] = np.asarray(self.value_arrays[0][rows[found]]).astype(object)
+        else:
+            for i in found:
+                values[i] = self.get_Value(rows[i])
+        return values
+
+    def get_Lengths(self, *keys):
+        """int64 length of the list value of each key from the offsets, 0 for the missing keys."""
+        rows = self.get_Positions(*keys)
+        offsets = self.value_arrays[0]
+        found = rows >= 0
+        lengths = np.zeros(len(rows), dtype=np.int64)
+        lengths[found] = offsets[rows[found] + 1] - offsets[rows[found]]
+        return lengths
+
+    def get_Members(self, keys, items):
+        """whether items[i] is in the list value of keys[i], from the codes of the (row, item) pairs."""
+        n = len(self.strings)
+        if self.members is None:
+            offsets, codes = self.value_arrays
+            owners = np.repeat(np.arange(len(offsets) - 1, dtype=np.int64), np.diff(offsets))
+            self.members = np.unique(owners * n + codes)
+        rows = self.get_Positions(keys)
+        items = self.strings.get_Codes(items)
+        pairs = np.where((rows >= 0) & (items >= 0), rows * n + items, -1)
+        return self.search_Sorted(self.members, self.members, pairs) >= 0
+
+    def __getitem__(self, key):
+        row = self.get_Row(key)
+        if row < 0:
+            raise KeyError(key)
+        return self.get_Value(row)
+
+    def get(self, key, default=None):
+        row = self.get_Row(key)
+        return self.get_Value(row) if row >= 0 else default
+
+    def __contains__(self, key):
+        return self.get_Row(key) >= 0
+
+    def __len__(self):
+        return len(self.get_Index()[0])
+
+    def __iter__(self):
+        first = np.sort(np.unique(self.get_RowKeys(), return_index=True)[1])
+        for row in (first if self.rows is None else self.rows[first]):
+            yield self.get_Key(row)
+
+
+class Snapshot:
+    """
+    A snapshot, its arrays are memory-mapped when it is loaded from a folder.
+        strings: the StringTable.
+        get_Mapping(key, value, rows): SnapshotMapping of key column(s) -- value column.
+        get_Strings(name): numpy object array of a 'strings' column, decoded.
+        get_Lists(name): list of lists of a 'lists' column, decoded.
+        get_Ints(name): int64 array of an 'ints' column.
+        arrays: the raw arrays, e.g. arrays['<name>.codes'] and the string table.
+    """
+
+    def __init__(self, kinds, arrays):
+        self.kinds = kinds
+        self.arrays = arrays
+        self.strings = StringTable(arrays["strings.offsets"], arrays["strings.blob"])
+
+    @classmethod
+    def from_Folder(cls, folder, kinds):
+        return cls(kinds, {f[:-len(".npy")]: load_Array(os.path.join(folder, f)) for f in os.listdir(folder) if f.endswith(".npy")})
+
+    @classmethod
+    def from_Columns(cls, columns):
+        """the snapshot of columns (see get_Arrays) in memory, for a knowledge file that was never compiled."""
+        return cls(*get_Arrays(columns))
+
+    def get_Mapping(self, key, value, rows=None):
+        names = key if isinstance(key, tuple) else (key,)
+        kind = self.kinds[value]
+        suffixes = {"strings": (".codes",), "ints": (".ints",), "lists": (".offsets", ".codes")}[kind]
+        return SnapshotMapping(self.strings, tuple(self.arrays[name + ".codes"] for name in names), kind,
+                               tuple(self.arrays[value + suffix] for suffix in suffixes), rows)
+
+    def get_Strings(self, name):
+        return self.strings.get_Strings(self.arrays[name + ".codes"])
+
+    def get_Lists(self, name):
+        offsets, values = self.arrays[name + ".offsets"], self.get_Strings(name).tolist()
+        return [values[offsets[i]:offsets[i + 1]] for i in range(len(offsets) - 1)]
+
+    def get_Ints(self, name):
+        return self.arrays[name + ".ints"]
+
+
+def get_SnapshotFolder(name, snapshot_path):
+    return os.path.join(snapshot_path, name)
+
+
+def compile_Snapshot(name, sources, build, snapshot_path):
+    """Parse the sources with build() -> columns, save them as the current version of the snapshot."""
+    folder = get_SnapshotFolder(name, snapshot_path)
+    source_hash = get_SourceHash(sources)
+    version = os.path.join(folder, source_hash)
+    tmp = version + ".tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    kinds = save_Columns(tmp, build())
+    shutil.rmtree(version, ignore_errors=True)
+    os.rename(tmp, version)
+
+    manifest = {"name": name, "format": FORMAT, "sha1": source_hash, "sources": [get_SourceStat(p) for p in sources], "columns": kinds}
+    with open(os.path.join(folder, "manifest.json.tmp"), "w") as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(os.path.join(folder, "manifest.json.tmp"), os.path.join(folder, "manifest.json"))
+    # drop the stale versions
+    for old in os.listdir(folder):
+        if old != source_hash and os.path.isdir(os.path.join(folder, old)):
+            shutil.rmtree(os.path.join(folder, old), ignore_errors=True)
+    return Snapshot.from_Folder(version, kinds)
+
+
+def load_Snapshot(name, sources, build, snapshot_path):
+    """
+    The snapshot of the sources, or None when it was never compiled. A snapshot of an older FORMAT, or whose
+    sources changed (size/mtime, then sha1), is rebuilt with build().
+    """
+    manifest_file = os.path.join(get_SnapshotFolder(name, snapshot_path), "manifest.json")
+    if not os.path.exists(manifest_file):
+        return None
+    with open(manifest_file, "r") as f:
+        manifest = json.load(f)
+
+    if manifest.get("format") != FORMAT:
+        return compile_Snapshot(name, sources, build, snapshot_path)
+    stats = [get_SourceStat(p) for p in sources]
+    if stats != manifest["sources"]:
+        if get_SourceHash(sources) != manifest["sha1"]:
+            return compile_Snapshot(name, sources, build, snapshot_path)
+        # same content, e.g. touched or copied: remember the new stats.
+        manifest["sources"] = stats
+        with open(manifest_file, "w") as f:
+            json.dump(manifest, f, indent=1)
+    version = os.path.join(get_SnapshotFolder(name, snapshot_path), manifest["sha1"])
+    if not os.path.isdir(version):
+        return compile_Snapshot(name, sources, build, snapshot_path)
+    return Snapshot.from_Folder(version, manifest["columns"])
+
+
+if __name__ == '__main__':
+    from helper import compile_Snapshots
+    compile_Snapshots()
@@ -0,0 +1,203 @@
+# *_* coding: utf-8 *_*
+# @Time     : 10/18/2026
+# @Author   : zong hui
+# @object   : MCODE clustering of the GGSS network, in place of the manual Cytoscape step.
+
+
+"""
+MCODE (Bader and Hogue, BMC Bioinformatics 2003), as the MCODE app of Cytoscape with its default parameters:
+
+    vertex weighting   the score of a gene is k * density of the highest k-core of its neighborhood (the gene and
+                       its neighbors), the core-clustering coefficient, 0 for the genes of degree < degree_cutoff.
+    complex prediction from the seed of highest score not seen yet, the neighbors of score >=
+                       (1 - node_score_cutoff) * seed score are added recursively, up to max_depth from the seed.
+                       A gene belongs to the first complex that reaches it.
+    post-processing    complexes without a k_core-core are dropped, haircut keeps the 2-core of a complex, fluff
+                       adds the neighbors of neighborhood density > fluff_node_density_cutoff.
+
+density = edges / (nodes * (nodes - 1) / 2) without loops, the score of a complex is density * nodes, so a clique
+of n genes scores n. The network is unweighted, as the Cytoscape network of the top 1% GGSS.
+"""
+
+# load packages
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+
+
+class MCODE:
+    """
+    Find the complexes of a GGSS network.
+
+    Args:
+        GGSS_file (:obj: 'string' or 'DataFrame'):
+            the GGSS csv file of step3, usually the top 1% GGSS, each row is an edge, or the GGSS table in memory.
+        degree_cutoff (:obj: 'int'):
+            genes of a lower degree are not scored.
+        node_score_cutoff (:obj: 'float'):
+            the neighbors within this fraction of the seed score are added to its complex.
+        haircut (:obj: 'bool'):
+            remove the genes singly connected to a complex.
+        fluff (:obj: 'bool'):
+            expand the complexes by their dense neighbors.
+        fluff_node_density_cutoff (:obj: 'float'):
+            the neighborhood density of the genes added by fluff.
+        k_core (:obj: 'int'):
+            complexes without a k-core of this k are dropped.
+        max_depth (:obj: 'int'):
+            the largest distance from the seed of the genes of a complex.
+    """
+
+    def __init__(self, GGSS_file, degree_cutoff=2, node_score_cutoff=0.2, haircut=True, fluff=False,
+                 fluff_node_density_cutoff=0.1, k_core=2, max_depth=100):
+        self.degree_cutoff = degree_cutoff
+        self.node_score_cutoff = node_score_cutoff
+        self.haircut = haircut
+        self.fluff = fluff
+        self.fluff_node_density_cutoff = fluff_node_density_cutoff
+        self.k_core = k_core
+        self.max_depth = max_depth
+
+        self.genes = np.zeros(0, dtype=object)
+        self.names = np.zeros(0, dtype=object)
+        self.Adjacency = sp.csr_matrix((0, 0), dtype=np.int32)
+        self.position = np.zeros(0, dtype=np.int64)
+        self.NodeScore = np.zeros(0, dtype=np.float64)
+        self.NodeDensity = np.zeros(0, dtype=np.float64)
+        self.Clusters = pd.DataFrame(columns=["Cluster", "Score", "Nodes", "Edges", "Seed_ID", "Seed_Name", "Gene_IDs", "Gene_Names"])
+
+        self.get_Graph(GGSS_file)
+        self.score_Nodes()
+        self.find_Clusters()
+
+    def get_Graph(self, GGSS_file):
+        # symmetric CSR adjacency of the genes, in the order they first appear in the file (the highest scores first).
+        if isinstance(GGSS_file, pd.DataFrame):
+            df = GGSS_file[["Gene1_ID", "Gene1_Name", "Gene2_ID", "Gene2_Name"]].astype(str)
+        else:
+            df = pd.read_csv(GGSS_file, keep_default_na=False, dtype=str)
+        ids = np.concatenate((df["Gene1_ID"].values, df["Gene2_ID"].values))
+        codes, self.genes = pd.factorize(ids)
+        self.genes = np.asarray(self.genes, dtype=object)
+        names = dict(zip(ids, np.concatenate((df["Gene1_Name"].values, df["Gene2_Name"].values))))
+        self.names = np.array([names[g] for g in self.genes], dtype=object)
+        gene1, gene2 = codes[:len(df)], codes[len(df):]
+        loop = gene1 == gene2
+        gene1, gene2 = gene1[~loop], gene2[~loop]
+        n = len(self.genes)
+        adjacency = sp.csr_matrix((np.ones(2 * len(gene1), dtype=np.int32), (np.concatenate((gene1, gene2)), np.concatenate((gene2, gene1)))), shape=(n, n))
+        adjacency.sum_duplicates()
+        adjacency.data[:] = 1
+        adjacency.sort_indices()
+        self.Adjacency = adjacency
+        self.position = np.full(n, -1, dtype=np.int64)  # scratch index of the genes of a subgraph
+
+    def get_Neighbors(self, node):
+        return self.Adjacency.indices[self.Adjacency.indptr[node]:self.Adjacency.indptr[node + 1]]
+
+    def get_Subgraph(self, nodes):
+        """the subgraph of nodes as its directed edges (src, dst), indexes of nodes, each edge in both directions."""
+        counts = np.diff(self.Adjacency.indptr)[nodes]
+        entry = np.repeat(self.Adjacency.indptr[nodes], counts) + np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        src = np.repeat(np.arange(len(nodes)), counts)
+        self.position[nodes] = np.arange(len(nodes))
+        dst = self.position[self.Adjacency.indices[entry]]
+        self.position[nodes] = -1
+        return src[dst >= 0], dst[dst >= 0]
+
+    @staticmethod
+    def get_Density(n, src):
+        return len(src) / (n * (n - 1)) if n > 1 else 0.0  # src holds each edge twice
+
+    @staticmethod
+    def get_KCore(n, src, dst, k):
+        """
+        (mask, src, dst) of the k-core of a subgraph and its edges: the genes of degree < k are removed, with their
+        edges, until none is left.
+        """
+        alive = np.ones(n, dtype=bool)
+        while True:
+            drop = alive & (np.bincount(src, minlength=n) < k)
+            if not drop.any():
+                return alive, src, dst
+            alive &= ~drop
+            inside = alive[src] & alive[dst]
+            src, dst = src[inside], dst[inside]
+
+    @classmethod
+    def get_HighestKCore(cls, n, src, dst):
+        """
+        (k, mask, src) of the highest k-core of a subgraph: all the degrees are at least k, k is the largest. The
+        k-cores are nested, k is found by bisection between the lowest degree (the whole subgraph) and the highest.
+        """
+        degree = np.bincount(src, minlength=n)
+        low, high = int(degree.min()), int(degree.max()) + 1
+        core = np.ones(n, dtype=bool)
+        while high - low > 1:
+            middle = (low + high) // 2
+            alive, core_src, core_dst = cls.get_KCore(n, src, dst, middle)
+            if alive.any():
+                low, core, src, dst = middle, alive, core_src, core_dst
+            else:
+                high = middle
+        return low, core, src
+
+    def score_Nodes(self):
+        """the core-clustering coefficient of each gene (NodeScore), and the density of its neighborhood (NodeDensity)."""
+        n = len(self.genes)
+        self.NodeScore = np.zeros(n, dtype=np.float64)
+        self.NodeDensity = np.zeros(n, dtype=np.float64)
+        degree = np.diff(self.Adjacency.indptr)
+        for node in range(n):
+            neighborhood = np.concatenate(([node], self.get_Neighbors(node)))
+            src, dst = self.get_Subgraph(neighborhood)
+            self.NodeDensity[node] = self.get_Density(len(neighborhood), src)
+            if degree[node] >= self.degree_cutoff:
+                k, core, core_src = self.get_HighestKCore(len(neighborhood), src, dst)
+                self.NodeScore[node] = k * self.get_Density(core.sum(), core_src)
+
+    def get_ClusterCore(self, node, seed_score, seen, cluster, depth=1):
+        # the neighbors of node above the seed score cutoff, recursively, as the depth first search of MCODE.
+        if seen[node]:
+            return
+        seen[node] = True
+        if depth > self.max_depth:
+            return
+        for neighbor in self.get_Neighbors(node):
+            if not seen[neighbor] and self.NodeScore[neighbor] >= seed_score - seed_score * self.node_score_cutoff:
+                cluster.append(neighbor)
+                self.get_ClusterCore(neighbor, seed_score, seen, cluster, depth + 1)
+
+    def find_Clusters(self):
+        """the complexes of the seeds in decreasing score, the highest scored complexes first."""
+        seen = np.zeros(len(self.genes), dtype=bool)
+        clusters = list()
+        for seed in np.argsort(-self.NodeScore, kind="stable"):
+            if seen[seed]:
+                continue
+            cluster = [seed]
+            self.get_ClusterCore(seed, self.NodeScore[seed], seen, cluster)
+            nodes = np.array(cluster, dtype=np.int64)
+            src, dst = self.get_Subgraph(nodes)
+            if not self.get_KCore(len(nodes), src, dst, self.k_core)[0].any():
+                continue
+            if self.haircut:
+                nodes = nodes[self.get_KCore(len(nodes), src, dst, 2)[0]]
+            if self.fluff:
+                # the dense neighbors of the complex, they can be in other complexes too.
+                neighbors = np.unique(np.concatenate([self.get_Neighbors(node) for node in nodes]))
+                neighbors = neighbors[~np.isin(neighbors, nodes) & (self.NodeDensity[neighbors] > self.fluff_node_density_cutoff)]
+                nodes = np.concatenate((nodes, neighbors))
+            src, _ = self.get_Subgraph(nodes)
+            clusters.append((self.get_Density(len(nodes), src) * len(nodes), len(nodes), len(src) // 2, seed, nodes))
+        clusters.sort(key=lambda c: -c[0])  # stable, seeds of the same score keep their order
+        self.Clusters = pd.DataFrame([(i + 1, score, n_nodes, n_edges, self.genes[seed], self.names[seed],
+                                       ";".join(self.genes[nodes]), ";".join(self.names[nodes]))
+                                      for i, (score, n_nodes, n_edges, seed, nodes) in enumerate(clusters)],
+                                     columns=self.Clusters.columns)
+
+    def save_Clusters(self, save_path=None):
+        # one row per complex, the genes of a complex are joined by ';'.
+        if save_path:
+            self.Clusters.to_csv(save_path, index=False)
+        return len(self.Clusters)
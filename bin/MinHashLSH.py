@@ -0,0 +1,112 @@
+# *_* coding: utf-8 *_*
+# @Time     : 10/18/2026
+# @Author   : zong hui
+# @object   : approximate GGSS: MinHash signatures of the GO sets and LSH banding of the likely similar gene pairs.
+
+
+# load packages
+import numpy as np
+
+
+class MinHashLSH:
+    """
+    Candidate gene pairs of a SparseSimilarity engine that are likely to have a high GGSS, without visiting all
+    the pairs sharing a GO. Each gene is summarised by the MinHash signature of its GO set (num_perm minimums of
+    random GO hashes), two genes agree on a minimum with probability Jaccard(GOs1, GOs2). The signature is cut
+    into bands of num_perm / bands minimums, genes with the same band fall in one bucket and become candidates:
+    a pair of Jaccard s is found with probability 1 - (1 - s^r)^b. More bands find more pairs of lower Jaccard.
+    The candidates are rescored exactly by SparseSimilarity.get_PairSimilarity.
+
+    Args:
+        engine (:obj: 'SparseSimilarity'):
+            the sparse GGSS engine of the GOF.
+        num_perm (:obj: 'int'):
+            the length of the signatures.
+        bands (:obj: 'int'):
+            the number of LSH bands, num_perm / bands minimums each.
+        max_bucket (:obj: 'int'):
+            buckets of more genes are not expanded into pairs (e.g. thousands of genes of a single general GO).
+        seed (:obj: 'int'):
+            the seed of the GO hashes, the candidates are the same for the same seed.
+    """
+
+    def __init__(self, engine, num_perm=128, bands=64, max_bucket=1000, seed=0):
+        if num_perm % bands:
+            raise ValueError("num_perm ({}) should be a multiple of bands ({})".format(num_perm, bands))
+        self.engine = engine
+        self.num_perm = num_perm
+        self.bands = bands
+        self.max_bucket = max_bucket
+        self.seed = seed
+        self.signatures = None
+        self.Counter = {"bands": bands, "rows_per_band": num_perm // bands, "bucket_pairs": 0, "skipped_buckets": 0,
+                        "candidate_pairs": 0, "edges": 0, "estimated_edges": 0}
+
+    def get_Signatures(self, chunk_size=4096):
+        """the genes x num_perm MinHash signatures, uint32, one row of minimums per gene."""
+        if self.signatures is None:
+            binary = self.engine.Binary
+            rng = np.random.default_rng(self.seed)
+            hashes = rng.integers(0, np.iinfo(np.uint32).max, size=(binary.shape[1], self.num_perm), dtype=np.uint32)
+            self.signatures = np.full((binary.shape[0], self.num_perm), np.iinfo(np.uint32).max, dtype=np.uint32)
+            for start in range(0, binary.shape[0], chunk_size):
+                end = min(start + chunk_size, binary.shape[0])
+                rows = np.flatnonzero(np.diff(binary.indptr[start:end + 1])) + start  # genes without GO keep the max
+                if len(rows):
+                    indptr = binary.indptr[rows] - binary.indptr[start]
+                    values = hashes[binary.indices[binary.indptr[start]:binary.indptr[end]]]
+                    self.signatures[rows] = np.minimum.reduceat(values, indptr, axis=0)
+        return self.signatures
+
+    def get_BandPairs(self, band):
+        # pairs (gene1 < gene2) of the genes with the same minimums in a band.
+        r = self.num_perm // self.bands
+        keys = self.get_Signatures()[:, band * r:(band + 1) * r]
+        keys = np.ascontiguousarray(keys).view(np.dtype((np.void, keys.dtype.itemsize * r))).ravel()
+        order = np.argsort(keys, kind="stable")
+        bounds = np.flatnonzero(np.concatenate(([True], keys[order][1:] != keys[order][:-1], [True])))
+        size = np.diff(bounds)
+        large = size > self.max_bucket
+        self.Counter["skipped_buckets"] += int(large.sum())
+        size[large] = 1
+        # each gene of a bucket is paired with the genes after it in the bucket.
+        start = np.repeat(bounds[:-1], size)
+        position = start + np.arange(len(start)) - np.repeat(np.cumsum(size) - size, size)
+        later = start + np.repeat(size, size) - 1 - position
+        first = np.repeat(position, later)
+        second = first + 1 + np.arange(len(first)) - np.repeat(np.cumsum(later) - later, later)
+        gene1, gene2 = order[first], order[second]
+        self.Counter["bucket_pairs"] += len(gene1)
+        return np.minimum(gene1, gene2), np.maximum(gene1, gene2)
+
+    def get_Candidates(self):
+        """the distinct candidate pairs (gene1 < gene2) of all the bands, sorted by gene1 then gene2."""
+        n = len(self.engine.genes)
+        keys = np.unique(np.concatenate([gene1 * n + gene2 for gene1, gene2 in map(self.get_BandPairs, range(self.bands))]
+                                        or [np.zeros(0, dtype=np.int64)]))
+        self.Counter["candidate_pairs"] = len(keys)
+        return keys // n, keys % n
+
+    def get_Similarity(self):
+        """
+        Edges (gene1, gene2, score) of the candidates sharing a GO, in the order of SparseSimilarity.get_Similarity,
+        with the estimated number of edges of the exact GGSS.
+        """
+        gene1, gene2 = self.get_Candidates()
+        shared, score = self.engine.get_PairSimilarity(gene1, gene2)
+        edge = shared > 0
+        self.Counter["edges"] = int(edge.sum())
+        self.Counter["estimated_edges"] = self.get_EdgeCount()
+        return gene1[edge], gene2[edge], score[edge]
+
+    def get_EdgeCount(self, sample=2000):
+        """
+        The number of edges of the exact GGSS (pairs sharing a GO), estimated from the degree of sample random
+        genes, to keep the same top percentage of the GGSS. Exact when sample >= the number of genes.
+        """
+        n = len(self.engine.genes)
+        if n < 2:
+            return 0
+        genes = np.random.default_rng(self.seed).choice(n, size=min(sample, n), replace=False)
+        degree = np.diff((self.engine.Binary[genes] @ self.engine.Binary.T).tocsr().indptr) - 1  # without the gene itself
+        return int(round(degree.sum() * n / len(genes) / 2))
@@ -0,0 +1,215 @@
+# *_* coding: utf-8 *_*
+# @Time     : 10/18/2026
+# @Author   : zong hui
+# @object   : the steps of main.py as a DAG of stages, skipped when their outputs are up to date.
+
+
+"""
+The pipeline of a case is a small DAG of stages, run in the order they are added:
+
+    mapping (step1) -> enrichment (step2) -> similarity (step3) -> gofxgex (step4, optional)
+
+The key of a stage is the sha1 of its input files, the keys of the stages it depends on, its parameters and the
+versions (sha1) of the knowledge files it uses. The state of the case remembers the key and the outputs (size,
+mtime) of each finished stage:
+
+    <case>@pipeline.json    {"format", "stages": {name: {"key", "outputs", "info", "seconds"}}, "hashes"}
+
+A stage whose key and outputs did not change is skipped, the stages after it read its outputs from the files
+instead of memory. A stage is recorded as finished once its files are written (by the ArtifactWriter, after
+them), so a crashed run resumes at the stage that failed. Long stages checkpoint inside the stage as well
+(CalculatePvalue shards, EdgeStore tiles).
+"""
+
+# load packages
+import os
+import json
+import time
+import hashlib
+import threading
+
+# load our modules
+from Telemetry import telemetry
+
+
+# bumped when the outputs of a stage change for the same inputs, so that the state of older runs is stale.
+FORMAT = 1
+
+
+class Stage:
+    """
+    A step of the pipeline.
+
+    Args:
+        name (:obj: 'string'):
+            the stage name, unique in the pipeline.
+        run (:obj: 'function'):
+            run(pipeline) -> (result, info): the result handed over in memory to the next stages, and a dict of
+            counts saved in the state, logged when the stage is skipped.
+        load (:obj: 'function'):
+            load() -> the result of a skipped stage, from its outputs (e.g. the file paths).
+        deps (:obj: 'list'):
+            the names of the stages it reads.
+        inputs (:obj: 'list'):
+            the input files.
+        outputs (:obj: 'list'):
+            the output files, all needed to skip the stage. None when the outputs are not kept (never skipped).
+        params (:obj: 'dict'):
+            the parameters changing the outputs.
+        knowledge (:obj: 'list'):
+            the knowledge resources it uses.
+    """
+
+    def __init__(self, name, run, load=None, deps=(), inputs=(), outputs=(), params=None, knowledge=()):
+        self.name = name
+        self.run = run
+        self.load = load
+        self.deps = list(deps)
+        self.inputs = list(inputs)
+        self.outputs = None if outputs is None else list(outputs)
+        self.params = dict(params or {})
+        self.knowledge = list(knowledge)
+
+
+class Pipeline:
+    """
+    Run the stages of a case, skipping the up-to-date ones.
+
+    Args:
+        state_file (:obj: 'string'):
+            the json state of the case.
+        writer (:obj: 'ArtifactWriter'):
+            the writer of the output files, the state is saved by it after the files of a stage.
+        registry (:obj: 'KnowledgeRegistry'):
+            the knowledge resources, for their source files.
+        force (:obj: 'bool'):
+            run all the stages.
+    """
+
+    def __init__(self, state_file, writer, registry, force=False):
+        self.state_file = state_file
+        self.writer = writer
+        self.registry = registry
+        self.force = force
+        self.stages = dict()
+        self.keys = dict()
+        self.results = dict()
+        self.Status = dict()  # name -> 'ran' or 'skipped'
+        self.lock = threading.Lock()
+        self.state = {"format": FORMAT, "stages": dict(), "hashes": dict()}
+        if os.path.exists(state_file):
+            with open(state_file, "r") as f:
+                state = json.load(f)
+            if state.get("format") == FORMAT:
+                self.state = state
+
+    def add(self, stage):
+        for dep in stage.deps:
+            if dep not in self.stages:
+                raise KeyError("stage {} depends on {}, add it first".format(stage.name, dep))
+        self.stages[stage.name] = stage
+
+    def get_FileHash(self, path):
+        # sha1 of a file, computed again only when its size or mtime changed.
+        st = os.stat(path)
+        with self.lock:
+            cached = self.state["hashes"].get(os.path.abspath(path))
+        if cached and cached[:2] == [st.st_size, st.st_mtime_ns]:
+            return cached[2]
+        sha1 = hashlib.sha1()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                sha1.update(block)
+        with self.lock:
+            self.state["hashes"][os.path.abspath(path)] = [st.st_size, st.st_mtime_ns, sha1.hexdigest()]
+        return sha1.hexdigest()
+
+    def get_KnowledgeVersion(self, name):
+        if name in self.registry.skipped:
+            return "skipped"
+        return [self.get_FileHash(path) if os.path.exists(path) else None for path in self.registry.get_Sources(name)]
+
+    def get_Key(self, stage):
+        """the sha1 of the inputs, dependencies, parameters and knowledge of a stage."""
+        if stage.name not in self.keys:
+            content = {"stage": stage.name, "format": FORMAT,
+                       "inputs": [self.get_FileHash(path) for path in stage.inputs],
+                       "deps": [self.get_Key(self.stages[dep]) for dep in stage.deps],
+                       "params": stage.params,
+                       "knowledge": {name: self.get_KnowledgeVersion(name) for name in stage.knowledge}}
+            self.keys[stage.name] = hashlib.sha1(json.dumps(content, sort_keys=True).encode()).hexdigest()
+        return self.keys[stage.name]
+
+    @staticmethod
+    def get_OutputStats(outputs):
+        stats = dict()
+        for path in outputs:
+            if os.path.exists(path):
+                st = os.stat(path)
+                stats[path] = [st.st_size, st.st_mtime_ns]
+        return stats
+
+    def is_UpToDate(self, stage):
+        if self.force or stage.outputs is None:
+            return False
+        with self.lock:
+            done = self.state["stages"].get(stage.name)
+        return done is not None and done["key"] == self.get_Key(stage) and \
+            len(done["outputs"]) == len(stage.outputs) and self.get_OutputStats(stage.outputs) == done["outputs"]
+
+    def is_Needed(self, stage):
+        # a stage whose outputs are not kept only runs for the stages after it that are not up to date.
+        dependents = [other for other in self.stages.values() if stage.name in other.deps]
+        return not dependents or not all(self.is_UpToDate(other) for other in dependents)
+
+    def get_Info(self, name):
+        # the counts of a stage, of this run or of the run that produced its outputs.
+        with self.lock:
+            return self.state["stages"].get(name, {}).get("info", {})
+
+    def get_Result(self, name):
+        """the result of a stage: in memory if it ran, loaded from its outputs if it was skipped."""
+        if name not in self.results:
+            self.results[name] = self.stages[name].load()
+        return self.results[name]
+
+    def save_Done(self, stage, key, info, seconds):
+        # called by the writer after the files of the stage, the state is replaced atomically.
+        with self.lock:
+            self.state["stages"][stage.name] = {"key": key, "outputs": self.get_OutputStats(stage.outputs),
+                                                "info": info, "seconds": seconds}
+            self.save_State()
+
+    def save(self):
+        with self.lock:
+            self.save_State()
+
+    def save_State(self):
+        with open(self.state_file + ".tmp", "w") as f:
+            json.dump(self.state, f, indent=1)
+        os.replace(self.state_file + ".tmp", self.state_file)
+
+    def run(self, names=None):
+        """run the stages (all by default) in order, yield (name, status, seconds) as each is done or skipped."""
+        for stage in self.stages.values():
+            if names is not None and stage.name not in names:
+                continue
+            key = self.get_Key(stage)
+            if self.is_UpToDate(stage) or (stage.outputs is None and not self.force and not self.is_Needed(stage)):
+                self.Status[stage.name] = "skipped"
+                telemetry.record("skipped", stage=stage.name, **self.get_Info(stage.name))
+                yield stage.name, "skipped", 0.0
+                continue
+            t = time.time()
+            with self.lock:
+                self.state["stages"].pop(stage.name, None)  # not up to date until its outputs are written again
+            with telemetry.stage(stage.name) as items:
+                result, info = stage.run(self)
+                items.update(info)
+            self.results[stage.name] = result
+            seconds = round(time.time() - t, 4)
+            self.Status[stage.name] = "ran"
+            if stage.outputs is not None:
+                self.writer.submit(self.state_file, self.save_Done, stage, key, info, seconds)
+            yield stage.name, "ran", seconds
+        self.writer.submit(self.state_file, self.save)  # the file hashes of the skipped stages too
@@ -0,0 +1,419 @@
+# *_* coding: utf-8 *_*
+# @Time     : 10/18/2026
+# @Author   : zong hui
+# @object   : a local query service of the GOF and GGSS of many cases, the knowledge and the results kept in memory.
+
+
+"""
+The service loads the Gene and GO knowledge once, and the GOF and GGSS (GGSS001 if the whole GGSS was not saved) of
+every case with their top-k indexes (<case>@GOF.index.npz, <case>@GGSS.index.npz, built if missing or stale; the
+GGSS of --streaming, saved in gene order, is sorted by score when it is loaded). It answers JSON over HTTP, on
+localhost or a Unix socket:
+
+    GET  /gof?case=BRCA&gene=BCL2&k=10        the GOs of a gene, the smallest Adjusted_Pvalue first, or gene_id=,
+                                             go= (GO ID), go_name= for the genes of a GO
+    GET  /ggss?case=COVID19&gene=CD4&k=10     the most similar genes, or gene_id=
+    GET  /gene?name=BCL2   /go?id=GO:0006915  the knowledge of a gene or GO (id or name)
+    GET  /cases                               the loaded cases, their rows and load time
+    POST /batch   {"queries": [{"type": "gof", "case": "BRCA", "gene": "BCL2"}, ...]}   one result per query
+    POST /reload?case=BRCA                    load the case again now (all cases without case=)
+
+A gene is found by its name or ID in the results, otherwise by the ID of HumanGeneInformation for the name, and an
+old ID by its current one (GO alt IDs too). The result files of each case are polled every --interval seconds, a
+case whose files changed is loaded again once they did not change for one more poll (they are written while the
+service runs), and replaces the old one only when it loaded, the queries meanwhile read the old one. New case
+folders of --dir are found by the same poll.
+
+    cd bin
+    python QueryService.py --dir ../case --port 8765
+    curl 'http://127.0.0.1:8765/gof?case=test&gene=BCL2&k=5'
+    python QueryService.py --dir ../case --socket /tmp/gof.sock
+    curl --unix-socket /tmp/gof.sock 'http://localhost/ggss?case=test&gene=CD4'
+"""
+
+# load packages
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import threading
+import socketserver
+import http.server
+from urllib.parse import urlsplit, parse_qsl
+
+# load our modules
+from config import Config
+from helper import knowledge
+from ResultIndex import GOF_KEYS, GGSS_KEYS, load_ResultIndex
+
+
+# query type -- parameter -- key of the ResultIndex.
+GOF_PARAMS = {"gene": "Gene", "gene_id": "Gene_ID", "go": "GO", "go_name": "GO_Name"}
+GGSS_PARAMS = {"gene": "Name", "gene_id": "ID"}
+
+
+def get_Cases(cases=(), folder=None):
+    """(case, pmid file) of the case names, ../case/<case>/<case>.sentid.txt, and of the folders of folder with a GOF."""
+    pmids = [(case, '../case/{}/{}.sentid.txt'.format(case, case)) for case in cases]
+    if folder and os.path.isdir(folder):
+        for case in sorted(os.listdir(folder)):
+            if os.path.isfile(os.path.join(folder, case, '{}@GOF.csv'.format(case))):
+                pmids.append((case, os.path.join(folder, case, '{}.sentid.txt'.format(case))))
+    return pmids
+
+
+class CaseResults:
+    """
+    The GOF and GGSS of a case with their top-k indexes, read from its result files.
+
+    Args:
+        case (:obj: 'string'):
+            the case name.
+        pmid (:obj: 'string'):
+            the pmid file of the case, the results are next to it.
+    """
+
+    def __init__(self, case, pmid):
+        self.case = case
+        self.config = Config(case, pmid)
+        self.GOF_file, self.GGSS_file = self.get_Files(self.config)
+        self.signature = self.get_Signature(self.config)
+        self.GOF = load_ResultIndex(self.GOF_file, GOF_KEYS, self.config.GOF_index) if self.GOF_file else None
+        # the index of the whole GGSS is only valid for the GGSS file.
+        GGSS_index = self.config.GGSS_index if self.GGSS_file == self.config.GGSS else None
+        self.GGSS = load_ResultIndex(self.GGSS_file, GGSS_KEYS, GGSS_index) if self.GGSS_file else None
+        self.columns = dict()  # table -> (column, values) of its rows, a row is read without pandas
+        for name, index in (("GOF", self.GOF), ("GGSS", self.GGSS)):
+            if index is not None:
+                for key in index.keys:
+                    index.get_Position(key, "")  # the lookup tables, before the first query
+                self.columns[name] = [(column, index.table[column].values) for column in index.table.columns]
+        self.loaded = time.time()
+
+    @staticmethod
+    def get_Files(config):
+        # the GOF and GGSS files of a case, the whole GGSS or else its top 1%, None when missing.
+        GOF = config.GOF if os.path.isfile(config.GOF) else None
+        GGSS = next((path for path in (config.GGSS, config.GGSS001) if os.path.isfile(path)), None)
+        return GOF, GGSS
+
+    @classmethod
+    def get_Signature(cls, config):
+        # (path, size, mtime) of the result files, the case is loaded again when it changes.
+        signature = list()
+        for path in cls.get_Files(config):
+            if path is not None:
+                st = os.stat(path)
+                signature.append((path, st.st_size, st.st_mtime_ns))
+        return tuple(signature)
+
+    def get_Records(self, name, key, term, k):
+        """the top k rows of term as dicts, [] when the table or the term is missing."""
+        index = getattr(self, name)
+        if index is None or term is None:
+            return []
+        return [{column: values[row] for column, values in self.columns[name]} for row in index.get_Rows(key, term, k).tolist()]
+
+    def get_Info(self):
+        return {"case": self.case, "GOF": self.GOF_file, "GOF_rows": len(self.GOF.table) if self.GOF is not None else 0,
+                "GGSS": self.GGSS_file, "GGSS_rows": len(self.GGSS.table) if self.GGSS is not None else 0,
+                "loaded": round(self.loaded, 3)}
+
+
+class QueryService:
+    """
+    The results of the cases, loaded again when their files change, and the queries on them.
+
+    Args:
+        cases (:obj: 'list'):
+            (case, pmid file) of the cases.
+        folder (:obj: 'string'):
+            a folder of cases, searched again for new cases at each poll.
+        interval (:obj: 'float'):
+            seconds between two polls of the result files.
+    """
+
+    def __init__(self, cases=(), folder=None, interval=2.0):
+        self.sources = list(cases)
+        self.folder = folder
+        self.interval = interval
+        self.cases = dict()  # case -> CaseResults, replaced as a whole
+        self.pending = dict()  # case -> the signature of the last poll, of a case not loaded yet
+        self.failed = dict()  # case -> the signature of the files that failed to load
+        self.ReloadCounter = {"loaded": 0, "reloaded": 0, "failed": 0}
+        self.lock = threading.Lock()
+        self.refreshing = threading.Lock()  # the watcher and /reload
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def get_Sources(self):
+        sources = dict(get_Cases(folder=self.folder))
+        sources.update(self.sources)
+        return sources
+
+    def load(self, case, pmid):
+        # a case replaces the old one only when it loaded completely.
+        t = time.time()
+        try:
+            results = CaseResults(case, pmid)
+        except Exception as e:
+            self.ReloadCounter["failed"] += 1
+            logging.warning("[reload] {} failed, the old results are kept: {}: {}".format(case, type(e).__name__, e))
+            return False
+        with self.lock:
+            reloaded = case in self.cases
+            self.cases[case] = results
+            self.pending.pop(case, None)
+            self.failed.pop(case, None)
+        self.ReloadCounter["reloaded" if reloaded else "loaded"] += 1
+        logging.info("[{}] {}: {} GOF rows, {} GGSS rows in {} seconds".format(
+            "reload" if reloaded else "load", case, results.get_Info()["GOF_rows"], results.get_Info()["GGSS_rows"], round(time.time() - t, 4)))
+        return True
+
+    def refresh(self, force=False, names=None):
+        """
+        Load the new cases and the cases whose files changed, once their files did not change since the last poll
+        (at once with force). Returns the loaded cases.
+        """
+        with self.refreshing:
+            return self.refresh_Cases(force, names)
+
+    def refresh_Cases(self, force, names):
+        loaded = list()
+        for case, pmid in self.get_Sources().items():
+            if names is not None and case not in names:
+                continue
+            try:
+                signature = CaseResults.get_Signature(Config(case, pmid))
+            except OSError:
+                continue  # a file replaced while it is read, next poll
+            with self.lock:
+                current = self.cases.get(case)
+            if not signature or (current is not None and current.signature == signature or self.failed.get(case) == signature) and not force:
+                self.pending.pop(case, None)
+            elif force or self.pending.get(case) == signature:
+                if self.load(case, pmid):
+                    loaded.append(case)
+                else:
+                    self.failed[case] = signature  # not tried again until its files change
+            else:
+                self.pending[case] = signature
+        return loaded
+
+    def watch(self):
+        while not self.stopped.wait(self.interval):
+            self.refresh()
+
+    def start(self):
+        self.refresh(force=True)
+        self.thread = threading.Thread(target=self.watch, name="QueryServiceWatcher", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+
+    def get_Case(self, case):
+        with self.lock:
+            results = self.cases.get(case)
+        if results is None:
+            raise KeyError("unknown case: {}".format(case))
+        return results
+
+    @staticmethod
+    def get_Term(params, keys):
+        # the parameter of the query and its value, exactly one of keys.
+        given = [p for p in keys if p in params]
+        if len(given) != 1:
+            raise ValueError("give one of {}".format(list(keys)))
+        return given[0], str(params[given[0]])
+
+    @staticmethod
+    def get_GeneIDs(param, term):
+        # the gene IDs of a name or ID in HumanGeneInformation, the current ID first.
+        Gene_id2name, Gene_name2id, Gene_altid2id = knowledge.get("Gene")
+        gene_id = Gene_name2id.get(term) if param == "gene" else term
+        return [i for i in dict.fromkeys([Gene_altid2id.get(gene_id), gene_id]) if i is not None]
+
+    def query_GOF(self, params, k):
+        results = self.get_Case(params["case"])
+        param, term = self.get_Term(params, GOF_PARAMS)
+        rows = results.get_Records("GOF", GOF_PARAMS[param], term, k)
+        if not rows and param in ("gene", "gene_id"):
+            for gene_id in self.get_GeneIDs(param, term):
+                rows = rows or results.get_Records("GOF", "Gene_ID", gene_id, k)
+        elif not rows and param in ("go", "go_name"):
+            GO_name2id, GO_altid2id = knowledge.get("GO")[1], knowledge.get("GO")[5]
+            go_id = GO_name2id.get(term) if param == "go_name" else GO_altid2id.get(term)
+            rows = results.get_Records("GOF", "GO", go_id, k)
+        return term, rows
+
+    def query_GGSS(self, params, k):
+        results = self.get_Case(params["case"])
+        param, term = self.get_Term(params, GGSS_PARAMS)
+        rows = results.get_Records("GGSS", GGSS_PARAMS[param], term, k)
+        if not rows:
+            for gene_id in self.get_GeneIDs(param, term):
+                rows = rows or results.get_Records("GGSS", "ID", gene_id, k)
+        return term, rows
+
+    @staticmethod
+    def query_Gene(params):
+        Gene_id2name, Gene_name2id, Gene_altid2id = knowledge.get("Gene")
+        term = str(params.get("id") or params.get("name") or "")
+        gene_id = Gene_altid2id.get(term, Gene_name2id.get(term))
+        return term, [{"Gene_ID": gene_id, "Gene_Name": Gene_id2name.get(gene_id)}] if gene_id else []
+
+    @staticmethod
+    def query_GO(params):
+        GO_id2name, GO_name2id, GO_id2level, GO_id2children, GO_id2namespace, GO_altid2id = knowledge.get("GO")
+        term = str(params.get("id") or params.get("name") or "")
+        go_id = term if term in GO_id2name else GO_altid2id.get(term, GO_name2id.get(term))
+        if go_id not in GO_id2name:
+            return term, []
+        return term, [{"GO_ID": go_id, "GO_Name": GO_id2name[go_id], "Namespace": GO_id2namespace.get(go_id),
+                       "Level": GO_id2level.get(go_id), "Children": [c for c in GO_id2children.get(go_id, []) if c]}]
+
+    def query(self, params):
+        """
+        Answer one query.
+
+        Args:
+            params (:obj: 'dict'):
+                type ('gof', 'ggss', 'gene', 'go' or 'cases'), case, the term (gene, gene_id, go, go_name, id or
+                name) and k, the number of rows (10).
+
+        Returns:
+            dict: the query with its rows and milliseconds. KeyError for an unknown case, ValueError for a bad query.
+        """
+        t = time.perf_counter()
+        kind = params.get("type")
+        if kind == "cases":
+            with self.lock:
+                cases = list(self.cases.values())
+            return {"type": kind, "cases": [c.get_Info() for c in cases], "reload": dict(self.ReloadCounter)}
+        try:
+            k = int(params.get("k", 10))
+        except ValueError:
+            raise ValueError("k should be an integer")
+        if kind in ("gof", "ggss") and "case" not in params:
+            raise ValueError("give the case")
+        if kind == "gof":
+            term, rows = self.query_GOF(params, k)
+        elif kind == "ggss":
+            term, rows = self.query_GGSS(params, k)
+        elif kind == "gene":
+            term, rows = self.query_Gene(params)
+        elif kind == "go":
+            term, rows = self.query_GO(params)
+        else:
+            raise ValueError("unknown query type: {}, should be one of ['gof', 'ggss', 'gene', 'go', 'cases']".format(kind))
+        return {"type": kind, "case": params.get("case"), "query": term, "count": len(rows), "rows": rows,
+                "ms": round((time.perf_counter() - t) * 1000, 3)}
+
+    def query_batch(self, queries):
+        # one result per query, a failed query gives its error and the others are answered.
+        results = list()
+        for params in queries:
+            try:
+                results.append(self.query(dict(params)))
+            except (KeyError, ValueError, TypeError) as e:
+                results.append({"query": params, "error": str(e.args[0]) if e.args else type(e).__name__})
+        return results
+
+
+class QueryHandler(http.server.BaseHTTPRequestHandler):
+    # the routes of the service, self.server.service answers the queries.
+
+    def send_JSON(self, status, content):
+        body = json.dumps(content, default=lambda o: o.item() if hasattr(o, "item") else str(o)).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def answer(self, function):
+        try:
+            self.send_JSON(200, function())
+        except KeyError as e:
+            self.send_JSON(404, {"error": str(e.args[0]) if e.args else "not found"})
+        except (ValueError, TypeError) as e:
+            self.send_JSON(400, {"error": str(e)})
+        except Exception as e:
+            logging.exception("[query] {} failed".format(self.path))
+            self.send_JSON(500, {"error": "{}: {}".format(type(e).__name__, e)})
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        params = dict(parse_qsl(url.query), type=url.path.strip("/"))
+        self.answer(lambda: self.server.service.query(params))
+
+    def do_POST(self):
+        url = urlsplit(self.path)
+        params = dict(parse_qsl(url.query))
+        service = self.server.service
+        if url.path == "/batch":
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            queries = body.get("queries", []) if isinstance(body, dict) else body
+            self.answer(lambda: {"results": service.query_batch(queries)})
+        elif url.path == "/reload":
+            names = [params["case"]] if "case" in params else None
+            self.answer(lambda: {"reloaded": service.refresh(force=True, names=names)})
+        else:
+            self.send_JSON(404, {"error": "unknown path: {}".format(url.path)})
+
+    def log_message(self, format, *args):
+        # no client address on a Unix socket.
+        logging.debug("[query] " + format % args)
+
+
+class ThreadingUnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def get_Server(service, host="127.0.0.1", port=8765, socket_path=None):
+    """the HTTP server of the service, on host:port or on the Unix socket socket_path."""
+    if socket_path:
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        server = ThreadingUnixHTTPServer(socket_path, QueryHandler)
+    else:
+        server = http.server.ThreadingHTTPServer((host, port), QueryHandler)
+    server.service = service
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="local query service of the GOF and GGSS of many cases")
+    parser.add_argument('--cases', '-cases', nargs='*', default=[], help='case names, the results are in ../case/<case>/')
+    parser.add_argument('--dir', '-dir', help='a folder of cases, every <dir>/<case>/<case>@GOF.csv, new cases are found while running')
+    parser.add_argument('--host', '-host', default='127.0.0.1', help='the address of the HTTP server')
+    parser.add_argument('--port', '-port', type=int, default=8765, help='the port of the HTTP server')
+    parser.add_argument('--socket', '-socket', help='serve on this Unix socket instead of host:port')
+    parser.add_argument('--interval', '-interval', type=float, default=2.0, help='seconds between two checks of the result files')
+    args = parser.parse_args()
+    if not args.cases and not args.dir:
+        parser.error('no case, give --cases or --dir')
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s: %(message)s')
+
+    t0 = time.time()
+    knowledge.preload("Gene", "GO")
+    service = QueryService(get_Cases(args.cases), folder=args.dir, interval=args.interval)
+    service.start()
+    server = get_Server(service, args.host, args.port, args.socket)
+    logging.info("[service] {} cases loaded in {} seconds, serving on {}".format(
+        len(service.cases), round(time.time() - t0, 4), args.socket or "http://{}:{}".format(args.host, args.port)))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.stop()
+        if args.socket and os.path.exists(args.socket):
+            os.remove(args.socket)
+    sys.exit(0)
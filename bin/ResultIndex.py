@@ -0,0 +1,126 @@
+# *_* coding: utf-8 *_*
+# @Time     : 10/18/2026
+# @Author   : zong hui
+# @object   : persisted top-k index of the GOF and GGSS tables, by gene and GO.
+
+
+# load packages
+import os
+import numpy as np
+import pandas as pd
+
+
+# key -- columns of the result tables, the rows of a key value are in the table order (most related first).
+GOF_KEYS = {"Gene": ["Gene_Name"], "Gene_ID": ["Gene_ID"], "GO": ["GO_ID"], "GO_Name": ["GO_Name"]}
+GGSS_KEYS = {"Name": ["Gene1_Name", "Gene2_Name"], "ID": ["Gene1_ID", "Gene2_ID"]}
+# (column, ascending) of the score of a result table, the most related rows first.
+SCORE_ORDERS = (("Similarity_Score", False), ("Adjusted_Pvalue", True))
+
+
+class ResultIndex:
+    """
+    Sorted row offsets of a result table for each value of its keys: the rows of value v of a key are
+    rows[indptr[i]:indptr[i+1]], i the position of v, in the table order. The GOF is sorted by Adjusted_Pvalue
+    and the GGSS by Similarity_Score, so the first k rows are the top k, found in O(k) after one hash lookup.
+    A key can search several columns, e.g. both genes of a GGSS row. Values are compared as strings, so the
+    index of a table read back from its csv file is the same.
+
+    Args:
+        table (:obj: 'DataFrame'):
+            the GOF or GGSS table, in its saved order.
+        keys (:obj: 'dict'):
+            key -- columns of the table searched by the key, e.g. GOF_KEYS or GGSS_KEYS.
+    """
+
+    def __init__(self, table, keys, arrays=None):
+        self.table = table
+        self.keys = keys
+        self.arrays = arrays if arrays is not None else self.get_Arrays()
+        self.positions = dict()
+
+    def get_Arrays(self):
+        arrays = dict()
+        n_rows = len(self.table)
+        for key, columns in self.keys.items():
+            values = np.concatenate([self.table[c].astype(str).values for c in columns]) if n_rows else np.zeros(0, dtype=str)
+            rows = np.tile(np.arange(n_rows, dtype=np.int64), len(columns))
+            codes, uniques = pd.factorize(values, sort=True)
+            # a row found twice by one key (e.g. Gene1_Name == Gene2_Name) is listed once.
+            pairs = np.unique(codes.astype(np.int64) * max(n_rows, 1) + rows)
+            counts = np.bincount(pairs // max(n_rows, 1), minlength=len(uniques))
+            arrays[key + ".values"] = np.asarray(uniques, dtype=str)
+            arrays[key + ".indptr"] = np.concatenate(([0], np.cumsum(counts))).astype(np.int64)
+            arrays[key + ".rows"] = pairs % max(n_rows, 1)
+        arrays["n_rows"] = np.array([n_rows], dtype=np.int64)
+        return arrays
+
+    def get_Position(self, key, term):
+        if key not in self.positions:
+            if key not in self.keys:
+                raise KeyError("unknown key: {}, should be one of {}".format(key, list(self.keys)))
+            self.positions[key] = {v: i for i, v in enumerate(self.arrays[key + ".values"].tolist())}
+        return self.positions[key].get(str(term))
+
+    def get_Rows(self, key, term, max_number=10):
+        # positions of the top max_number rows of term, empty when the term is not in the table.
+        i = self.get_Position(key, term)
+        if i is None:
+            return np.zeros(0, dtype=np.int64)
+        start, end = self.arrays[key + ".indptr"][i], self.arrays[key + ".indptr"][i + 1]
+        return self.arrays[key + ".rows"][start:min(end, start + max_number)]
+
+    def get_TopK(self, key, term, max_number=10):
+        return self.table.iloc[self.get_Rows(key, term, max_number)]
+
+    def get_TopK_batch(self, key, terms, max_number=10):
+        """the top max_number rows of each term, one table with the term in the first column 'Query'."""
+        terms = list(terms)
+        rows = [self.get_Rows(key, term, max_number) for term in terms]
+        res = self.table.iloc[np.concatenate(rows) if rows else np.zeros(0, dtype=np.int64)]
+        res.insert(0, "Query", np.repeat(np.array(terms, dtype=object), [len(r) for r in rows]))
+        return res
+
+    def save(self, save_path, source=None):
+        # the size and mtime of the source csv file are saved, load_ResultIndex rebuilds a stale index.
+        arrays = dict(self.arrays)
+        if source:
+            st = os.stat(source)
+            arrays["source"] = np.array([st.st_size, st.st_mtime_ns], dtype=np.int64)
+        with open(save_path, "wb") as f:
+            np.savez(f, **arrays)
+
+
+def sort_Table(table):
+    """
+    The table sorted by its score (stable), the top-k of the index are its first rows. Returns (table, sorted),
+    sorted is False when the rows were not in the score order, e.g. the GGSS of --streaming, written gene by gene.
+    """
+    for column, ascending in SCORE_ORDERS:
+        if column in table.columns:
+            diff = np.diff(pd.to_numeric(table[column], errors="coerce").values)
+            if (diff >= 0).all() if ascending else (diff <= 0).all():
+                return table, True
+            return table.sort_values(column, ascending=ascending, kind="mergesort").reset_index(drop=True), False
+    return table, True
+
+
+def load_ResultIndex(table_file, keys, index_file=None):
+    """
+    Read a saved GOF or GGSS csv file with its index, the index is built (and saved at index_file) when it is
+    missing or older than the table. A table not sorted by its score is sorted in memory, its index is built
+    and not saved (the rows of a saved index are those of the file).
+    """
+    table, in_order = sort_Table(pd.read_csv(table_file, keep_default_na=False))
+    if not in_order:
+        return ResultIndex(table, keys)
+    if index_file and os.path.exists(index_file):
+        with np.load(index_file) as f:
+            arrays = {k: f[k] for k in f.files}
+        st = os.stat(table_file)
+        if "source" in arrays and arrays["source"].tolist() == [st.st_size, st.st_mtime_ns] \
+                and all(k + ".rows" in arrays for k in keys) and arrays["n_rows"][0] == len(table):
+            return ResultIndex(table, keys, arrays)
+    index = ResultIndex(table, keys)
+    if index_file:
+        index.save(index_file, source=table_file)
+    return index
@@ -0,0 +1,88 @@
+# *_* coding: utf-8 *_*
+# @Time     : 10/18/2026
+# @Author   : zong hui
+# @object   : single-pass statistics and bounded top-k of streamed scores.
+
+
+# load packages
+import numpy as np
+
+
+class RunningStats:
+    """
+    Count, min, max, mean and standard deviation of scores streamed block by block, the blocks are merged with
+    the parallel algorithm of Chan et al., so the result does not depend on the block sizes.
+    std is the sample standard deviation (ddof=1), as pandas Series.std().
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.min = np.nan
+        self.max = np.nan
+        self.mean = np.nan
+        self.M2 = 0.0
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        n = len(values)
+        if n == 0:
+            return
+        mean = values.mean()
+        M2 = float(((values - mean) ** 2).sum())
+        if self.count == 0:
+            self.count, self.min, self.max, self.mean, self.M2 = n, values.min(), values.max(), mean, M2
+            return
+        count = self.count + n
+        delta = mean - self.mean
+        self.mean = self.mean + delta * n / count
+        self.M2 = self.M2 + M2 + delta * delta * self.count * n / count
+        self.count = count
+        self.min = min(self.min, values.min())
+        self.max = max(self.max, values.max())
+
+    @property
+    def std(self):
+        return np.sqrt(self.M2 / (self.count - 1)) if self.count > 1 else np.nan
+
+
+class TopKBuffer:
+    """
+    The k largest scores of a stream, with their columns. Each push keeps at most k rows, found by partition
+    in linear time, scores tied at the k-th place keep the rows pushed first.
+
+    Args:
+        k (:obj: 'int'):
+            the number of rows kept.
+    """
+
+    def __init__(self, k):
+        self.k = max(int(k), 0)
+        self.seen = 0
+        self.score = np.zeros(0, dtype=np.float64)
+        self.seq = np.zeros(0, dtype=np.int64)
+        self.columns = None
+
+    def push(self, score, *columns):
+        seq = self.seen + np.arange(len(score), dtype=np.int64)
+        self.seen += len(score)
+        if self.k == 0:
+            # nothing is kept, but get() still gives the (empty) columns.
+            self.columns = [np.asarray(c)[:0] for c in columns]
+            return
+        score = np.concatenate((self.score, score))
+        seq = np.concatenate((self.seq, seq))
+        columns = [np.concatenate((old, new)) for old, new in zip(self.columns, columns)] if self.columns else list(columns)
+        if len(score) > self.k:
+            neg = -score
+            kth = np.partition(neg, self.k - 1)[self.k - 1]
+            better = np.flatnonzero(neg < kth)
+            ties = np.flatnonzero(neg == kth)
+            ties = ties[np.argsort(seq[ties], kind="stable")[:self.k - len(better)]]
+            keep = np.concatenate((better, ties))
+            score, seq, columns = score[keep], seq[keep], [c[keep] for c in columns]
+        self.score, self.seq, self.columns = score, seq, columns
+
+    def get(self):
+        """the scores and columns kept, the largest score first, ties in the order they were pushed."""
+        order = np.lexsort((self.seq, -self.score))
+        return [self.score[order]] + [c[order] for c in (self.columns or [])]
@@ -0,0 +1,224 @@
+# *_* coding: utf-8 *_*
+# @Time     : 10/18/2026
+# @Author   : zong hui
+# @object   : per-stage and per-step performance records of a case, as JSON lines, with an optional sampling profiler.
+
+
+"""
+The telemetry of a case is one JSON object per line in <case>@telemetry.jsonl, next to the case outputs:
+
+    {"event": "run", "case", "pid", "time", "options"}                          first line, the arguments of the run
+    {"event": "span", "case", "stage", "step", "pid", "start", "wall", "cpu", "process_cpu", "children_cpu",
+     "peak_rss_mb", "rss_mb", "items", "profile"}
+    {"event": "skipped", "case", "stage", "pid", "time", "items"}               a step skipped by the pipeline
+
+A stage span (step "stage") covers a step of the pipeline, the spans inside it (load, counting, fisher, adjustment,
+evidence, pairs, normalization, ...) are recorded with its stage name, also in the forked workers (their pid differs,
+one record per shard). The files written by the ArtifactWriter are spans of the stage "save".
+
+    wall          seconds
+    cpu           CPU seconds of the thread of the span
+    process_cpu   CPU seconds of the process (all its threads, e.g. the ArtifactWriter)
+    children_cpu  CPU seconds of the worker processes joined during the span
+    peak_rss_mb   the peak resident memory during the span: the peak is reset (/proc/self/clear_refs) when a span
+                  starts on the main thread, otherwise it is the peak of the process so far
+    items         the counts of the span: genes, GOs, pairs tested and kept, edges, rows...
+
+A stage listed in profile is sampled by the profiler hook (SamplingProfiler by default): the stacks of the thread
+are saved as collapsed stacks ("frame;frame;frame count"), the input of flamegraph.pl and speedscope.
+"""
+
+# load packages
+import os
+import sys
+import json
+import time
+import resource
+import threading
+import contextlib
+from collections import Counter
+
+
+def get_RSS():
+    # (current, peak) resident memory of the process in MB, the peak from ru_maxrss if /proc is not there.
+    try:
+        with open("/proc/self/status", "r") as f:
+            status = dict(line.split(":", 1) for line in f if line.startswith(("VmRSS", "VmHWM")))
+        return int(status["VmRSS"].split()[0]) / 1024, int(status["VmHWM"].split()[0]) / 1024
+    except (OSError, KeyError):
+        return None, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def reset_PeakRSS():
+    # the peak resident memory starts again from the current one (Linux 4.0+), False if it can not be reset.
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def get_ChildrenCPU():
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+class SamplingProfiler:
+    """
+    Sample the stack of a thread every interval seconds, on a daemon thread.
+
+    Args:
+        thread_id (:obj: 'int'):
+            the threading.get_ident() of the sampled thread.
+        interval (:obj: 'float'):
+            seconds between two samples.
+    """
+
+    def __init__(self, thread_id, interval=0.005):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.Stacks = Counter()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, name="SamplingProfiler", daemon=True)
+
+    @staticmethod
+    def get_Frame(code):
+        return "{} ({}:{})".format(code.co_name, os.path.basename(code.co_filename), code.co_firstlineno)
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = list()
+            while frame is not None:
+                stack.append(self.get_Frame(frame.f_code))
+                frame = frame.f_back
+            if stack:
+                self.Stacks[";".join(reversed(stack))] += 1
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+
+    def save(self, save_path):
+        # collapsed stacks, the most sampled first.
+        with open(save_path, "w") as f:
+            for stack, count in self.Stacks.most_common():
+                f.write("{} {}\n".format(stack, count))
+        return sum(self.Stacks.values())
+
+
+class Telemetry:
+    """
+    The performance records of a case, nothing is recorded until open().
+    The spans of a thread are nested, the stage of a span is the stage span around it.
+    """
+
+    def __init__(self):
+        self.fd = None
+        self.case = None
+        self.profile = set()
+        self.profile_path = None
+        self.profiler = SamplingProfiler  # the hook: profiler(thread_id) with start(), stop() and save(path)
+        self.local = threading.local()
+        self.peak = 0.0  # the peak resident memory before the last reset
+
+    def open(self, save_path, case, profile=(), profile_path=None, options=None):
+        """
+        Args:
+            save_path (:obj: 'string'):
+                the JSON lines file, written again.
+            case (:obj: 'string'):
+                the case name of the records.
+            profile (:obj: 'list'):
+                the stages sampled by the profiler.
+            profile_path (:obj: 'string'):
+                the collapsed stacks file of a stage, formatted with the stage name.
+            options (:obj: 'dict'):
+                the arguments of the run, saved in the first record.
+        """
+        self.close()
+        self.fd = os.open(save_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | os.O_APPEND, 0o644)
+        self.case = case
+        self.profile = set(profile)
+        self.profile_path = profile_path
+        self.write({"event": "run", "case": case, "pid": os.getpid(), "time": time.time(), "options": options})
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+    def write(self, record):
+        # one write of a whole line to an O_APPEND file, the lines of the forked workers are not mixed.
+        os.write(self.fd, (json.dumps(record, default=lambda o: o.item() if hasattr(o, "item") else str(o)) + "\n").encode())
+
+    def get_PeakRSS(self):
+        """the peak resident memory of the process in MB, also across the resets of the spans."""
+        return max(self.peak, get_RSS()[1])
+
+    def get_Stack(self):
+        if not hasattr(self.local, "stack"):
+            self.local.stack = list()
+        return self.local.stack
+
+    def stage(self, name, **items):
+        """the span of a stage, sampled by the profiler if the stage is in profile."""
+        return self.span("stage", stage=name, **items)
+
+    @contextlib.contextmanager
+    def span(self, step, stage=None, **items):
+        """
+        Record the time, memory and items of a step, the caller adds its counts to the yielded items.
+        """
+        if self.fd is None:
+            yield items
+            return
+        stack = self.get_Stack()
+        if stage is None:
+            stage = stack[0]["stage"] if stack else None
+        main_thread = threading.current_thread() is threading.main_thread()
+        if main_thread:
+            peak = get_RSS()[1]
+            self.peak = max(self.peak, peak)
+            for span in stack:
+                span["peak"] = max(span["peak"], peak)
+            reset_PeakRSS()
+        span = {"stage": stage, "peak": 0.0}
+        stack.append(span)
+        profiler = None
+        if step == "stage" and stage in self.profile:
+            profiler = self.profiler(threading.get_ident())
+            profiler.start()
+        start, wall, cpu, process_cpu, children_cpu = time.time(), time.perf_counter(), time.thread_time(), time.process_time(), get_ChildrenCPU()
+        try:
+            yield items
+        finally:
+            wall, cpu, process_cpu, children_cpu = (time.perf_counter() - wall, time.thread_time() - cpu,
+                                                    time.process_time() - process_cpu, get_ChildrenCPU() - children_cpu)
+            stack.pop()
+            rss, peak = get_RSS()
+            peak = max(span["peak"], peak)
+            for outer in stack:
+                outer["peak"] = max(outer["peak"], peak)
+            record = {"event": "span", "case": self.case, "stage": stage, "step": step, "pid": os.getpid(),
+                      "start": round(start, 4), "wall": round(wall, 4), "cpu": round(cpu, 4), "process_cpu": round(process_cpu, 4),
+                      "children_cpu": round(children_cpu, 4), "peak_rss_mb": round(peak, 1),
+                      "rss_mb": None if rss is None else round(rss, 1), "items": items}
+            if profiler is not None:
+                profiler.stop()
+                record["profile"] = self.profile_path.format(stage)
+                profiler.save(record["profile"])
+            self.write(record)
+
+    def record(self, step, stage=None, **items):
+        # a record without timing, e.g. a stage skipped by the pipeline.
+        if self.fd is not None:
+            self.write({"event": step, "case": self.case, "stage": stage, "pid": os.getpid(), "time": round(time.time(), 4), "items": items})
+
+
+# the telemetry of the running case, opened by main.py.
+telemetry = Telemetry()
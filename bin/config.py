@@ -14,11 +14,13 @@ class basicConfig(object):
     # TCGA_RNAseq_PATH = '../../rawdata/TCGA_RNAseq/'
     MSigDB_C5_GO_PATH = "../knol/MSigDB/c5.go.v7.2.symbols.gmt"
     NCBI_Entrez_Gene2GO = "../knol/NCBI_EntrezGene/gene2go.gz"
+    NCBI_TAX_ID = "9606"  # the species of HumanGeneInformation in gene2go
     HumanGeneInformation = "../knol/HumanGeneInformation/HumanGeneInformation.txt"
+    SNAPSHOT_PATH = "../knol/snapshot"  # binary snapshots of the files above, see KnowledgeSnapshot.py
 
     
 class Config(basicConfig):
-    def __init__(self, case, pmid):
+    def __init__(self, case, pmid, entity_path=None):
         
         self.pmid = pmid
         self.case_name = case
@@ -26,8 +28,10 @@ class Config(basicConfig):
 
         self.logFile = os.path.join(self.case_path, '{}.log'.format(case))
         
-        self.pmid2go = '../case/{}/{}/{}_pubmed2go.csv'.format(case, basicConfig.DB_PATH, case)
-        self.pmid2gene = '../case/{}/{}/{}_pubmed2gene.csv'.format(case, basicConfig.DB_PATH, case)
+        # the folder of the entity files, ../case/<case>/BiologicalEntity by default.
+        self.entity_path = entity_path or '../case/{}/{}'.format(case, basicConfig.DB_PATH)
+        self.pmid2go = os.path.join(self.entity_path, '{}_pubmed2go.csv'.format(case))
+        self.pmid2gene = os.path.join(self.entity_path, '{}_pubmed2gene.csv'.format(case))
 
         self.mapping_go2pmid = os.path.join(self.case_path, '{}@mapping_go2pmid.txt'.format(case))
         self.mapping_gene2pmid = os.path.join(self.case_path, '{}@mapping_gene2pmid.txt'.format(case))
@@ -36,11 +40,20 @@ class Config(basicConfig):
         self.GOF = os.path.join(self.case_path, '{}@GOF.csv'.format(case))
         self.GGSS = os.path.join(self.case_path, '{}@GGSS.csv'.format(case))
         self.GGSS001 = os.path.join(self.case_path, '{}@GGSS001.csv'.format(case))
+        self.GOF_index = os.path.join(self.case_path, '{}@GOF.index.npz'.format(case))
+        self.GGSS_index = os.path.join(self.case_path, '{}@GGSS.index.npz'.format(case))
+        self.GGSS_store = os.path.join(self.case_path, '{}@GGSS.edges'.format(case))
+        self.GGSS_candidates = os.path.join(self.case_path, '{}@GGSS.candidates.csv'.format(case))
+        self.GGSS_clusters = os.path.join(self.case_path, '{}@GGSS001.MCODE.csv'.format(case))
+        self.GOF_checkpoint = os.path.join(self.case_path, '{}@GOF.checkpoint'.format(case))
+        self.pipeline_state = os.path.join(self.case_path, '{}@pipeline.json'.format(case))
+        self.telemetry = os.path.join(self.case_path, '{}@telemetry.jsonl'.format(case))
+        self.profile = os.path.join(self.case_path, '{}@profile.'.format(case) + '{}.txt')  # formatted with the stage name
+        self.matrix_GOFxGEX = os.path.join(self.case_path, '{}@matrix_GOFxGEX.txt'.format(case))
         
         # self.GEX =  os.path.join(basicConfig.TCGA_RNAseq_PATH, '{}__gene.normalized_RNAseq__tissueTypeAll.txt'.format(case))
         # self.matirx_GOF = os.path.join(self.case_path, '{}@matirx_GOF.txt'.format(case))
         # self.matrix_GEX = os.path.join(self.case_path, '{}@matrix_GEX.txt'.format(case))
-        # self.matrix_GOFxGEX = os.path.join(self.case_path, '{}@matrix_GOFxGEX.txt'.format(case))
         
         # self.GOF_gmt = '../case/{}/GOF_gmt/'.format(case)
         # self.MSigDB_folder = '../case/{}/MSigDB/'.format(case)
@@ -4,13 +4,30 @@
 # @object   : load some files
 
 
+import os
 import csv
-import gzip
+import numpy as np
 import pandas as pd
 
+import config
+basicConfig = config.basicConfig
+from KnowledgeSnapshot import load_Snapshot, compile_Snapshot, Snapshot, SnapshotMapping
 
-def get_GeneIDNameMapping(infile="../knol/HumanGeneInformation/HumanGeneInformation.txt"):
-    """get Gene ID-Name Mapping from downloaded files from HumanGeneInformation_file."""
+
+def get_GeneIDNameMapping(infile="../knol/HumanGeneInformation/HumanGeneInformation.txt", snapshot_path=basicConfig.SNAPSHOT_PATH):
+    """
+    get Gene ID-Name Mapping from downloaded files from HumanGeneInformation_file, read-only dicts (SnapshotMapping)
+    over the arrays of its snapshot, parsed in memory when it was never compiled.
+    """
+    return get_GeneMappings(get_KnowledgeSnapshot("Gene", infile, snapshot_path))
+
+
+def get_GeneMappings(snapshot):
+    # Gene_id2name, Gene_name2id, Gene_altid2id of a Gene snapshot.
+    return tuple(snapshot.get_Mapping(name + "_keys", name + "_values") for name in ("id2name", "name2id", "altid2id"))
+
+
+def read_GeneIDNameMapping(infile):
     Name2IDs = dict()
     with open(infile, "r") as f:
         f.readline()
@@ -38,7 +55,19 @@ def get_GeneIDNameMapping(infile="../knol/HumanGeneInformation/HumanGeneInformat
     return Gene_id2name, Gene_name2id, Gene_altid2id
 
 
-def get_GOIDNameMapping(infile="../knol/GO/go.info.csv"):
+def get_GOIDNameMapping(infile="../knol/GO/go.info.csv", snapshot_path=basicConfig.SNAPSHOT_PATH):
+    """GO ID-Name Mappings of the go.info.csv file, read-only dicts (SnapshotMapping) as get_GeneIDNameMapping."""
+    return get_GOMappings(get_KnowledgeSnapshot("GO", infile, snapshot_path))
+
+
+def get_GOMappings(snapshot):
+    # GO_id2name, GO_name2id, GO_id2level, GO_id2children, GO_id2namespace, GO_altid2id of a GO snapshot.
+    return (snapshot.get_Mapping("id", "name"), snapshot.get_Mapping("name", "id"), snapshot.get_Mapping("id", "level"),
+            snapshot.get_Mapping("id", "children"), snapshot.get_Mapping("id", "namespace"),
+            snapshot.get_Mapping("altid2id_keys", "altid2id_values"))
+
+
+def read_GOIDNameMapping(infile):
     GOinfo = pd.read_csv(infile, keep_default_na=False)
     GO_id2name = dict(zip(GOinfo.id, GOinfo.name))
     GO_name2id = dict(zip(GOinfo.name, GOinfo.id))
@@ -56,23 +85,222 @@ def get_GOIDNameMapping(infile="../knol/GO/go.info.csv"):
     return GO_id2name, GO_name2id, GO_id2level, GO_id2children, GO_id2namespace, GO_altid2id
 
 
-def get_NCBI_GeneGO2PMID(infile="../knol/NCBI_EntrezGene/gene2go.gz"):
-    # GO annotations from the gene2go.gz nfile avalable at NCBI EntrezGene ftp
-    NCBI_GeneGO2PMID = dict()
-    with gzip.open(infile, 'rb') as f:
-        f.readline()
-        for line in f:
-            l = line.decode().split("\t")
-            gene_id, go_id, pubmed = l[1], l[2], l[6]
-            if pubmed != '-':
-                NCBI_GeneGO2PMID[(gene_id, go_id)] = pubmed.split('|')
-    return NCBI_GeneGO2PMID
+def get_NCBI_GeneGO2PMID(infile="../knol/NCBI_EntrezGene/gene2go.gz", snapshot_path=basicConfig.SNAPSHOT_PATH,
+                         tax_id=None, gene_ids=None, go_ids=None):
+    """
+    GO annotations from the gene2go.gz file available at NCBI EntrezGene ftp, (Gene ID, GO ID) -- PMIDs, a read-only
+    dict (SnapshotMapping) over the arrays of its snapshot: the PMID lists are decoded only when they are read, their
+    number comes from the offsets (get_Lengths). Only the annotations of tax_id, gene_ids and go_ids are kept when
+    they are given (predicate pushdown), the IDs are sequences or mappings (e.g. Gene_id2name).
+    """
+    snapshot = load_KnowledgeSnapshot("NCBI", infile, snapshot_path)
+    if snapshot is None:
+        rows = None
+        snapshot = Snapshot.from_Columns(get_Gene2GOColumns(read_NCBI_Gene2GO(infile, tax_id, gene_ids, go_ids)))
+    else:
+        rows = get_Gene2GORows(snapshot, tax_id, gene_ids, go_ids)
+    # a (Gene ID, GO ID) annotated with several evidences keeps its last PMIDs, in the order of its first line.
+    return snapshot.get_Mapping(("gene_id", "go_id"), "pmid", rows)
+
+
+def get_Gene2GOFilter(Gene2GO, tax_id=None, gene_ids=None, go_ids=None):
+    # boolean mask of the gene2go rows passing the filters, the IDs are only looked up in the rows of tax_id.
+    keep = np.ones(len(Gene2GO), dtype=bool)
+    if tax_id is not None:
+        keep &= (Gene2GO.tax_id == str(tax_id)).values
+    for column, ids in (("gene_id", gene_ids), ("go_id", go_ids)):
+        if ids is not None:
+            keep[keep] = get_IDMembers(Gene2GO[column].values[keep], ids)
+    return keep
 
 
-def get_MSigDB_GO2Gene(MSigDB_file="../knol/MSigDB/c5.go.v7.2.symbols.gmt"):
+def get_Gene2GORows(snapshot, tax_id=None, gene_ids=None, go_ids=None):
+    # the gene2go rows of a snapshot passing the filters, compared by their codes, each distinct ID decoded once.
+    keep = np.ones(len(snapshot.arrays["tax_id.codes"]), dtype=bool)
+    if tax_id is not None:
+        keep &= snapshot.arrays["tax_id.codes"] == snapshot.strings.get_Code(str(tax_id))
+    for column, ids in (("gene_id", gene_ids), ("go_id", go_ids)):
+        if ids is not None:
+            codes, inverse = np.unique(snapshot.arrays[column + ".codes"][keep], return_inverse=True)
+            keep[keep] = get_IDMembers(snapshot.strings.get_Strings(codes), ids)[inverse]
+    return np.flatnonzero(keep)
+
+
+def get_IDMembers(values, ids):
+    # whether each value is one of ids, the keys of a SnapshotMapping or a sequence of IDs.
+    if isinstance(ids, SnapshotMapping):
+        return ids.get_Positions(values) >= 0
+    return pd.Index(values, dtype=object).isin(get_IDIndex(ids))
+
+
+def get_IDIndex(ids):
+    return ids if isinstance(ids, pd.Index) else pd.Index(list(ids), dtype=object)
+
+
+def read_NCBI_Gene2GO(infile, tax_id=None, gene_ids=None, go_ids=None, chunksize=1 << 18):
+    """
+    the tax_id, gene_id, go_id, pubmed columns of the gene2go lines with PMIDs, parsed in chunks by the pandas
+    C reader and filtered chunk by chunk, so the unused species never stay in memory.
+    """
+    reader = pd.read_csv(infile, sep="\t", header=None, skiprows=1, usecols=[0, 1, 2, 6],
+                         names=["tax_id", "gene_id", "go_id", "pubmed"], dtype=str, na_filter=False,
+                         quoting=csv.QUOTE_NONE, compression="infer", chunksize=chunksize)
+    # the ID sequences are indexed once for all the chunks, the mappings are searched as they are.
+    gene_ids, go_ids = [ids if ids is None or isinstance(ids, SnapshotMapping) else get_IDIndex(ids) for ids in (gene_ids, go_ids)]
+    chunks = list()
+    for chunk in reader:
+        chunk = chunk[get_Gene2GOFilter(chunk, tax_id, gene_ids, go_ids) & (chunk.pubmed != "-").values]
+        chunks.append(chunk)
+    if not chunks:
+        return pd.DataFrame({"tax_id": [], "gene_id": [], "go_id": [], "pubmed": []}, dtype=object)
+    return pd.concat(chunks, ignore_index=True)
+
+
+def get_MSigDB_GO2Gene(MSigDB_file="../knol/MSigDB/c5.go.v7.2.symbols.gmt", snapshot_path=basicConfig.SNAPSHOT_PATH):
+    # lower case GO name -- gene symbols, a read-only dict (SnapshotMapping) as get_GeneIDNameMapping.
+    return get_KnowledgeSnapshot("MSigDB", MSigDB_file, snapshot_path).get_Mapping("go_name", "genes")
+
+
+def read_MSigDB_GO2Gene(MSigDB_file):
     MSigDB_GO2Gene = {}
     with open(MSigDB_file, 'r') as f:
         for line in f:
             l = line.strip().split("\t")
             MSigDB_GO2Gene[l[0].replace("GO_","").replace("_"," ").lower()] = l[2:]
     return MSigDB_GO2Gene
+
+
+def get_SnapshotColumns(name, infile):
+    """parse a knowledge file into the columns of its snapshot."""
+    if name == "Gene":
+        Gene_id2name, Gene_name2id, Gene_altid2id = read_GeneIDNameMapping(infile)
+        return {"id2name_keys": ("strings", list(Gene_id2name.keys())), "id2name_values": ("strings", list(Gene_id2name.values())),
+                "name2id_keys": ("strings", list(Gene_name2id.keys())), "name2id_values": ("strings", list(Gene_name2id.values())),
+                "altid2id_keys": ("strings", list(Gene_altid2id.keys())), "altid2id_values": ("strings", list(Gene_altid2id.values()))}
+    if name == "GO":
+        GOinfo = pd.read_csv(infile, keep_default_na=False)
+        GO_id2name, GO_name2id, GO_id2level, GO_id2children, GO_id2namespace, GO_altid2id = read_GOIDNameMapping(infile)
+        levels = GOinfo.level.tolist()
+        return {"id": ("strings", GOinfo.id.tolist()), "name": ("strings", GOinfo.name.tolist()),
+                "level": ("ints", levels) if pd.api.types.is_integer_dtype(GOinfo.level) else ("strings", [str(l) for l in levels]),
+                "namespace": ("strings", GOinfo.namespace.tolist()),
+                "children": ("lists", [c.split(';') for c in GOinfo.children]),
+                "altid2id_keys": ("strings", list(GO_altid2id.keys())), "altid2id_values": ("strings", list(GO_altid2id.values()))}
+    if name == "MSigDB":
+        MSigDB_GO2Gene = read_MSigDB_GO2Gene(infile)
+        return {"go_name": ("strings", list(MSigDB_GO2Gene.keys())), "genes": ("lists", list(MSigDB_GO2Gene.values()))}
+    if name == "NCBI":
+        # all the lines with PMIDs, the loader filters them and resolves the repeated (Gene ID, GO ID).
+        return get_Gene2GOColumns(read_NCBI_Gene2GO(infile))
+    raise KeyError("unknown knowledge resource: {}".format(name))
+
+
+def get_Gene2GOColumns(Gene2GO):
+    return {"tax_id": ("strings", Gene2GO.tax_id.tolist()), "gene_id": ("strings", Gene2GO.gene_id.tolist()),
+            "go_id": ("strings", Gene2GO.go_id.tolist()), "pmid": ("lists", Gene2GO.pubmed.str.split("|").tolist())}
+
+
+def get_EmptyColumns(name):
+    # the columns of an empty knowledge file, the knowledge of a skipped resource.
+    kinds = {"Gene": dict.fromkeys(["id2name_keys", "id2name_values", "name2id_keys", "name2id_values",
+                                    "altid2id_keys", "altid2id_values"], "strings"),
+             "GO": dict(dict.fromkeys(["id", "name", "namespace", "altid2id_keys", "altid2id_values"], "strings"),
+                        level="ints", children="lists"),
+             "MSigDB": {"go_name": "strings", "genes": "lists"},
+             "NCBI": {"tax_id": "strings", "gene_id": "strings", "go_id": "strings", "pmid": "lists"}}[name]
+    return {column: (kind, []) for column, kind in kinds.items()}
+
+
+def get_SnapshotName(name, infile):
+    return "{}-{}".format(name, os.path.basename(infile))
+
+
+def get_KnowledgeSnapshot(name, infile, snapshot_path):
+    # the snapshot of a knowledge file, parsed into the same arrays in memory when it was never compiled.
+    snapshot = load_KnowledgeSnapshot(name, infile, snapshot_path)
+    return snapshot if snapshot is not None else Snapshot.from_Columns(get_SnapshotColumns(name, infile))
+
+
+def load_KnowledgeSnapshot(name, infile, snapshot_path):
+    # the snapshot of a knowledge file, None if it was never compiled (or snapshot_path is None).
+    if not snapshot_path:
+        return None
+    return load_Snapshot(get_SnapshotName(name, infile), [infile], lambda: get_SnapshotColumns(name, infile), snapshot_path)
+
+
+def compile_Snapshots(snapshot_path=basicConfig.SNAPSHOT_PATH):
+    """compile the binary snapshots of the knowledge files in basicConfig."""
+    for name, infile in [("Gene", basicConfig.HumanGeneInformation), ("GO", basicConfig.GO_INFO),
+                         ("MSigDB", basicConfig.MSigDB_C5_GO_PATH), ("NCBI", basicConfig.NCBI_Entrez_Gene2GO)]:
+        if os.path.exists(infile):
+            compile_Snapshot(get_SnapshotName(name, infile), [infile], lambda: get_SnapshotColumns(name, infile), snapshot_path)
+            print("[snapshot] {} compiled".format(infile))
+
+
+class KnowledgeRegistry:
+    """
+    Knowledge bases shared by all modules of a process. Each resource is loaded on its first access and
+    cached once per process, it can also be preloaded (e.g. before forking workers) or skipped, a skipped
+    resource is replaced by its empty value. The mappings are read-only dicts (SnapshotMapping) over the int-coded
+    arrays of the snapshots, memory-mapped and shared by the processes, strings are decoded when they are read.
+
+    resources:
+        Gene:   (Gene_id2name, Gene_name2id, Gene_altid2id), from HumanGeneInformation.
+        GO:     (GO_id2name, GO_name2id, GO_id2level, GO_id2children, GO_id2namespace, GO_altid2id), from GO_INFO.
+        MSigDB: MSigDB_GO2Gene, from the MSigDB c5 GO gmt file.
+        NCBI:   NCBI_GeneGO2PMID, from NCBI gene2go, PMIDs of the known human genes and GOs.
+    """
+
+    def __init__(self):
+        self.loaders = dict()
+        self.empty = dict()
+        self.sources = dict()
+        self.cache = dict()
+        self.skipped = set()
+
+    def register(self, name, loader, empty=None, sources=()):
+        self.loaders[name] = loader
+        self.empty[name] = empty
+        self.sources[name] = list(sources)
+
+    def get_Sources(self, name):
+        # the knowledge files of a resource, including those of the resources it is built from.
+        return self.sources[name]
+
+    def get(self, name):
+        if name not in self.cache:
+            if name in self.skipped:
+                self.cache[name] = self.empty[name]() if callable(self.empty[name]) else self.empty[name]
+            else:
+                self.cache[name] = self.loaders[name]()
+        return self.cache[name]
+
+    def preload(self, *names):
+        for name in names or list(self.loaders):
+            self.get(name)
+
+    def skip(self, *names):
+        for name in names:
+            if name not in self.loaders:
+                raise KeyError("unknown knowledge resource: {}".format(name))
+            self.skipped.add(name)
+            self.cache.pop(name, None)
+
+    def is_loaded(self, name):
+        return name in self.cache
+
+
+knowledge = KnowledgeRegistry()
+knowledge.register("Gene", lambda: get_GeneIDNameMapping(basicConfig.HumanGeneInformation),
+                   lambda: get_GeneMappings(Snapshot.from_Columns(get_EmptyColumns("Gene"))),
+                   sources=[basicConfig.HumanGeneInformation])
+knowledge.register("GO", lambda: get_GOIDNameMapping(basicConfig.GO_INFO),
+                   lambda: get_GOMappings(Snapshot.from_Columns(get_EmptyColumns("GO"))), sources=[basicConfig.GO_INFO])
+knowledge.register("MSigDB", lambda: get_MSigDB_GO2Gene(basicConfig.MSigDB_C5_GO_PATH),
+                   lambda: Snapshot.from_Columns(get_EmptyColumns("MSigDB")).get_Mapping("go_name", "genes"),
+                   sources=[basicConfig.MSigDB_C5_GO_PATH])
+# only the PMID counts of the human genes and GOs of GO_INFO are used by the GOF.
+knowledge.register("NCBI", lambda: get_NCBI_GeneGO2PMID(basicConfig.NCBI_Entrez_Gene2GO, tax_id=basicConfig.NCBI_TAX_ID,
+                                                        gene_ids=knowledge.get("Gene")[0], go_ids=knowledge.get("GO")[0]),
+                   lambda: Snapshot.from_Columns(get_EmptyColumns("NCBI")).get_Mapping(("gene_id", "go_id"), "pmid"),
+                   sources=[basicConfig.NCBI_Entrez_Gene2GO, basicConfig.HumanGeneInformation, basicConfig.GO_INFO])
@@ -7,83 +7,259 @@
 # load packages
 import os
 import time
+import shutil
+t0 = time.time()
 import logging
+import resource
 import datetime
 import argparse
 
 
 # load our modules
-import config
+from config import Config
 from EntityMapping import EntityMapping
 from CalculatePvalue import CalculatePvalue
 from GeneSimilarity import GeneSimilarity
 from GOFxGEX import GOFxGEX
+from MCODE import MCODE
+from ArtifactWriter import ArtifactWriter
+from Pipeline import Pipeline, Stage
+from helper import knowledge
+from Telemetry import telemetry
+t_import = time.time()
 
 
 # parsing parameters
-parser = argparse.ArgumentParser()
-parser.add_argument('--case', '-case', help='a cancer name')
-parser.add_argument('--pmid', '-pmid', help='a file, each line is a pmid')
-args = parser.parse_args()
-case = args.case
-pmid = args.pmid
-
-
-config = config.Config(case, pmid)
-logging.basicConfig(level=logging.DEBUG, filename=config.logFile, filemode="w", format="%(message)s")
-
-
-# step1: Entity Mapping
-t1 = time.time()
-logging.info("{} GOF, logging:\n{}".format(case, datetime.datetime.now()))
-em = EntityMapping(config.pmid, config.pmid2gene, config.pmid2go)
-em.save_PMIDEntitesMapping(save_path=config.mapping_pmid2entities)
-em.save_GeneMapping(save_path=config.mapping_gene2pmid)
-em.save_GoMapping(save_path=config.mapping_go2pmid)
-GeneMapping = em.GeneMapping
-GoMapping = em.GoMapping
-logging.info("\n--------------------\n[step1] Entity Mapping")
-logging.info("\t[PMID] number of Input PMID: {}".format(len(em.input_pmid_list)))
-logging.info("\t       after screening, leave the PMID, which abstract mentions both Gene (Our HumanGeneInformation) and GO (children of immune system process)")
-logging.info("\t       {} PMIDs left, saved at {}".format(len(em.pmid_list), config.mapping_pmid2entities))
-logging.info("\t[Gene] {} Genes mentioned in the abstracts, saved at {}".format(len(GeneMapping), config.mapping_gene2pmid))
-logging.info("\t[GO]   {} GOs mentioned in the abstracts, saved at {}".format(len(GoMapping), config.mapping_go2pmid))
-t2 = time.time()
-logging.info("\t[time] used time: {} seconds".format(round(t2-t1, 4)))
-
-
-# step2: Calculate Enrichment Score:  Pvalue and Adjusted-Pvalue
-cp = CalculatePvalue(config.mapping_gene2pmid, config.mapping_go2pmid)
-cp.save_GOF(GOF_save_path=config.GOF)
-logging.info("\n--------------------\n[step2] Calculate Enrichment Score")
-logging.info("\t[PMID] number of Pubmed abstracts mentioned both Gene and GO: {}".format(len(cp.pmid)))
-logging.info("\t[GOF]  generating GOF...")
-logging.info("\t\t[GOF-Gene] {} Genes in GOF".format(len(cp.GOF_Genes)))
-logging.info("\t\t[GOF-GO]   {} GOs in GOF".format(len(cp.GOF_GOs)))
-logging.info("\t\t[GOF file] GOF saved at {}".format(config.GOF))
-t3 = time.time()
-logging.info("\t[time] used time: {} seconds".format(round(t3-t2, 4)))
-
-
-# step3: Calculate Gene-Gene Similarity Score
-gs = GeneSimilarity(config.GOF)
-nodes, edges = gs.save_GGSS(save_path=config.GGSS, percentage=1)
-logging.info("\t[GGSS]    saved at {}, the node number:[{}], the edge number: [{}]".format(config.GGSS, nodes, edges))
-nodes001, edges001 = gs.save_GGSS(save_path=config.GGSS001, percentage=0.01)
-logging.info("\n--------------------\n[step3] Calculate Gene-Gene Similarity Score")
-logging.info("\t[1% GGSS] The top 1% GGSS saved at {}, the node number:{}, the edge number:{}".format(config.GGSS001, nodes001, edges001))
-t4 = time.time()
-logging.info("\t[time] used time: {} seconds".format(round(t4-t3, 4)))
-logging.info("\t[time] totally use time: {} seconds".format(round(t4-t1, 4)))
-
-
-# step4: calculate GOFxGEX
-# gg = GOFxGEX(config.GOF, config.GEX)
-# gg.save_GOFxGEX(save_path = config.matrix_GOFxGEX)
-# logging.info("\n--------------------\n[step4] Calculate GOF x GEX Matirx")
-# logging.info("\t[GEX] tumor samples:{}, normal samples:{}".format(len(gg.Samples_tumor), len(gg.Samples_normal)))
-# logging.info("\t[GOFxGEX matrix: GOxSample] {}x{}, saved at {}".format(len(gg.GOFxGEX_matrix.index), len(gg.GOFxGEX_matrix.columns), config.matrix_GOFxGEX))
-# t5 = time.time()
-# logging.info("\t[time] used time: {} seconds".format(round(t5-t4, 4)))
-# logging.info("\t[time] totally use time: {} seconds".format(round(t5-t1, 4)))
+def get_Parser():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--case', '-case', help='a cancer name')
+    parser.add_argument('--pmid', '-pmid', help='a file, each line is a pmid')
+    parser.add_argument('--entities', '-entities',
+                        help='the folder of <case>_pubmed2gene.csv and <case>_pubmed2go.csv, ../case/<case>/BiologicalEntity by default')
+    parser.add_argument('--alternative', '-alternative', default='two-sided', choices=['two-sided', 'greater'],
+                        help="'two-sided' fisher exact test, or 'greater' for the one-sided hypergeometric test")
+    parser.add_argument('--workers', '-workers', type=int, default=1, help='number of worker processes of step2 and step3')
+    parser.add_argument('--skip', '-skip', nargs='*', default=[], choices=['MSigDB', 'NCBI'],
+                        help='knowledge bases not loaded, their evidence in the GOF is 0')
+    parser.add_argument('--stream-mapping', '-stream-mapping', action='store_true',
+                        help='step1 reads the entity files row by row and joins them by PMID (sort-merge when both are sorted by PMID)')
+    parser.add_argument('--streaming', '-streaming', action='store_true',
+                        help='step3 never holds all the gene pairs, the GGSS file is saved in gene order instead of score order')
+    parser.add_argument('--store', '-store', action='store_true',
+                        help='step3 computes the gene pairs tile by tile into an on-disk edge store, resuming an interrupted run; implies --streaming')
+    parser.add_argument('--tile-size', '-tile-size', type=int, default=2048, help='genes on a side of a tile of --store')
+    parser.add_argument('--prune', '-prune', action='store_true', help='drop the non-significant Gene-GO pairs as soon as they are known in step2')
+    parser.add_argument('--approximate', '-approximate', action='store_true',
+                        help='step3 only scores the likely similar gene pairs found by MinHash/LSH of the GO sets, for huge gene sets')
+    parser.add_argument('--num-perm', '-num-perm', type=int, default=128, help='MinHash signature length of --approximate')
+    parser.add_argument('--bands', '-bands', type=int, default=64,
+                        help='LSH bands of --approximate, more bands find more pairs (higher recall, slower)')
+    parser.add_argument('--recall', '-recall', action='store_true',
+                        help='with --approximate, compute the exact GGSS again and log the recall of the top GGSS')
+    parser.add_argument('--top', '-top', type=float, default=0.01, help='the fraction of the highest GGSS saved as GGSS001 and clustered by MCODE')
+    parser.add_argument('--no-artifacts', '-no-artifacts', action='store_true',
+                        help='do not write the mapping files of step1, the top-k indexes and the GO candidates, only the GOF, GGSS and MCODE results')
+    parser.add_argument('--gex', '-gex', help='a gene expression file (genes x samples), step4 saves the GOF x GEX matrix of it')
+    parser.add_argument('--force', '-force', action='store_true', help='run all the steps, also those whose outputs are up to date')
+    parser.add_argument('--profile', '-profile', nargs='*', default=[], choices=['mapping', 'enrichment', 'similarity', 'gofxgex'],
+                        help='sample the stacks of these steps, saved as collapsed stacks at <case>@profile.<step>.txt')
+    return parser
 
+
+def get_PeakMemory():
+    # peak resident memory of the process so far, in MB (ru_maxrss is in KB on Linux), the telemetry spans reset the
+    # peak of /proc and keep the peak before.
+    return round(max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, telemetry.get_PeakRSS()), 1)
+
+
+def main(argv=None):
+    """run the steps of a case, argv are the command line arguments (sys.argv by default), returns a summary of the run."""
+    parser = get_Parser()
+    args = parser.parse_args(argv)
+    if args.approximate and args.store:
+        parser.error('--approximate and --store can not be used together')
+    case = args.case
+    pmid = args.pmid
+
+    config = Config(case, pmid, args.entities)
+    logging.basicConfig(level=logging.DEBUG, filename=config.logFile, filemode="w", format="%(message)s", force=True)
+    knowledge.skip(*args.skip)
+    # the wall/CPU time, peak memory and counts of each step and sub-step, as JSON lines.
+    telemetry.open(config.telemetry, case, profile=args.profile, profile_path=config.profile, options=vars(args))
+    # the steps hand over their results in memory, the files are written on a background thread.
+    writer = ArtifactWriter(artifacts=not args.no_artifacts)
+    # the steps whose inputs, parameters and knowledge did not change since their outputs were written are skipped.
+    pipeline = Pipeline(config.pipeline_state, writer, knowledge, force=args.force)
+    top = "{:g}%".format(args.top * 100)
+
+
+    # step1: Entity Mapping
+    def run_Mapping(pipeline):
+        em = EntityMapping(config.pmid, config.pmid2gene, config.pmid2go, streaming=args.stream_mapping)
+        writer.submit(config.mapping_pmid2entities, em.save_PMIDEntitesMapping, save_path=config.mapping_pmid2entities, optional=True)
+        writer.submit(config.mapping_gene2pmid, em.save_GeneMapping, save_path=config.mapping_gene2pmid, optional=True)
+        writer.submit(config.mapping_go2pmid, em.save_GoMapping, save_path=config.mapping_go2pmid, optional=True)
+        GeneMapping = em.GeneMapping
+        GoMapping = em.GoMapping
+        logging.info("\n--------------------\n[step1] Entity Mapping")
+        logging.info("\t[PMID] number of Input PMID: {}".format(len(em.input_pmid_codes)))
+        logging.info("\t       after screening, leave the PMID, which abstract mentions both Gene (Our HumanGeneInformation) and GO (children of immune system process)")
+        logging.info("\t       {} PMIDs left, saved at {}".format(len(em.pmid_list), config.mapping_pmid2entities))
+        logging.info("\t[Gene] {} Genes mentioned in the abstracts, saved at {}".format(len(GeneMapping), config.mapping_gene2pmid))
+        logging.info("\t[GO]   {} GOs mentioned in the abstracts, saved at {}".format(len(GoMapping), config.mapping_go2pmid))
+        if args.stream_mapping:
+            logging.info("\t[streaming] {} join of {} Gene rows and {} GO rows, {} PMIDs kept".format(
+                em.JoinCounter["join"], em.JoinCounter["gene_rows"], em.JoinCounter["go_rows"], em.JoinCounter["pmids"]))
+        return (GeneMapping, GoMapping), {"input_pmids": len(em.input_pmid_codes), "pmids": len(em.pmid_list),
+                                          "genes": len(GeneMapping), "gos": len(GoMapping)}
+
+
+    # step2: Calculate Enrichment Score:  Pvalue and Adjusted-Pvalue
+    def run_Enrichment(pipeline):
+        # the mappings are handed over in memory as int32 CSR arrays, or read from the mapping files if step1 was skipped.
+        GeneMapping, GoMapping = pipeline.get_Result("mapping")
+        if args.workers > 1:
+            writer.flush()  # no write is running on the thread while the workers fork
+        # the shards are checkpointed under the key of the step, a crashed run computes only the missing shards.
+        checkpoint = os.path.join(config.GOF_checkpoint, pipeline.get_Key(pipeline.stages["enrichment"]))
+        cp = CalculatePvalue(GeneMapping, GoMapping, alternative=args.alternative, workers=args.workers, prune=args.prune,
+                             checkpoint=checkpoint)
+        writer.submit(config.GOF, cp.save_GOF, GOF_save_path=config.GOF)
+        writer.submit(config.GOF_index, cp.get_Index().save, config.GOF_index, source=config.GOF, optional=True)
+        writer.submit(config.GOF_checkpoint, shutil.rmtree, config.GOF_checkpoint, ignore_errors=True)  # once the GOF is written
+        logging.info("\n--------------------\n[step2] Calculate Enrichment Score")
+        logging.info("\t[PMID] number of Pubmed abstracts mentioned both Gene and GO: {}".format(len(cp.pmid)))
+        logging.info("\t[GOF]  generating GOF...")
+        logging.info("\t\t[GOF-Gene] {} Genes in GOF".format(len(cp.GOF_Genes)))
+        logging.info("\t\t[GOF-GO]   {} GOs in GOF".format(len(cp.GOF_GOs)))
+        logging.info("\t\t[GOF file] GOF saved at {}".format(config.GOF))
+        logging.info("\t\t[GOF index] top-k index by Gene and GO saved at {}".format(config.GOF_index))
+        if cp.CheckpointCounter["resumed"]:
+            logging.info("\t[checkpoint] {} of {} shards resumed from {}".format(
+                cp.CheckpointCounter["resumed"], cp.CheckpointCounter["shards"], checkpoint))
+        if args.prune:
+            logging.info("\t[prune] {} Gene-GO pairs tested, dropped: {} (Pvalue=1), {} (Adjusted_Pvalue>{}), {} (a<{} without evidence), {} kept".format(
+                cp.PruneCounter["tested"], cp.PruneCounter["pvalue"], cp.PruneCounter["adjusted_pvalue"], cp.adjusted_pvalue_threshold,
+                cp.PruneCounter["evidence"], cp.a_threshold, cp.PruneCounter["kept"]))
+        return cp.GeneGoEnrichment, {"pmids": len(cp.pmid), "genes": len(cp.GOF_Genes), "gos": len(cp.GOF_GOs),
+                                     "rows": len(cp.GeneGoEnrichment)}
+
+
+    # step3: Calculate Gene-Gene Similarity Score
+    def run_Similarity(pipeline):
+        GOF = pipeline.get_Result("enrichment")
+        if args.workers > 1:
+            writer.flush()
+        gs = GeneSimilarity(GOF, streaming=args.streaming, store=config.GGSS_store if args.store else None, tile_size=args.tile_size,
+                            workers=args.workers, approximate=args.approximate, num_perm=args.num_perm, bands=args.bands)
+        if gs.streaming:
+            nodes, edges = gs.save_GGSS(save_path=config.GGSS, percentage=1)  # computed again block by block
+        else:
+            GGSS_data = gs.get_GGSS(percentage=1)
+            writer.submit(config.GGSS, GGSS_data.to_csv, config.GGSS, index=False)
+            nodes, edges = gs.get_GGSSSize(GGSS_data)
+        logging.info("\t[GGSS]    saved at {}, the node number:[{}], the edge number: [{}]".format(config.GGSS, nodes, edges))
+        if args.approximate:
+            counter = gs.lsh.Counter
+            logging.info("\t[approximate] MinHash/LSH of {} bands x {} rows: {} candidate pairs ({} skipped buckets), {} edges scored, {} edges estimated for the exact GGSS".format(
+                counter["bands"], counter["rows_per_band"], counter["candidate_pairs"], counter["skipped_buckets"], counter["edges"], counter["estimated_edges"]))
+            if args.recall:
+                recall = gs.get_Recall(percentage=args.top)
+                logging.info("\t[recall]  top {} GGSS: {} exact pairs ({} edges), {} approximate pairs, recall {:.4f}, candidate recall {:.4f}".format(
+                    top, recall["exact_top"], recall["exact_edges"], recall["approximate_top"], recall["recall"], recall["candidate_recall"]))
+        if args.store:
+            logging.info("\t[store]   {} edges in {} tiles saved at {}".format(len(gs.store), len(gs.store.manifest["tiles"]), config.GGSS_store))
+        if gs.streaming:
+            stats = gs.SimilarityStats
+            logging.info("\t[streaming] GGSS saved in gene order, scores: min {}, max {}, mean {}, std {}".format(stats.min, stats.max, stats.mean, stats.std))
+        else:
+            writer.submit(config.GGSS_index, gs.get_Index().save, config.GGSS_index, source=config.GGSS, optional=True)
+            logging.info("\t[GGSS index] top-k index by Gene saved at {}".format(config.GGSS_index))
+        writer.submit(config.GGSS_candidates, gs.save_GOCandidates, save_path=config.GGSS_candidates, optional=True)
+        logging.info("\t[GGSS candidates] {} genes, {} gene pairs, {} candidate pairs from the GO posting lists ({} blocks), {} edges".format(
+            gs.CandidateCounter["genes"], gs.CandidateCounter["all_pairs"], gs.CandidateCounter["candidate_pairs"],
+            gs.CandidateCounter["blocks"], gs.CandidateCounter["edges"]))
+        logging.info("\t                  candidate pairs of each GO saved at {}, hub GOs: {}".format(config.GGSS_candidates, ", ".join(
+            "{}({} genes)".format(go, genes) for go, genes in zip(gs.GOCandidates["GO_ID"][:5], gs.GOCandidates["Genes"][:5]))))
+        GGSS001_data = gs.get_GGSS(percentage=args.top)
+        writer.submit(config.GGSS001, GGSS001_data.to_csv, config.GGSS001, index=False)
+        nodes001, edges001 = gs.get_GGSSSize(GGSS001_data)
+        logging.info("\n--------------------\n[step3] Calculate Gene-Gene Similarity Score")
+        logging.info("\t[{} GGSS] The top {} GGSS saved at {}, the node number:{}, the edge number:{}".format(top, top, config.GGSS001, nodes001, edges001))
+        t_mcode = time.time()
+        with telemetry.span("mcode", nodes=nodes001, edges=edges001) as items:
+            mc = MCODE(GGSS001_data)
+            items["clusters"] = len(mc.Clusters)
+        writer.submit(config.GGSS_clusters, mc.save_Clusters, save_path=config.GGSS_clusters)
+        clusters = len(mc.Clusters)
+        logging.info("\t[MCODE]   {} clusters of the top {} GGSS network saved at {} ({} seconds), the top clusters: {}".format(
+            clusters, top, config.GGSS_clusters, round(time.time()-t_mcode, 4), ", ".join(
+                "{}(score {:.2f}, {} genes)".format(seed, score, nodes) for seed, score, nodes in zip(mc.Clusters["Seed_Name"][:5], mc.Clusters["Score"][:5], mc.Clusters["Nodes"][:5]))))
+        return None, {"nodes": nodes, "edges": edges, "top_nodes": nodes001, "top_edges": edges001, "clusters": clusters}
+
+
+    # step4: calculate GOFxGEX
+    def run_GOFxGEX(pipeline):
+        writer.flush()  # GOFxGEX reads the GOF file
+        gg = GOFxGEX(config.GOF, args.gex)
+        gg.save_GOFxGEX(save_path = config.matrix_GOFxGEX)
+        logging.info("\n--------------------\n[step4] Calculate GOF x GEX Matirx")
+        logging.info("\t[GEX] tumor samples:{}, normal samples:{}".format(len(gg.Samples_tumor), len(gg.Samples_normal)))
+        logging.info("\t[GOFxGEX matrix: GOxSample] {}x{}, saved at {}".format(len(gg.GOFxGEX_matrix.index), len(gg.GOFxGEX_matrix.columns), config.matrix_GOFxGEX))
+        return None, {"tumor_samples": len(gg.Samples_tumor), "normal_samples": len(gg.Samples_normal),
+                      "gos": len(gg.GOFxGEX_matrix.index), "samples": len(gg.GOFxGEX_matrix.columns)}
+
+
+    pipeline.add(Stage("mapping", run_Mapping, load=lambda: (config.mapping_gene2pmid, config.mapping_go2pmid),
+                       inputs=[config.pmid, config.pmid2gene, config.pmid2go],
+                       outputs=None if args.no_artifacts else [config.mapping_pmid2entities, config.mapping_gene2pmid, config.mapping_go2pmid],
+                       knowledge=["Gene", "GO"]))
+    # the params are all the options changing an output file: --workers only changes the last digits of the scores of
+    # --streaming (the statistics are merged shard by shard), --tile-size the gene order of the GGSS of --store.
+    # The optional artifacts are outputs too, so that a run after --no-artifacts writes them.
+    artifacts = lambda *paths: [] if args.no_artifacts else list(paths)
+    pipeline.add(Stage("enrichment", run_Enrichment, load=lambda: config.GOF, deps=["mapping"],
+                       outputs=[config.GOF] + artifacts(config.GOF_index),
+                       params={"alternative": args.alternative, "prune": args.prune}, knowledge=["Gene", "GO", "MSigDB", "NCBI"]))
+    streaming = args.streaming or args.store
+    pipeline.add(Stage("similarity", run_Similarity, deps=["enrichment"],
+                       outputs=[config.GGSS, config.GGSS001, config.GGSS_clusters] +
+                               artifacts(*([] if streaming else [config.GGSS_index]) + [config.GGSS_candidates]),
+                       params={"streaming": streaming, "store": args.store, "approximate": args.approximate, "top": args.top,
+                               "tile_size": args.tile_size if args.store else None,
+                               "workers": args.workers if args.streaming and not args.store else None,
+                               "num_perm": args.num_perm if args.approximate else None, "bands": args.bands if args.approximate else None},
+                       knowledge=["Gene"]))
+    if args.gex:
+        pipeline.add(Stage("gofxgex", run_GOFxGEX, deps=["enrichment"], inputs=[args.gex], outputs=[config.matrix_GOFxGEX]))
+    steps = {"mapping": "[step1] Entity Mapping", "enrichment": "[step2] Calculate Enrichment Score",
+             "similarity": "[step3] Calculate Gene-Gene Similarity Score", "gofxgex": "[step4] Calculate GOF x GEX Matirx"}
+
+
+    logging.info("{} GOF, logging:\n{}".format(case, datetime.datetime.now()))
+    logging.info("[startup] import modules: {} seconds, knowledge bases are loaded on first use".format(round(t_import-t0, 4)))
+    t1 = time.time()
+    try:
+        for i, (name, status, seconds) in enumerate(pipeline.run()):
+            if status == "skipped":  # the steps log their title when they run
+                logging.info("\n--------------------\n{}".format(steps[name]))
+                logging.info("\t[skipped] outputs up to date (key {}): {}".format(pipeline.get_Key(pipeline.stages[name])[:12], ", ".join(
+                    "{} {}".format(k, v) for k, v in pipeline.get_Info(name).items())))
+            logging.info("\t[time] used time: {} seconds".format(seconds))
+            logging.info("\t[memory] peak RSS: {} MB after step{}".format(get_PeakMemory(), i + 1))
+        logging.info("\t[time] totally use time: {} seconds".format(round(time.time()-t1, 4)))
+    finally:
+        # the pending files are written and the finished steps recorded in the state, also when a step failed.
+        t_close = time.time()
+        try:
+            writer.close()
+        finally:
+            telemetry.close()
+    logging.info("\t[files] {} files written in the background ({} seconds, {} seconds waited at the end), {} artifacts skipped".format(
+        len(writer.Written), round(sum(seconds for _, seconds in writer.Written), 4), round(time.time()-t_close, 4), writer.skipped))
+    logging.info("\t[pipeline] {}".format(", ".join("{} {}".format(name, status) for name, status in pipeline.Status.items())))
+    return {"case": case, "status": dict(pipeline.Status), "seconds": round(time.time()-t1, 4), "peak_memory": get_PeakMemory()}
+
+
+if __name__ == "__main__":
+    main()
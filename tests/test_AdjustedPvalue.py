@@ -0,0 +1,52 @@
+# *_* coding: utf-8 *_*
+# @Time     : 10/18/2026
+# @Author   : zong hui
+# @object   : the vectorized adjusted pvalue is the nested-loop Tsoi formula it replaced.
+
+
+# load packages
+import numpy as np
+import pytest
+
+# load our modules
+from CalculatePvalue import get_AdjustedPvalue
+
+
+def get_AdjustedPvalue_loop(group, pvalue):
+    # the per-gene nested loop of CalculatePvalue before the vectorization.
+    adjusted = np.empty(len(pvalue), dtype=np.float64)
+    for g in set(group.tolist()):
+        rows = np.flatnonzero(group == g)
+        for e in rows:
+            numerator, denominator = 0, 0
+            for k in rows:
+                if pvalue[k] < 1.0:
+                    numerator += 1
+                if pvalue[k] < 1.0 and pvalue[k] >= pvalue[e]:
+                    denominator += 1
+            adjusted[e] = min(1.0, pvalue[e] * float(numerator) / float(denominator))
+    return adjusted
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_random_groups(seed):
+    rng = np.random.default_rng(seed)
+    n = int(rng.integers(1, 300))
+    group = rng.integers(0, int(rng.integers(1, 40)), n)  # many single-row genes with few rows
+    # few distinct values, so that many pvalues are tied inside a gene.
+    pvalue = rng.choice(rng.random(int(rng.integers(1, 20))) * 0.999, n)
+    assert np.array_equal(get_AdjustedPvalue(group, pvalue), get_AdjustedPvalue_loop(group, pvalue))
+
+
+def test_ties_and_single_rows():
+    group = np.array([3, 3, 3, 1, 3, 7, 7])
+    pvalue = np.array([0.01, 0.5, 0.01, 0.2, 0.5, 0.3, 0.3])
+    expected = get_AdjustedPvalue_loop(group, pvalue)
+    assert np.array_equal(get_AdjustedPvalue(group, pvalue), expected)
+    assert expected[3] == 0.2  # a single-row gene keeps its pvalue
+    assert expected[0] == expected[2] == 0.01 * 4 / 4
+    assert expected[5] == expected[6] == 0.3  # tied pvalues count each other in r
+
+
+def test_empty():
+    assert len(get_AdjustedPvalue(np.zeros(0, dtype=np.int64), np.zeros(0))) == 0
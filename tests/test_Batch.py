@@ -0,0 +1,76 @@
+# *_* coding: utf-8 *_*
+# @Time     : 10/18/2026
+# @Author   : zong hui
+# @object   : the cases of a batch are found in their folders, run the largest first, and their failures are reported.
+
+
+# load packages
+import os
+import pytest
+
+# load our modules
+import main
+import Batch
+
+
+def write_Case(folder, case, size):
+    # the pmid and entity files of a case of folder, size bytes of pmids.
+    entities = os.path.join(folder, case, "BiologicalEntity")
+    os.makedirs(entities)
+    for path, text in (("{}/{}/{}.sentid.txt".format(folder, case, case), "1" * size),
+                       ("{}/{}_pubmed2gene.csv".format(entities, case), "1,7157\n"),
+                       ("{}/{}_pubmed2go.csv".format(entities, case), "1,GO:1\n")):
+        with open(path, "w") as f:
+            f.write(text)
+
+
+@pytest.fixture
+def folder(tmp_path):
+    for case, size in (("ACC", 10), ("BLCA", 300), ("CESC", 50), ("DLBC", 200)):
+        write_Case(str(tmp_path), case, size)
+    os.makedirs(str(tmp_path / "empty"))  # no sentid file, not a case
+    (tmp_path / "notes.txt").write_text("not a case")
+    return str(tmp_path)
+
+
+def test_cases_of_dir(folder):
+    cases = Batch.get_Cases(["TP53"], folder)
+    assert cases[0] == ("TP53", "../case/TP53/TP53.sentid.txt", None)
+    assert cases[1:] == [(case, os.path.join(folder, case, "{}.sentid.txt".format(case)), os.path.join(folder, case, "BiologicalEntity"))
+                         for case in ("ACC", "BLCA", "CESC", "DLBC")]
+    assert Batch.get_CaseSize(*cases[2]) == 300 + len("1,7157\n") + len("1,GO:1\n")
+    with pytest.raises(FileNotFoundError):
+        Batch.get_CaseSize(*cases[0])
+
+
+def fake_Main(argv):
+    # main.main of the forked case: CESC raises, DLBC exits without a result.
+    case = argv[argv.index("--case") + 1]
+    if case == "CESC":
+        raise RuntimeError("no gene found")
+    if case == "DLBC":
+        os._exit(3)
+    return {"case": case, "status": {"mapping": "done", "enrichment": "skipped"}, "seconds": 0.1, "peak_memory": 12.5,
+            "argv": argv}
+
+
+def test_largest_first_and_failures(folder, monkeypatch, capsys):
+    monkeypatch.setattr(main, "main", fake_Main)
+    summaries = Batch.run_Batch(Batch.get_Cases(folder=folder), ["--prune"], jobs=1)
+    # one case at a time, so they finish in the order they start
+    assert [s["case"] for s in summaries] == ["BLCA", "DLBC", "CESC", "ACC"]
+    assert [s["size"] for s in summaries] == sorted((s["size"] for s in summaries), reverse=True)
+    BLCA, DLBC, CESC, ACC = summaries
+    assert BLCA["argv"] == ["--case", "BLCA", "--pmid", os.path.join(folder, "BLCA", "BLCA.sentid.txt"),
+                            "--entities", os.path.join(folder, "BLCA", "BiologicalEntity"), "--prune"]
+    assert "error" not in BLCA and "error" not in ACC
+    assert DLBC["error"] == "exited without a result"
+    assert CESC["error"] == "RuntimeError: no gene found"
+    assert "[2/4] DLBC failed" in capsys.readouterr().out
+
+    lines = Batch.get_SummaryTable(summaries).splitlines()
+    assert lines[0].split() == ["case", "size(MB)", "steps", "wall(s)", "peak", "RSS(MB)"]
+    assert [line.split()[0] for line in lines[1:]] == ["BLCA", "DLBC", "CESC", "ACC"]
+    assert "mapping done, enrichment skipped" in lines[1] and lines[1].endswith("12.5")
+    assert "exited without a result" in lines[2] and lines[2].endswith("-")
+    assert "RuntimeError: no gene found" in lines[3]
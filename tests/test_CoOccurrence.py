@@ -0,0 +1,77 @@
+# *_* coding: utf-8 *_*
+# @Time     : 10/18/2026
+# @Author   : zong hui
+# @object   : the sparse contingency tables are the set arithmetic of the Gene and GO PMIDs they replaced.
+
+
+# load packages
+import numpy as np
+import pytest
+
+# load our modules
+from CalculatePvalue import CalculatePvalue
+from CoOccurrence import CoOccurrence
+
+
+def get_SetTables(GeneMapping, GoMapping):
+    # the set arithmetic of CalculatePvalue.calculate_pvalue_adjustedpvalue before CoOccurrence, {(gene, go): (a, b, c, d)}.
+    pmid = list(set([p for k, v in GeneMapping.items() for p in v]))
+    D = dict()
+    for gene in GeneMapping:
+        gene_pmid = set(GeneMapping.get(gene))
+        for e in GoMapping:
+            e_pmid = set(GoMapping.get(e))
+            a = len(gene_pmid & e_pmid)
+            b = len(gene_pmid - e_pmid)
+            c = len(e_pmid - gene_pmid)
+            d = len(pmid) - a - b - c
+            if a > 0:
+                D[(gene, e)] = (a, b, c, d)
+    return D
+
+
+def write_Mapping(path, mapping):
+    with open(path, "w") as f:
+        f.write("ID\tCount\tPMIDs\n")
+        for key, pmids in mapping.items():
+            f.write("{}\t{}\t{}\n".format(key, len(pmids), ";".join(pmids)))
+
+
+def get_Mappings(seed):
+    """
+    random Gene and GO mappings: PMIDs repeated in a row, GO PMIDs no gene mentions, a gene and a GO with a = 0.
+    """
+    rng = np.random.default_rng(seed)
+    pmids = [str(10000 + i) for i in range(40)]
+    GeneMapping = {str(i): rng.choice(pmids[:30], size=rng.integers(1, 12)).tolist() for i in range(1, 25)}
+    GoMapping = {"GO:{:07d}".format(i): rng.choice(pmids[:38], size=rng.integers(1, 15)).tolist() for i in range(1, 20)}
+    GeneMapping["7157"] = ["10001", "10001", "10002", "10001"]
+    GoMapping["GO:0000001"] = ["10001", "10001", "10035"]
+    GeneMapping["999"] = ["10039"]  # no GO has this PMID
+    GoMapping["GO:9999999"] = ["10036", "10037", "10037"]  # no gene has these PMIDs
+    return GeneMapping, GoMapping
+
+
+def get_Tables(co, shards):
+    D = dict()
+    for start, end in shards:
+        indptr, go_index, a, b, c, d = co.get_ContingencyTables(start, end)
+        assert np.all(a > 0)
+        for i in range(end - start):
+            for k in range(indptr[i], indptr[i + 1]):
+                D[(co.genes[start + i], co.gos[go_index[k]])] = (a[k], b[k], c[k], d[k])
+    return D
+
+
+@pytest.mark.parametrize("seed", range(4))
+def test_tables_are_set_arithmetic(tmp_path, seed):
+    GeneMapping, GoMapping = get_Mappings(seed)
+    write_Mapping(str(tmp_path / "gene.tsv"), GeneMapping)
+    write_Mapping(str(tmp_path / "go.tsv"), GoMapping)
+    co = CoOccurrence(*CalculatePvalue.get_Mappings(str(tmp_path / "gene.tsv"), str(tmp_path / "go.tsv")))
+    expected = get_SetTables(GeneMapping, GoMapping)
+    assert co.N == len(set(p for v in GeneMapping.values() for p in v))
+    for shards in ([(0, len(co.genes))], co.get_Shards(5)):
+        assert get_Tables(co, shards) == expected
+    assert expected[("7157", "GO:0000001")] == (1, 1, 1, co.N - 3)  # 10035 is in c, though no gene has it
+    assert not any(gene == "999" or go == "GO:9999999" for gene, go in expected)
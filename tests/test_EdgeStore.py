@@ -0,0 +1,81 @@
+# *_* coding: utf-8 *_*
+# @Time     : 10/18/2026
+# @Author   : zong hui
+# @object   : the edge store resumes after an interrupted tile, is rebuilt for another GOF, and its top edges are a scan.
+
+
+# load packages
+import os
+import numpy as np
+import pytest
+
+# load our modules
+from EdgeStore import EdgeStore
+
+
+GENES = ["g{}".format(i) for i in range(12)]
+
+
+def get_Tile(rng, size):
+    # random edges of a tile between two distinct genes, scores of few distinct values so there are ties.
+    gene1 = rng.integers(0, len(GENES), size=size)
+    gene2 = (gene1 + rng.integers(1, len(GENES), size=size)) % len(GENES)
+    score = rng.integers(0, 5, size=size) / 4.0
+    return gene1, gene2, score
+
+
+def get_Columns(store):
+    arrays = store.get_Arrays()
+    return [np.asarray(arrays[column]).tolist() for column in ("gene1", "gene2", "score")]
+
+
+def test_resume_truncates_partial_tile(tmp_path):
+    folder = str(tmp_path / "test@GGSS.edges")
+    rng = np.random.default_rng(0)
+    tile1, tile2 = ((0, 6), (0, 6)), ((0, 6), (6, 12))
+    edges1, edges2 = get_Tile(rng, 20), get_Tile(rng, 15)
+    store = EdgeStore(folder, GENES, tile_size=6, fingerprint="GOF")
+    store.append(tile1, *edges1)
+    # an interrupted tile: its rows are written, the manifest is not.
+    for column, values in zip(("gene1", "gene2", "score"), edges2):
+        with open(store.get_ColumnFile(column), "ab") as f:
+            f.write(np.asarray(values[:9], dtype=store.dtypes[column]).tobytes())
+
+    store = EdgeStore(folder, GENES, tile_size=6, fingerprint="GOF")
+    assert len(store) == 20 and store.is_Done(tile1) and not store.is_Done(tile2)
+    for column in ("gene1", "gene2", "score"):
+        assert os.path.getsize(store.get_ColumnFile(column)) == 20 * np.dtype(store.dtypes[column]).itemsize
+    store.append(tile2, *edges2)
+    expected = [np.concatenate((a, b)).tolist() for a, b in zip(edges1, edges2)]
+    assert get_Columns(store) == expected
+    assert get_Columns(EdgeStore(folder)) == expected  # read back from the manifest
+
+
+@pytest.mark.parametrize("changed", [{"fingerprint": "another GOF"}, {"tile_size": 4}, {"genes": GENES[:-1]}])
+def test_other_store_is_rebuilt(tmp_path, changed):
+    folder = str(tmp_path / "test@GGSS.edges")
+    store = EdgeStore(folder, GENES, tile_size=6, fingerprint="GOF")
+    store.append(((0, 6), (0, 6)), *get_Tile(np.random.default_rng(1), 10))
+    assert len(EdgeStore(folder, GENES, tile_size=6, fingerprint="GOF")) == 10
+    options = dict({"genes": GENES, "tile_size": 6, "fingerprint": "GOF"}, **changed)
+    store = EdgeStore(folder, options.pop("genes"), **options)
+    assert len(store) == 0 and store.manifest["tiles"] == []
+    assert get_Columns(store) == [[], [], []]
+    assert all(os.path.getsize(store.get_ColumnFile(column)) == 0 for column in ("gene1", "gene2", "score"))
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 1 << 22])
+def test_topk_is_scan(tmp_path, chunk_size):
+    rng = np.random.default_rng(2)
+    store = EdgeStore(str(tmp_path / "test@GGSS.edges"), GENES, tile_size=6, fingerprint="GOF")
+    for tile in (((0, 6), (0, 6)), ((0, 6), (6, 12)), ((6, 12), (6, 12))):
+        store.append(tile, *get_Tile(rng, 40))
+    offsets, rows = store.build_GeneIndex(chunk_size=chunk_size)
+    gene1, gene2, score = [np.asarray(column) for column in get_Columns(store)]
+    for gene in range(len(GENES)):
+        assert rows[offsets[gene]:offsets[gene + 1]].tolist() == np.flatnonzero((gene1 == gene) | (gene2 == gene)).tolist()
+    for genes in ([0], [3, 7], [11], list(range(len(GENES))), []):
+        for max_number in (1, 5, 200):
+            hit = np.flatnonzero(np.isin(gene1, genes) | np.isin(gene2, genes))
+            expected = sorted(hit.tolist(), key=lambda row: (-score[row], row))[:max_number]
+            assert store.get_TopK(genes, max_number).tolist() == expected
@@ -0,0 +1,49 @@
+# *_* coding: utf-8 *_*
+# @Time     : 10/18/2026
+# @Author   : zong hui
+# @object   : the streaming joins of EntityMapping give the same PMIDs as the hash join.
+
+
+# load packages
+import pytest
+
+# load our modules
+from Interning import intern_Strings
+from EntityMapping import EntityMapping
+
+
+def get_Mapping(tmp_path, gene_rows, go_rows, pmids):
+    # an EntityMapping with only what join_Entities reads, no knowledge is loaded.
+    paths = list()
+    for name, rows in (("pubmed2gene.csv", gene_rows), ("pubmed2go.csv", go_rows)):
+        path = tmp_path / name
+        path.write_text("".join("{},{}\n".format(pmid, terms) for pmid, terms in rows))
+        paths.append(str(path))
+    em = EntityMapping.__new__(EntityMapping)
+    em.pubmed2gene_path, em.pubmed2go_path = paths
+    em.JoinCounter = {"join": "read", "gene_rows": 0, "go_rows": 0, "pmids": 0}
+    em.input_pmid_codes, em.InputPMIDs = intern_Strings(pmids)
+    return em
+
+
+def split_Terms(terms):
+    return terms.split(";") if terms else []
+
+
+@pytest.mark.parametrize("gene_rows, go_rows", [
+    ([("2", "g2"), ("3", "g3"), ("1", "g1")], [("1", "GO:1")]),      # unsorted tail of the gene file
+    ([("1", "g1")], [("2", "GO:2"), ("3", "GO:3"), ("1", "GO:1")]),  # unsorted tail of the GO file
+])
+def test_unsorted_tail(tmp_path, gene_rows, go_rows):
+    em = get_Mapping(tmp_path, gene_rows, go_rows, ["1", "2", "3"])
+    entities = em.join_Entities(split_Terms, split_Terms)
+    assert em.JoinCounter["join"] == "hash"
+    assert {em.InputPMIDs.strings[code] for code in entities} == {"1"}
+
+
+def test_sorted_files(tmp_path):
+    em = get_Mapping(tmp_path, [("1", "g1"), ("2", "g2;g3"), ("4", "g4")], [("2", "GO:2"), ("3", "GO:3"), ("4", "")],
+                     ["1", "2", "3", "4"])
+    entities = em.join_Entities(split_Terms, split_Terms)
+    assert em.JoinCounter["join"] == "sort-merge"
+    assert {em.InputPMIDs.strings[code]: value for code, value in entities.items()} == {"2": (["g2", "g3"], ["GO:2"])}
@@ -0,0 +1,68 @@
+# *_* coding: utf-8 *_*
+# @Time     : 10/18/2026
+# @Author   : zong hui
+# @object   : the batched fisher exact test gives the pvalues of scipy.stats.fisher_exact.
+
+
+# load packages
+import numpy as np
+import pytest
+from scipy.stats import fisher_exact
+
+# load our modules
+from FisherExact import FisherExact
+
+
+def get_Tables(rng, N, size):
+    # random tables of total <= N, a third with a == 0.
+    tables = list()
+    for _ in range(size):
+        total = int(rng.integers(1, N + 1))
+        a, b, c, d = rng.multinomial(total, rng.dirichlet(np.ones(4)))
+        tables.append((0 if rng.random() < 0.33 else a, b, c, d))
+    return tables
+
+
+def get_BoundaryTables(N):
+    # tables at the ends of the support, tied with another table (symmetric distributions), or at one of two modes.
+    tables = list()
+    for K in range(1, N):
+        for n in (1, K, N - K, N // 2, N - 1):
+            lo, hi = max(0, K + n - N), min(K, n)
+            for a in {lo, hi, (lo + hi) // 2, ((n + 1) * (K + 1)) // (N + 2), ((n + 1) * (K + 1)) // (N + 2) - 1}:
+                if lo <= a <= hi:
+                    tables.append((a, K - a, n - a, N - K - n + a))
+    return tables
+
+
+def check_Tables(tables, N, alternative):
+    pvalues = FisherExact(N, alternative=alternative).pvalue(*np.array(tables).T)
+    expected = np.array([fisher_exact([[a, b], [c, d]], alternative=alternative)[1] for a, b, c, d in tables])
+    # the pairs kept by CalculatePvalue are the same.
+    assert np.array_equal(pvalues < 1.0, expected < 1.0)
+    assert np.allclose(pvalues, expected, rtol=1e-9, atol=1e-300)
+
+
+@pytest.mark.parametrize("alternative", ["two-sided", "greater"])
+@pytest.mark.parametrize("N", [5, 40, 300])
+def test_random_tables(N, alternative):
+    check_Tables(get_Tables(np.random.default_rng(N), N, 400), N, alternative)
+
+
+@pytest.mark.parametrize("alternative", ["two-sided", "greater"])
+@pytest.mark.parametrize("N", [6, 7, 60, 400])
+def test_boundary_tables(N, alternative):
+    check_Tables(get_BoundaryTables(N), N, alternative)
+
+
+def test_large_case():
+    # the rounding error of the log-factorials (about eps * log(N!)) is far above scipy's tie tolerance here.
+    N = 20000
+    check_Tables(get_Tables(np.random.default_rng(1), N, 200) + get_BoundaryTables(N)[::97], N, "two-sided")
+
+
+def test_invalid_tables():
+    with pytest.raises(ValueError):
+        FisherExact(10).pvalue([5], [5], [5], [5])
+    with pytest.raises(ValueError):
+        FisherExact(10).pvalue([-1], [1], [1], [1])
@@ -0,0 +1,98 @@
+# *_* coding: utf-8 *_*
+# @Time     : 10/18/2026
+# @Author   : zong hui
+# @object   : the sparse GGSS engine gives the scores of the modified inner product of the original double loop.
+
+
+# load packages
+import math
+import numpy as np
+import pandas as pd
+import pytest
+from collections import defaultdict
+
+# load our modules
+from GeneSimilarity import GeneSimilarity
+from SparseSimilarity import SparseSimilarity
+
+
+def get_LoopSimilarity(GOF_Genes, df):
+    # the double loop of GeneSimilarity.calculate_GeneGeneSimilarity before the sparse engine, {(gene1, gene2): score}.
+    GOF = defaultdict(dict)
+    for (gene, go, ap) in zip(df["Gene_ID"], df["GO_ID"], df["Adjusted_Pvalue"]):
+        GOF[str(gene)][go] = ap
+    D = dict()
+    for gene1_index, gene1 in enumerate(GOF_Genes):
+        gene1_go = GOF[gene1]
+        for gene2 in GOF_Genes[gene1_index+1:]:
+            gene2_go = GOF[gene2]
+            both_gene_go = set(gene1_go) & set(gene2_go)
+            only_gene1_go = set(gene1_go) - set(gene2_go)
+            only_gene2_go = set(gene2_go) - set(gene1_go)
+            if len(both_gene_go) != 0:
+                numerator = 0.0
+                for g in both_gene_go:
+                    if GOF[gene1][g] > 0 and GOF[gene2][g] > 0:
+                        numerator += math.log(GOF[gene1][g]) * math.log(GOF[gene2][g])
+                demominator = max(1.0, 0.5 * (len(only_gene1_go) + len(only_gene2_go)))
+                D[(gene1, gene2)] = numerator / demominator
+    return D
+
+
+def get_GOF(seed=0, genes=60, gos=25):
+    """
+    a random GOF: GO:0 is a hub GO of most genes, genes 1000-1002 share no GO with the others, some Adjusted_Pvalue
+    are 1 (log 0, removed by eliminate_zeros) or 0 (skipped by the double loop).
+    """
+    rng = np.random.default_rng(seed)
+    rows = list()
+    for gene in range(genes):
+        terms = set(rng.choice(np.arange(1, gos), size=rng.integers(1, 6), replace=False).tolist())
+        if rng.random() < 0.8:
+            terms.add(0)
+        for go in sorted(terms):
+            ap = rng.choice([1.0, 0.0, rng.random() * 0.05, rng.random()], p=[0.2, 0.05, 0.5, 0.25])
+            rows.append((gene + 1, "GO:{}".format(go), float(ap)))
+    for gene in range(1000, 1003):
+        rows.append((gene, "GO:{}".format(100 + gene), 0.01))
+    return pd.DataFrame(rows, columns=["Gene_ID", "GO_ID", "Adjusted_Pvalue"])
+
+
+def get_Engine(df):
+    gs = GeneSimilarity.__new__(GeneSimilarity)
+    gs.get_GOF(df)
+    return gs.GOF_Genes, SparseSimilarity(gs.GOF)
+
+
+def assert_SameScores(GOF_Genes, edges, expected):
+    gene1, gene2, score = [np.concatenate(columns) for columns in zip(*edges)]
+    assert np.all(np.diff(gene1 * len(GOF_Genes) + gene2) > 0)  # the order of the double loop
+    found = {(GOF_Genes[i], GOF_Genes[j]): s for i, j, s in zip(gene1, gene2, score)}
+    assert found.keys() == expected.keys()
+    assert np.allclose([found[k] for k in expected], list(expected.values()), rtol=1e-9, atol=1e-12)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_sparse_is_double_loop(seed):
+    df = get_GOF(seed)
+    GOF_Genes, engine = get_Engine(df)
+    expected = get_LoopSimilarity(GOF_Genes, df)
+    assert_SameScores(GOF_Genes, [engine.get_Similarity()], expected)
+    # no edge for the genes without a shared GO, and pairs sharing only GOs of Adjusted_Pvalue 1 score 0.
+    assert not any("1000" in pair or "1001" in pair or "1002" in pair for pair in expected)
+    assert 0.0 in expected.values()
+
+
+def test_hub_GO_across_blocks():
+    df = get_GOF(7)
+    GOF_Genes, engine = get_Engine(df)
+    expected = get_LoopSimilarity(GOF_Genes, df)
+    blocks = engine.get_Blocks(max_terms=200)
+    assert len(blocks) > 3
+    assert_SameScores(GOF_Genes, [engine.get_Similarity(start, end) for start, end in blocks], expected)
+    assert_SameScores(GOF_Genes, [engine.get_Similarity(start, end) for start, end in engine.get_Shards(4, max_terms=200)], expected)
+    # tiles of the edge store
+    tiles = [engine.get_Similarity(start, end, start2, end2) for (start, end), (start2, end2) in engine.get_Tiles(16)]
+    gene1, gene2, score = [np.concatenate(columns) for columns in zip(*tiles)]
+    order = np.argsort(gene1 * len(GOF_Genes) + gene2)
+    assert_SameScores(GOF_Genes, [(gene1[order], gene2[order], score[order])], expected)
@@ -0,0 +1,67 @@
+# *_* coding: utf-8 *_*
+# @Time     : 10/18/2026
+# @Author   : zong hui
+# @object   : the mappings read in place from a snapshot are the dicts of the knowledge files.
+
+
+# load packages
+import numpy as np
+
+# load our modules
+from KnowledgeSnapshot import Snapshot, compile_Snapshot
+from EvidenceIndex import EvidenceIndex
+
+
+KEYS = ["GO:3", "GO:1", "épi", "GO:2", "GO:1", ""]
+VALUES = ["c", "a", "e", "b", "a2", "empty"]
+LISTS = [["x"], ["x", "y"], [], ["y", "z", "x"], ["z"], ["x"]]
+
+
+def get_Snapshots(tmp_path):
+    columns = {"key": ("strings", KEYS), "value": ("strings", VALUES), "list": ("lists", LISTS),
+               "int": ("ints", list(range(len(KEYS))))}
+    return Snapshot.from_Columns(columns), compile_Snapshot("test", [], lambda: columns, str(tmp_path))
+
+
+def test_mapping_is_dict(tmp_path):
+    for snapshot in get_Snapshots(tmp_path):
+        for value, values in [("value", VALUES), ("list", LISTS), ("int", list(range(len(KEYS))))]:
+            mapping, expected = snapshot.get_Mapping("key", value), dict(zip(KEYS, values))
+            # a repeated key keeps its last value, at its first position.
+            assert list(mapping.items()) == list(expected.items())
+            assert len(mapping) == len(expected) and "GO:9" not in mapping and mapping.get("GO:9", 0) == 0
+        mapping = snapshot.get_Mapping("key", "list")
+        queries = np.array(["GO:2", "GO:9", "GO:1", None, "épi"], dtype=object)
+        assert mapping.get_Lengths(queries).tolist() == [3, 0, 1, 0, 0]
+        assert mapping.get_Members(queries, np.array(["z", "z", "z", "x", "x"], dtype=object)).tolist() == [True, False, True, False, False]
+        assert snapshot.get_Mapping("key", "value").get_Values(queries, default=queries).tolist() == ["b", "GO:9", "a2", None, "e"]
+
+
+def test_pair_mapping(tmp_path):
+    for snapshot in get_Snapshots(tmp_path):
+        mapping = snapshot.get_Mapping(("key", "value"), "list", rows=np.array([1, 3, 4]))
+        assert dict(mapping) == {("GO:1", "a"): ["x", "y"], ("GO:2", "b"): ["y", "z", "x"], ("GO:1", "a2"): ["z"]}
+        assert ("GO:3", "c") not in mapping  # not one of the rows
+        lengths = mapping.get_Lengths(np.array(["GO:2", "GO:1", "GO:1"], dtype=object), np.array(["b", "b", "a"], dtype=object))
+        assert lengths.tolist() == [3, 0, 2]
+
+
+def test_evidence_join():
+    Gene = Snapshot.from_Columns({"id": ("strings", ["1", "2"]), "name": ("strings", ["TP53", "cd4"])})
+    GO = Snapshot.from_Columns({"id": ("strings", ["GO:1", "GO:2"]), "name": ("strings", ["Cell Cycle", "apoptosis"]),
+                                "level": ("ints", [3, 5]), "namespace": ("strings", ["BP", "BP"]),
+                                "children": ("lists", [["GO:2"], []])})
+    MSigDB = Snapshot.from_Columns({"go_name": ("strings", ["cell cycle"]), "genes": ("lists", [["TP53"]])})
+    NCBI = Snapshot.from_Columns({"gene_id": ("strings", ["1", "1", "3"]), "go_id": ("strings", ["GO:1", "GO:1", "GO:2"]),
+                                  "pmid": ("lists", [["10", "11"], ["12"], ["13"]])})
+    index = EvidenceIndex(Gene.get_Mapping("id", "name"), GO.get_Mapping("id", "name"), GO.get_Mapping("id", "level"),
+                          GO.get_Mapping("id", "children"), GO.get_Mapping("id", "namespace"),
+                          MSigDB.get_Mapping("go_name", "genes"), NCBI.get_Mapping(("gene_id", "go_id"), "pmid"))
+    evidence = index.join(["1", "2", "1", "3"], ["GO:1", "GO:1", "GO:3", "GO:2"])
+    assert evidence["Gene_Name"].tolist() == ["TP53", "cd4", "TP53", "3"]
+    assert evidence["Letter"].tolist() == ["T", "C", "T", "3"]
+    assert evidence["GO_Name"].tolist() == ["Cell Cycle", "Cell Cycle", "GO:3", "apoptosis"]
+    assert evidence["GO_Level"].tolist() == [3, 3, "GO:3", 5]
+    assert evidence["GO_Children"].tolist() == [1, 1, 0, 0]
+    assert evidence["GSEA_MSigDB"].tolist() == [1, 0, 0, 0]
+    assert evidence["NCBI_Entrez"].tolist() == [1, 0, 0, 1]  # the last PMIDs of (1, GO:1)
@@ -0,0 +1,70 @@
+# *_* coding: utf-8 *_*
+# @Time     : 10/18/2026
+# @Author   : zong hui
+# @object   : node scores, complexes, haircut and complex order of MCODE on small graphs of known result.
+
+
+# load packages
+import pandas as pd
+import pytest
+
+# load our modules
+from MCODE import MCODE
+
+
+def get_GGSS(edges):
+    # the GGSS table of edges "A-B", the name of a gene is its lower case ID.
+    pairs = [edge.split("-") for edge in edges]
+    return pd.DataFrame([(a, a.lower(), b, b.lower()) for a, b in pairs],
+                        columns=["Gene1_ID", "Gene1_Name", "Gene2_ID", "Gene2_Name"])
+
+
+def get_Clique(nodes):
+    return ["{}-{}".format(a, b) for i, a in enumerate(nodes) for b in nodes[i + 1:]]
+
+
+def get_Scores(mcode):
+    return dict(zip(mcode.genes, mcode.NodeScore))
+
+
+def test_clique_and_pendant():
+    mcode = MCODE(get_GGSS(get_Clique("ABCD") + ["A-E"]))
+    # the 3-core of a K4 neighborhood, E has degree 1 < degree_cutoff
+    assert get_Scores(mcode) == {"A": 3.0, "B": 3.0, "C": 3.0, "D": 3.0, "E": 0.0}
+    assert mcode.Clusters[["Cluster", "Score", "Nodes", "Edges", "Seed_ID", "Seed_Name"]].values.tolist() == [[1, 4.0, 4, 6, "A", "a"]]
+    assert mcode.Clusters["Gene_IDs"].tolist() == ["A;B;C;D"]
+    assert mcode.Clusters["Gene_Names"].tolist() == ["a;b;c;d"]
+
+
+@pytest.mark.parametrize("haircut", [True, False])
+def test_haircut(haircut):
+    # every neighbor joins the complex of the seed with node_score_cutoff 1, haircut removes the pendant E.
+    mcode = MCODE(get_GGSS(get_Clique("ABCD") + ["A-E"]), node_score_cutoff=1.0, haircut=haircut)
+    if haircut:
+        assert mcode.Clusters[["Score", "Nodes", "Edges", "Gene_IDs"]].values.tolist() == [[4.0, 4, 6, "A;B;C;D"]]
+    else:
+        assert mcode.Clusters[["Score", "Nodes", "Edges", "Gene_IDs"]].values.tolist() == [[3.5, 5, 7, "A;B;C;D;E"]]
+
+
+def test_cliques_joined_by_bridge():
+    # the K4 is listed first, the K5 complex still comes first by its higher score.
+    mcode = MCODE(get_GGSS(get_Clique("ABCD") + get_Clique("EFGHI") + ["D-E"]))
+    assert get_Scores(mcode) == {"A": 3.0, "B": 3.0, "C": 3.0, "D": 3.0, "E": 4.0, "F": 4.0, "G": 4.0, "H": 4.0, "I": 4.0}
+    assert mcode.Clusters[["Cluster", "Score", "Nodes", "Edges", "Seed_ID", "Gene_IDs"]].values.tolist() == \
+        [[1, 5.0, 5, 10, "E", "E;F;G;H;I"], [2, 4.0, 4, 6, "A", "A;B;C;D"]]
+
+
+def test_cliques_of_same_score_joined_by_bridge():
+    # the genes of both K4 score 3, the bridge gene is within the node score cutoff, one complex.
+    mcode = MCODE(get_GGSS(get_Clique("ABCD") + get_Clique("EFGH") + ["D-E"]))
+    assert set(get_Scores(mcode).values()) == {3.0}
+    assert mcode.Clusters[["Nodes", "Edges", "Seed_ID"]].values.tolist() == [[8, 13, "A"]]
+    assert mcode.Clusters["Score"].tolist() == pytest.approx([13 / 28 * 8])
+
+
+def test_no_2core():
+    # a path and a star, the neighborhoods have no 2-core, no complex is kept.
+    mcode = MCODE(get_GGSS(["A-B", "B-C", "C-D", "E-F", "E-G", "E-H"]))
+    assert get_Scores(mcode) == pytest.approx({"A": 0.0, "B": 2 / 3, "C": 2 / 3, "D": 0.0, "E": 0.5, "F": 0.0, "G": 0.0, "H": 0.0})
+    assert len(mcode.Clusters) == 0
+    assert list(mcode.Clusters.columns) == ["Cluster", "Score", "Nodes", "Edges", "Seed_ID", "Seed_Name", "Gene_IDs", "Gene_Names"]
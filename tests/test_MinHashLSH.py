@@ -0,0 +1,71 @@
+# *_* coding: utf-8 *_*
+# @Time     : 10/18/2026
+# @Author   : zong hui
+# @object   : the LSH buckets expand into all their gene pairs, the large buckets are skipped, candidates are rescored exactly.
+
+
+# load packages
+import itertools
+import numpy as np
+import pytest
+
+# load our modules
+from Interning import CSRMapping, intern_Strings
+from MinHashLSH import MinHashLSH
+from SparseSimilarity import SparseSimilarity
+
+
+def get_BandPairs_loop(signatures, band, r, max_bucket):
+    # the pairs of genes of the same band, bucket by bucket, and the number of buckets of more than max_bucket genes.
+    buckets = dict()
+    for gene, row in enumerate(signatures[:, band * r:(band + 1) * r].tolist()):
+        buckets.setdefault(tuple(row), []).append(gene)
+    pairs = [pair for genes in buckets.values() if len(genes) <= max_bucket for pair in itertools.combinations(genes, 2)]
+    return sorted(pairs), sum(len(genes) > max_bucket for genes in buckets.values())
+
+
+@pytest.mark.parametrize("max_bucket", [1, 2, 3, 5, 1000])
+def test_band_pairs(max_bucket):
+    rng = np.random.default_rng(max_bucket)
+    lsh = MinHashLSH(None, num_perm=6, bands=3, max_bucket=max_bucket)
+    lsh.signatures = rng.integers(0, 2, size=(40, 6)).astype(np.uint32)  # few distinct bands, buckets of many sizes
+    skipped, pairs = 0, 0
+    for band in range(3):
+        gene1, gene2 = lsh.get_BandPairs(band)
+        expected, band_skipped = get_BandPairs_loop(lsh.signatures, band, 2, max_bucket)
+        assert np.all(gene1 < gene2)
+        assert sorted(zip(gene1.tolist(), gene2.tolist())) == expected
+        skipped, pairs = skipped + band_skipped, pairs + len(expected)
+    assert lsh.Counter["skipped_buckets"] == skipped and lsh.Counter["bucket_pairs"] == pairs
+    if max_bucket == 1:
+        assert pairs == 0
+
+
+def get_Engine(rows):
+    gene_codes, genes = intern_Strings([gene for gene, _, _ in rows])
+    go_codes, gos = intern_Strings([go for _, go, _ in rows])
+    return SparseSimilarity(CSRMapping.from_Pairs(gene_codes, go_codes, genes, gos, np.array([ap for _, _, ap in rows])))
+
+
+def test_candidates_are_rescored_exactly():
+    rng = np.random.default_rng(3)
+    rows = [("g{}".format(gene), "GO:{}".format(go), float(rng.random() * 0.05))
+            for gene in range(30) for go in rng.choice(12, size=rng.integers(1, 5), replace=False)]
+    rows += [("twin1", "GO:100", 0.01), ("twin1", "GO:101", 0.02), ("twin2", "GO:100", 0.03), ("twin2", "GO:101", 0.04)]
+    engine = get_Engine(rows)
+    lsh = MinHashLSH(engine, num_perm=32, bands=16)
+    gene1, gene2, score = lsh.get_Similarity()
+    exact = {(i, j): s for i, j, s in zip(*engine.get_Similarity())}
+    assert np.all(np.diff(gene1.astype(np.int64) * len(engine.genes) + gene2) > 0)
+    assert len(gene1) == lsh.Counter["edges"] and 0 < len(gene1) <= len(exact)
+    assert all(exact[(i, j)] == pytest.approx(s, rel=1e-12) for i, j, s in zip(gene1.tolist(), gene2.tolist(), score.tolist()))
+    # the genes of the same GOs are in every bucket together
+    twins = tuple(engine.genes.index(gene) for gene in ("twin1", "twin2"))
+    assert twins in set(zip(gene1.tolist(), gene2.tolist()))
+    # the edge count is exact when all the genes are sampled
+    assert lsh.get_EdgeCount(sample=len(engine.genes)) == len(exact)
+
+
+def test_bands_divide_num_perm():
+    with pytest.raises(ValueError):
+        MinHashLSH(None, num_perm=128, bands=48)
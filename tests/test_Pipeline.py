@@ -0,0 +1,89 @@
+# *_* coding: utf-8 *_*
+# @Time     : 10/18/2026
+# @Author   : zong hui
+# @object   : a stage is skipped when its key and outputs did not change, and rerun with the stages after it otherwise.
+
+
+# load packages
+import pytest
+
+# load our modules
+from ArtifactWriter import ArtifactWriter
+from Pipeline import Pipeline, Stage
+from helper import KnowledgeRegistry
+
+
+def write_File(path, text):
+    with open(path, "w") as f:
+        f.write(text)
+
+
+def run_Pipeline(folder, params=None, fail=None, force=False):
+    """
+    a -> b -> c, a reads input.txt, b has params and the knowledge K (knol.txt). Each stage writes <name>.txt.
+    Returns the stages that ran, the stage fail raises.
+    """
+    writer = ArtifactWriter(background=False)
+    registry = KnowledgeRegistry()
+    registry.register("K", dict, sources=[str(folder / "knol.txt")])
+    pipeline = Pipeline(str(folder / "pipeline.json"), writer, registry, force=force)
+    ran = list()
+
+    def get_Run(name):
+        def run(pipeline):
+            if name == fail:
+                raise RuntimeError("stage {} failed".format(name))
+            ran.append(name)
+            writer.submit(str(folder / (name + ".txt")), write_File, str(folder / (name + ".txt")), name)
+            return name, {"rows": len(name)}
+        return run
+
+    for name, deps, inputs, stage_params, knowledge in [("a", [], [str(folder / "input.txt")], None, []),
+                                                        ("b", ["a"], [], params or {"p": 1}, ["K"]),
+                                                        ("c", ["b"], [], None, [])]:
+        pipeline.add(Stage(name, get_Run(name), load=lambda: None, deps=deps, inputs=inputs,
+                           outputs=[str(folder / (name + ".txt"))], params=stage_params, knowledge=knowledge))
+    try:
+        for _ in pipeline.run():
+            pass
+    finally:
+        writer.close()
+    return ran, pipeline
+
+
+@pytest.fixture
+def folder(tmp_path):
+    write_File(str(tmp_path / "input.txt"), "input")
+    write_File(str(tmp_path / "knol.txt"), "knowledge")
+    return tmp_path
+
+
+def test_second_run_skips(folder):
+    assert run_Pipeline(folder)[0] == ["a", "b", "c"]
+    ran, pipeline = run_Pipeline(folder)
+    assert ran == [] and pipeline.Status == {"a": "skipped", "b": "skipped", "c": "skipped"}
+    assert run_Pipeline(folder, force=True)[0] == ["a", "b", "c"]
+
+
+def test_changes_rerun_the_stages_after(folder):
+    run_Pipeline(folder)
+    assert run_Pipeline(folder, params={"p": 2})[0] == ["b", "c"]
+    write_File(str(folder / "knol.txt"), "knowledge, new version")
+    assert run_Pipeline(folder, params={"p": 2})[0] == ["b", "c"]
+    write_File(str(folder / "input.txt"), "input, new version")
+    assert run_Pipeline(folder, params={"p": 2})[0] == ["a", "b", "c"]
+    # a missing output reruns its stage, and the stages after it as their dependency key is the same
+    (folder / "c.txt").unlink()
+    assert run_Pipeline(folder, params={"p": 2})[0] == ["c"]
+    assert run_Pipeline(folder, params={"p": 2})[0] == []
+
+
+def test_failed_stage_resumes(folder):
+    with pytest.raises(RuntimeError):
+        run_Pipeline(folder, fail="b")
+    ran, pipeline = run_Pipeline(folder)
+    assert ran == ["b", "c"] and pipeline.Status["a"] == "skipped"
+    with pytest.raises(RuntimeError):
+        run_Pipeline(folder, params={"p": 2}, fail="c")
+    # b was recorded with the new params before c failed
+    assert run_Pipeline(folder, params={"p": 2})[0] == ["c"]
@@ -0,0 +1,40 @@
+# *_* coding: utf-8 *_*
+# @Time     : 10/18/2026
+# @Author   : zong hui
+# @object   : the top-k of a result index are the best scored rows, whatever the order of the saved table.
+
+
+# load packages
+import os
+import numpy as np
+import pandas as pd
+
+# load our modules
+from ResultIndex import GOF_KEYS, GGSS_KEYS, load_ResultIndex
+
+
+def test_GGSS_in_gene_order(tmp_path):
+    # the GGSS of --streaming is written gene by gene, no index file is saved for it.
+    rng = np.random.default_rng(0)
+    genes = ["G{}".format(i) for i in range(20)]
+    pairs = [(g1, g2) for i, g1 in enumerate(genes) for g2 in genes[i + 1:]]
+    GGSS = pd.DataFrame({"Gene1_ID": [int(g1[1:]) for g1, _ in pairs], "Gene1_Name": [g1 for g1, _ in pairs],
+                         "Gene2_ID": [int(g2[1:]) for _, g2 in pairs], "Gene2_Name": [g2 for _, g2 in pairs],
+                         "Similarity_Score": rng.random(len(pairs))})
+    table_file, index_file = str(tmp_path / "GGSS.csv"), str(tmp_path / "GGSS.index.npz")
+    GGSS.to_csv(table_file, index=False)
+    index = load_ResultIndex(table_file, GGSS_KEYS, index_file)
+    for gene in genes:
+        expected = GGSS[(GGSS["Gene1_Name"] == gene) | (GGSS["Gene2_Name"] == gene)]["Similarity_Score"].nlargest(3)
+        assert np.allclose(index.get_TopK("Name", gene, 3)["Similarity_Score"].values, expected.values)
+    assert not os.path.exists(index_file)  # its rows would not be those of the file
+
+
+def test_sorted_GOF_reuses_index(tmp_path):
+    GOF = pd.DataFrame({"Gene_ID": [1, 2, 1, 3], "Gene_Name": ["A", "B", "A", "C"], "GO_ID": ["GO:1", "GO:1", "GO:2", "GO:3"],
+                        "GO_Name": ["x", "x", "y", "z"], "Adjusted_Pvalue": [1e-9, 1e-5, 1e-3, 1e-3]})
+    table_file, index_file = str(tmp_path / "GOF.csv"), str(tmp_path / "GOF.index.npz")
+    GOF.to_csv(table_file, index=False)
+    assert load_ResultIndex(table_file, GOF_KEYS, index_file).get_TopK("Gene", "A", 1)["GO_ID"].tolist() == ["GO:1"]
+    assert os.path.exists(index_file)
+    assert load_ResultIndex(table_file, GOF_KEYS, index_file).get_TopK("GO", "GO:1", 2)["Gene_Name"].tolist() == ["A", "B"]
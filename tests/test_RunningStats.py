@@ -0,0 +1,68 @@
+# *_* coding: utf-8 *_*
+# @Time     : 10/18/2026
+# @Author   : zong hui
+# @object   : the streamed statistics are the pandas ones, and the bounded top-k is a stable sort of the whole stream.
+
+
+# load packages
+import numpy as np
+import pandas as pd
+import pytest
+
+# load our modules
+from RunningStats import RunningStats, TopKBuffer
+
+
+def get_Blocks(rng, values):
+    # uneven blocks, empty and single value blocks included.
+    cuts = np.sort(rng.integers(0, len(values) + 1, size=12))
+    cuts = np.concatenate(([0], cuts, [cuts[-1], len(values)]))
+    return [values[start:end] for start, end in zip(cuts[:-1], cuts[1:])]
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_stats_are_pandas(seed):
+    rng = np.random.default_rng(seed)
+    values = np.concatenate((rng.normal(1e3, 5.0, size=500), rng.exponential(2.0, size=int(rng.integers(1, 300)))))
+    stats = RunningStats()
+    for block in get_Blocks(rng, values):
+        stats.update(block)
+    series = pd.Series(values)
+    assert stats.count == len(series)
+    assert (stats.min, stats.max) == (series.min(), series.max())
+    assert stats.mean == pytest.approx(series.mean(), rel=1e-12)
+    assert stats.std == pytest.approx(series.std(), rel=1e-9)
+
+
+def test_stats_of_few_values():
+    stats = RunningStats()
+    stats.update([])
+    assert stats.count == 0 and np.isnan(stats.mean) and np.isnan(stats.std)
+    stats.update([2.5])
+    assert (stats.count, stats.min, stats.max, stats.mean) == (1, 2.5, 2.5, 2.5) and np.isnan(stats.std)
+    assert np.isnan(pd.Series([2.5]).std())
+
+
+@pytest.mark.parametrize("k", [0, 1, 4, 10, 1000])
+def test_topk_ties_keep_push_order(k):
+    rng = np.random.default_rng(k)
+    blocks = [rng.integers(0, 4, size=int(size)).astype(np.float64) for size in rng.integers(0, 25, size=8)]
+    top = TopKBuffer(k)
+    start = 0
+    for score in blocks:
+        top.push(score, start + np.arange(len(score)))
+        start += len(score)
+    score = np.concatenate(blocks)
+    expected = sorted(range(len(score)), key=lambda row: (-score[row], row))[:k]
+    kept_score, kept_row = top.get()
+    assert kept_row.tolist() == expected
+    assert kept_score.tolist() == score[expected].tolist()
+    assert top.seen == len(score)
+
+
+def test_topk_tie_at_kth_place():
+    top = TopKBuffer(3)
+    top.push(np.array([0.5, 0.9, 0.5]), np.array(["a", "b", "c"], dtype=object))
+    top.push(np.array([0.5, 0.7, 0.5]), np.array(["d", "e", "f"], dtype=object))
+    # 0.9 and 0.7 are kept, of the 0.5 ties the first pushed, a
+    assert [column.tolist() for column in top.get()] == [[0.9, 0.7, 0.5], ["b", "e", "a"]]